@@ -0,0 +1,210 @@
+"""
+Benchmarks of the main qiime2pandas functions on synthetic data.
+
+Every case runs in a fresh process, so its peak RSS is not inflated by earlier cases.
+The wall time is the best of --repeat runs. Results are compared against a stored
+baseline and the script exits with status 1 if any case regressed.
+
+Usage (from the repository root):
+python -m benchmarks.run_benchmarks --scale small medium
+python -m benchmarks.run_benchmarks --scale small --save-baseline
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+def _peak_rss_mb():
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak / 1024**2 if sys.platform == 'darwin' else peak / 1024
+
+# Each setup function loads its inputs and returns the call to time
+def _setup_rarefy_otu_table(paths, workdir):
+    import pandas as pd
+    from qiime2pandas import rarefy_otu_table
+
+    otu_df = pd.read_csv(paths['otu_table'], sep='\t', index_col=0)
+    depth = int(otu_df.sum().min())
+    return lambda: rarefy_otu_table(otu_df, depth, seed=0)
+
+def _setup_rarefaction_curve(paths, workdir):
+    import pandas as pd
+    from qiime2pandas import rarefaction_curve
+
+    otu_df = pd.read_csv(paths['otu_table'], sep='\t', index_col=0)
+    return lambda: rarefaction_curve(otu_df, num_depths=20, seed=0, plot=False)
+
+def _setup_tax_glom(paths, workdir):
+    import pandas as pd
+    from qiime2pandas import tax_glom
+
+    merged_df = pd.read_csv(paths['merged_table'], index_col=0)
+    return lambda: tax_glom(merged_df, 'genus')
+
+def _setup_tax_glom_table(paths, workdir):
+    import pandas as pd
+    from qiime2pandas import tax_glom_table
+
+    merged_df = pd.read_csv(paths['merged_table'], index_col=0)
+    sample_indices = list(range(merged_df.shape[1] - 7))
+    return lambda: tax_glom_table(merged_df, 'family', sample_indices=sample_indices)
+
+def _setup_parse_sintax(paths, workdir):
+    from qiime2pandas import parse_sintax
+
+    return lambda: parse_sintax(paths['sintax'], paths['otu_table'], confidence=0.8)
+
+def _setup_process_stats_files(paths, workdir):
+    from qiime2pandas import process_stats_files
+
+    output_csv = os.path.join(workdir, 'maxEE_summary.csv')
+    return lambda: process_stats_files(paths['stats_dir'], 'MaxEE1', output_csv=output_csv)
+
+def _setup_import_and_merge(paths, workdir):
+    from qiime2pandas import import_and_merge
+
+    if 'table_qza' not in paths:
+        return None
+    qza_file_paths = [paths['taxonomy_qza'], paths['table_qza']]
+    return lambda: import_and_merge(qza_file_paths, output_folder=os.path.join(workdir, 'tax_table'))
+
+CASES = {
+    'rarefy_otu_table': _setup_rarefy_otu_table,
+    'rarefaction_curve': _setup_rarefaction_curve,
+    'tax_glom': _setup_tax_glom,
+    'tax_glom_table': _setup_tax_glom_table,
+    'parse_sintax': _setup_parse_sintax,
+    'process_stats_files': _setup_process_stats_files,
+    'import_and_merge': _setup_import_and_merge,
+}
+
+def _run_case(name, paths, repeat):
+    """Run one case in the current (fresh) process; returns None if it cannot run here."""
+    workdir = tempfile.mkdtemp(prefix=f'bench-{name}-')
+    logging.disable(logging.CRITICAL)
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            call = CASES[name](paths, workdir)
+            if call is None:
+                return None
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                call()
+                times.append(time.perf_counter() - start)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {'seconds': min(times), 'peak_rss_mb': _peak_rss_mb()}
+
+def run_benchmarks(scales=('small',), cases=None, repeat=3, seed=0):
+    """
+    Run the benchmarks.
+
+    Parameters:
+    scales (list of str): The data scales to run (keys of benchmarks.synthetic.SCALES).
+    cases (list of str): The cases to run (default is all of CASES).
+    repeat (int): The number of timed runs per case; the fastest is kept.
+    seed (int): The seed of the synthetic data.
+
+    Returns:
+    dict: Scale -> case -> {'seconds': float, 'peak_rss_mb': float}.
+    """
+    from .synthetic import write_fixtures
+
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    for scale in scales:
+        fixture_dir = tempfile.mkdtemp(prefix=f'bench-fixtures-{scale}-')
+        try:
+            paths = write_fixtures(fixture_dir, scale, seed)
+            results[scale] = {}
+            for name in cases or CASES:
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                    result = pool.submit(_run_case, name, paths, repeat).result()
+                if result is not None:
+                    results[scale][name] = result
+        finally:
+            shutil.rmtree(fixture_dir, ignore_errors=True)
+    return results
+
+def compare(results, baseline, tolerance=0.25, min_seconds=0.05):
+    """
+    Compare results against a baseline.
+
+    Parameters:
+    results (dict): The output of run_benchmarks.
+    baseline (dict): A previous output of run_benchmarks.
+    tolerance (float): The allowed relative increase in time or memory (default is 25%).
+    min_seconds (float): Slowdowns smaller than this are timer noise and never count (default is 0.05).
+
+    Returns:
+    list of str: One line per case, and whether it regressed.
+    bool: True if any case regressed.
+    """
+    lines = []
+    regressed = False
+    for scale, scale_results in results.items():
+        for name, result in scale_results.items():
+            line = f"{scale:<8} {name:<22} {result['seconds']:>9.3f} s {result['peak_rss_mb']:>9.1f} MB"
+            previous = baseline.get(scale, {}).get(name)
+            if previous is not None:
+                time_ratio = result['seconds'] / max(previous['seconds'], 1e-9)
+                rss_ratio = result['peak_rss_mb'] / max(previous['peak_rss_mb'], 1e-9)
+                line += f"   time x{time_ratio:.2f}   rss x{rss_ratio:.2f}"
+                slower = time_ratio > 1 + tolerance and result['seconds'] - previous['seconds'] > min_seconds
+                if slower or rss_ratio > 1 + tolerance:
+                    line += '   REGRESSION'
+                    regressed = True
+            lines.append(line)
+    return lines, regressed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark qiime2pandas on synthetic data.')
+    parser.add_argument('--scale', nargs='+', default=['small'], help='small, medium and/or large')
+    parser.add_argument('--case', nargs='+', default=None, help=f"cases to run (default: all of {', '.join(CASES)})")
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per case (the fastest is kept)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic data')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='baseline JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative slowdown or memory growth')
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the new baseline')
+    parser.add_argument('--output', default=None, help='also write the results to this JSON file')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.scale, args.case, args.repeat, args.seed)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+
+    lines, regressed = compare(results, baseline, args.tolerance)
+    print('\n'.join(lines))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        # Keep the baseline of scales that were not run this time
+        for scale, scale_results in results.items():
+            baseline.setdefault(scale, {}).update(scale_results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    return 1 if regressed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
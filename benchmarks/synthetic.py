@@ -0,0 +1,212 @@
+import io
+import os
+import zipfile
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# Rank prefixes as written by QIIME 2 (Greengenes/SILVA style) and by SINTAX
+RANKS = ['kingdom', 'phylum', 'class', 'order', 'family', 'genus', 'species']
+QIIME_PREFIXES = ['d__', 'p__', 'c__', 'o__', 'f__', 'g__', 's__']
+SINTAX_PREFIXES = ['d:', 'p:', 'c:', 'o:', 'f:', 'g:', 's:']
+
+# Number of OTUs, samples and .stats files at each scale
+SCALES = {
+    'small': {'n_otus': 1_000, 'n_samples': 24, 'n_stats_files': 50},
+    'medium': {'n_otus': 10_000, 'n_samples': 96, 'n_stats_files': 200},
+    'large': {'n_otus': 50_000, 'n_samples': 384, 'n_stats_files': 1_000},
+}
+
+def otu_counts(n_otus, n_samples, seed=0, median_depth=20_000):
+    """
+    A sparse, long-tailed count matrix like a real amplicon OTU table.
+
+    OTU abundances follow a log-normal rank-abundance curve, each sample has its own
+    library size and community (a gamma-Poisson mixture), so most rare OTUs are absent
+    from most samples.
+
+    Parameters:
+    n_otus (int): The number of OTUs (rows).
+    n_samples (int): The number of samples (columns).
+    seed (int): The random seed.
+    median_depth (int): The median number of reads per sample.
+
+    Returns:
+    scipy.sparse.csc_matrix: Integer counts with OTUs as rows and samples as columns.
+    """
+    rng = np.random.default_rng(seed)
+    abundance = np.sort(rng.lognormal(0, 3.0, n_otus))[::-1]
+    abundance /= abundance.sum()
+    depths = rng.lognormal(np.log(median_depth), 0.5, n_samples)
+
+    columns = []
+    for depth in depths:
+        # Sample-to-sample variation in composition, then Poisson sampling of the reads
+        expected = abundance * rng.gamma(0.2, 5.0, n_otus) * depth
+        columns.append(sparse.csc_matrix(rng.poisson(expected).reshape(-1, 1)))
+    return sparse.hstack(columns, format='csc').astype(np.int64)
+
+def otu_ids(n_otus):
+    return [f'OTU{i + 1}' for i in range(n_otus)]
+
+def sample_ids(n_samples):
+    return [f'S{j + 1}' for j in range(n_samples)]
+
+def otu_table(n_otus, n_samples, seed=0):
+    """
+    A synthetic OTU table as a DataFrame indexed by '#OTU ID' (the usearch/vsearch otutab layout).
+
+    Parameters:
+    n_otus (int): The number of OTUs.
+    n_samples (int): The number of samples.
+    seed (int): The random seed.
+
+    Returns:
+    pd.DataFrame: The counts with OTUs as rows and samples as columns.
+    """
+    counts = otu_counts(n_otus, n_samples, seed)
+    return pd.DataFrame(counts.toarray(), index=pd.Index(otu_ids(n_otus), name='#OTU ID'),
+                        columns=sample_ids(n_samples))
+
+def lineages(n_otus, seed=0):
+    """
+    A random taxonomy tree and the lineage of every OTU.
+
+    Each rank has more taxa than the one above it and every taxon has one parent, so
+    lineages are consistent. Some OTUs are only classified down to a higher rank.
+
+    Parameters:
+    n_otus (int): The number of OTUs.
+    seed (int): The random seed.
+
+    Returns:
+    list of list of str: For each OTU, the taxon names from kingdom down (possibly fewer than 7).
+    """
+    rng = np.random.default_rng(seed)
+    n_taxa = [2] + [max(2, int(n_otus ** (0.35 + 0.1 * i))) for i in range(1, len(RANKS))]
+
+    # parents[i][k] is the parent (at rank i - 1) of taxon k at rank i
+    parents = [None] + [rng.integers(0, n_taxa[i - 1], n_taxa[i]) for i in range(1, len(RANKS))]
+    leaves = rng.zipf(1.3, n_otus) % n_taxa[-1]
+    resolved = np.minimum(rng.geometric(0.15, n_otus) + 2, len(RANKS))
+
+    taxon_names = [['Bacteria', 'Archaea']] + [[f'{rank.capitalize()}{k}' for k in range(n_taxa[i])]
+                                               for i, rank in enumerate(RANKS) if i > 0]
+    result = []
+    for leaf, depth in zip(leaves, resolved):
+        path = [leaf]
+        for i in range(len(RANKS) - 1, 0, -1):
+            path.append(parents[i][path[-1]])
+        path = path[::-1]
+        result.append([taxon_names[i][k] for i, k in enumerate(path[:depth])])
+    return result
+
+def taxonomy_tsv(n_otus, seed=0):
+    """The text of a QIIME 2 taxonomy.tsv, with every lineage written out to seven levels."""
+    lines = ['Feature ID\tTaxon\tConfidence']
+    for otu_id, lineage in zip(otu_ids(n_otus), lineages(n_otus, seed)):
+        names = lineage + [''] * (len(RANKS) - len(lineage))
+        taxon = '; '.join(prefix + name for prefix, name in zip(QIIME_PREFIXES, names))
+        lines.append(f'{otu_id}\t{taxon}\t0.95')
+    return '\n'.join(lines) + '\n'
+
+def sintax_text(n_otus, seed=0, cutoff=0.8):
+    """The text of a SINTAX output file, with confidences falling towards the lower ranks."""
+    rng = np.random.default_rng(seed + 1)
+    lines = []
+    for otu_id, lineage in zip(otu_ids(n_otus), lineages(n_otus, seed)):
+        confidences = np.minimum.accumulate(rng.uniform(0.5, 1.0, len(lineage)))
+        predictions = ','.join(f'{prefix}{name}({conf:.4f})'
+                               for prefix, name, conf in zip(SINTAX_PREFIXES, lineage, confidences))
+        kept = ','.join(f'{prefix}{name}'
+                        for prefix, name, conf in zip(SINTAX_PREFIXES, lineage, confidences) if conf >= cutoff)
+        lines.append(f'{otu_id}\t{predictions}\t+\t{kept}')
+    return '\n'.join(lines) + '\n'
+
+def stats_text(seed=0, max_length=460, step=50):
+    """The text of a fastq_eestats2 .stats file."""
+    rng = np.random.default_rng(seed)
+    reads = int(rng.integers(10_000, 100_000))
+    average = rng.uniform(0.85, 0.95) * max_length
+
+    lines = [f'{reads} reads, max len {max_length}, avg {average:.1f}', '',
+             'Length         MaxEE 0.50         MaxEE 1.00         MaxEE 2.00',
+             '------   ----------------   ----------------   ----------------']
+    for length in range(step, max_length, step):
+        kept = [int(reads * np.exp(-length / scale)) for scale in (900, 1800, 3600)]
+        fields = ''.join(f'{n:>11}({100 * n / reads:5.1f}%)' for n in kept)
+        lines.append(f'{length:>6}   {fields}')
+    return '\n'.join(lines) + '\n'
+
+def biom_hdf5_bytes(counts, observation_ids, sample_ids):
+    """A BIOM 2.1 (HDF5) file holding the counts, as bytes."""
+    import h5py
+
+    buffer = io.BytesIO()
+    matrix = sparse.csc_matrix(counts, dtype=np.float64)
+    with h5py.File(buffer, 'w') as f:
+        f.attrs['format-version'] = [2, 1]
+        f.attrs['shape'] = matrix.shape
+        f.create_dataset('observation/ids', data=np.array(observation_ids, dtype=object), dtype=h5py.string_dtype())
+        f.create_dataset('sample/ids', data=np.array(sample_ids, dtype=object), dtype=h5py.string_dtype())
+        f.create_dataset('sample/matrix/data', data=matrix.data)
+        f.create_dataset('sample/matrix/indices', data=matrix.indices)
+        f.create_dataset('sample/matrix/indptr', data=matrix.indptr)
+    return buffer.getvalue()
+
+def write_qza(path, uuid, semantic_type, files):
+    """Write a minimal QIIME 2 artifact: <uuid>/metadata.yaml plus the files under <uuid>/data/."""
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr(f'{uuid}/metadata.yaml', f'uuid: {uuid}\ntype: {semantic_type}\nformat: null\n')
+        for name, content in files.items():
+            zf.writestr(f'{uuid}/data/{name}', content)
+
+def write_fixtures(output_folder, scale='small', seed=0):
+    """
+    Write every synthetic input for one scale.
+
+    Parameters:
+    output_folder (str): The folder to write into.
+    scale (str): One of SCALES.
+    seed (int): The random seed; the same seed always gives the same files.
+
+    Returns:
+    dict: Fixture name -> path.
+    """
+    n_otus, n_samples, n_stats_files = (SCALES[scale][key] for key in ('n_otus', 'n_samples', 'n_stats_files'))
+    os.makedirs(output_folder, exist_ok=True)
+    paths = {}
+
+    counts_df = otu_table(n_otus, n_samples, seed)
+    paths['otu_table'] = os.path.join(output_folder, 'otutab.txt')
+    counts_df.to_csv(paths['otu_table'], sep='\t')
+
+    # The same counts with the taxonomy ranks, as import_and_merge writes them
+    taxonomy = pd.DataFrame([lineage + [None] * (len(RANKS) - len(lineage)) for lineage in lineages(n_otus, seed)],
+                            index=counts_df.index, columns=RANKS)
+    paths['merged_table'] = os.path.join(output_folder, 'merged_table.csv')
+    counts_df.join(taxonomy).to_csv(paths['merged_table'])
+
+    paths['sintax'] = os.path.join(output_folder, 'sintax.txt')
+    with open(paths['sintax'], 'w') as f:
+        f.write(sintax_text(n_otus, seed))
+
+    paths['stats_dir'] = os.path.join(output_folder, 'stats')
+    os.makedirs(paths['stats_dir'], exist_ok=True)
+    for i in range(n_stats_files):
+        with open(os.path.join(paths['stats_dir'], f'sample{i + 1}.stats'), 'w') as f:
+            f.write(stats_text(seed + i))
+
+    paths['taxonomy_qza'] = os.path.join(output_folder, 'taxonomy.qza')
+    write_qza(paths['taxonomy_qza'], f'taxonomy-{scale}-{seed}', 'FeatureData[Taxonomy]',
+              {'taxonomy.tsv': taxonomy_tsv(n_otus, seed)})
+    try:
+        biom = biom_hdf5_bytes(sparse.csc_matrix(counts_df.to_numpy()), otu_ids(n_otus), sample_ids(n_samples))
+    except ImportError:
+        biom = None  # h5py is not installed; import_and_merge is skipped
+    if biom is not None:
+        paths['table_qza'] = os.path.join(output_folder, 'table.qza')
+        write_qza(paths['table_qza'], f'table-{scale}-{seed}', 'FeatureTable[Frequency]',
+                  {'feature-table.biom': biom})
+
+    return paths
@@ -1,39 +1,95 @@
 import os
-import shutil
-import zipfile
-import tempfile
+import logging
+from .qza_archive import QZAArchive
+from .artifact_cache import ArtifactCache
+from .profiling import profiled, current_stage, log_event
 
-def unzip_qza_files(qza_file_paths):
+def _up_to_date(cache, qza_file_path, output_folder):
+    # The artifact is unchanged and every file it was extracted to is still in place
+    info = cache.info(qza_file_path, namespace='extracted')
+    if not info or info.get('output_folder') != output_folder:
+        return False
+    return all(os.path.exists(path) and os.path.getsize(path) == size for path, size in info['files'].items())
+
+def _output_folder(qza_file_path):
+    # A folder with the same name as the QZA file, in the current working directory
+    return os.path.join(os.getcwd(), os.path.splitext(os.path.basename(qza_file_path))[0])
+
+@profiled
+def unzip_qza_files(qza_file_paths, cache=None, incremental=False, state_file=None):
+    """
+    Extracts the data files (.csv, .tsv, .txt, .biom, .nwk, .fasta) of each artifact into a
+    folder with the same name as the .qza file, in the current working directory.
+
+    Parameters:
+    qza_file_paths (list of str or str): Paths to the .qza files, or a directory whose .qza
+        files are all extracted (scanned again on every call, e.g. from ingest_state.watch).
+    cache (ArtifactCache, str or bool): Remember which artifacts were extracted, so unchanged
+        artifacts whose files are still in place are skipped. A str is used as the cache
+        folder and True uses the default folder (optional).
+    incremental (bool): Only extract artifacts that are new or changed since the last call,
+        tracked in a state file in the current working directory (default is False).
+    state_file (str): The state file of the incremental mode (default is .unzip_qza_files.state.json).
+
+    Returns:
+    list of str: The artifacts that were extracted by this call.
+    """
+    if isinstance(qza_file_paths, str):
+        qza_file_paths = sorted(entry.path for entry in os.scandir(qza_file_paths)
+                                if entry.name.endswith('.qza') and entry.is_file())
+
+    state = None
+    if incremental:
+        from .ingest_state import IngestState
+
+        state = IngestState(state_file or os.path.join(os.getcwd(), '.unzip_qza_files.state.json'))
+        changed = set(state.changed(qza_file_paths))
+        # Artifacts whose folder was deleted are extracted again too
+        qza_file_paths = [path for path in qza_file_paths if path in changed or not os.path.isdir(_output_folder(path))]
+
+    cache = ArtifactCache.coerce(cache)
+
+    extracted_artifacts = []
     for qza_file_path in qza_file_paths:
         try:
-            # Create a temporary directory
-            temp_dir = tempfile.mkdtemp()
+            # Create a folder with the same name as the original QZA file
+            output_folder = _output_folder(qza_file_path)
+            folder_name = os.path.basename(output_folder)
 
-            # Unzip the .qza file directly into the temporary directory
-            with zipfile.ZipFile(qza_file_path, 'r') as zip_ref:
-                zip_ref.extractall(temp_dir)
+            if cache is not None and _up_to_date(cache, qza_file_path, output_folder):
+                log_event(f"Files from {os.path.basename(qza_file_path)} are already up to date in folder: {folder_name}",
+                          file=qza_file_path, skipped=True)
+                continue
 
-            # Create a folder with the same name as the original QZA file
-            folder_name = os.path.splitext(os.path.basename(qza_file_path))[0]
-            output_folder = os.path.join(os.getcwd(), folder_name)
-            os.makedirs(output_folder, exist_ok=True)
-
-            # Iterate through the extracted directories and copy all suitable files
-            for root, dirs, files in os.walk(temp_dir):
-                for file_name in files:
-                    if file_name.lower().endswith(('.csv', '.tsv', '.txt', 'biom', 'nwk', 'fasta')) and not file_name.startswith('.'):
-                        source_file = os.path.join(root, file_name)
-                        destination_file = os.path.join(output_folder, file_name)
-                        shutil.copy(source_file, destination_file)
-
-            # Clean up the temporary directory and its contents
-            shutil.rmtree(temp_dir)
-
-            print(f"Unzipped and copied files from {os.path.basename(qza_file_path)} into folder: {folder_name}")
+            # Stream only the suitable data files straight out of the archive
+            with QZAArchive(qza_file_path) as archive:
+                names = [
+                    name for name in archive.files
+                    if name.lower().endswith(('.csv', '.tsv', '.txt', 'biom', 'nwk', 'fasta'))
+                    and not os.path.basename(name).startswith('.')
+                ]
+                extracted = archive.extract(names, output_folder)
+
+            if cache is not None:
+                files = {path: os.path.getsize(path) for path in extracted}
+                cache.store(qza_file_path, {}, info={'output_folder': output_folder, 'files': files}, namespace='extracted')
+
+            extracted_artifacts.append(qza_file_path)
+            current_stage().add(rows=len(extracted), bytes_read=os.path.getsize(qza_file_path),
+                                bytes_written=sum(os.path.getsize(path) for path in extracted))
+            log_event(f"Unzipped and copied files from {os.path.basename(qza_file_path)} into folder: {folder_name}",
+                      file=qza_file_path, files=len(extracted))
         except Exception as e:
-            print(f"An error occurred while processing {qza_file_path}: {e}")
+            log_event(f"An error occurred while processing {qza_file_path}: {e}", logging.ERROR,
+                      file=qza_file_path, error=repr(e))
+
+    # Artifacts that failed (e.g. still being written) are tried again next time
+    if state is not None:
+        state.update(extracted_artifacts)
+        state.save()
+
+    return extracted_artifacts
 
 # Example usage:
 # qza_file_paths = ['file1.qza', 'file2.qza']
 # unzip_qza_files(qza_file_paths)
-
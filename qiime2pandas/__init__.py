@@ -1,26 +1,77 @@
 # qiime2pandas/__init__.py
 
-from .extract_summary_stats import extract_summary_stats
-from .process_stats_files import process_stats_files
-from .QZA_to_folder import unzip_qza_files
-from .rename_fastq import rename_fastq_files
-from .tax_sum import tax_glom
-from .tax_table import import_and_merge
-from .rare_curve import rarefaction_curve
-from .parse_sintax_and_merge import parse_sintax
-from .rarefy_otu_table import rarefy_otu_table
-from .tax_glom2 import tax_glom_table
+import sys
+import types
+import importlib
+
+# Public name -> the submodule that defines it. Submodules are imported on first
+# attribute access (PEP 562), so `import qiime2pandas` does not pull in pandas,
+# scipy or matplotlib until they are needed.
+_EXPORTS = {
+    'extract_summary_stats': 'extract_summary_stats',
+    'process_stats_files': 'process_stats_files',
+    'unzip_qza_files': 'QZA_to_folder',
+    'rename_fastq_files': 'rename_fastq',
+    'plan_renames': 'rename_fastq',
+    'write_qiime2_manifest': 'rename_fastq',
+    'tax_glom': 'tax_sum',
+    'import_and_merge': 'tax_table',
+    'rarefaction_curve': 'rare_curve',
+    'parse_sintax': 'parse_sintax_and_merge',
+    'read_sintax': 'parse_sintax_and_merge',
+    'rarefy_otu_table': 'rarefy_otu_table',
+    'tax_glom_table': 'tax_glom2',
+    'QZAArchive': 'qza_archive',
+    'read_biom': 'biom_reader',
+    'biom_to_dataframe': 'biom_reader',
+    'OTUTable': 'otu_table',
+    'read_stats_files': 'stats_reader',
+    'IngestState': 'ingest_state',
+    'watch': 'ingest_state',
+    'ArtifactCache': 'artifact_cache',
+    'tax_glom_all': 'tax_lineage',
+    'read_table': 'table_io',
+    'write_table': 'table_io',
+    'TableWriter': 'table_io',
+    'rarefy_depths': 'rarefy_batch',
+    'iter_rarefied_tables': 'rarefy_batch',
+    'alpha_diversity': 'diversity',
+    'beta_diversity': 'diversity',
+    'column_sums': 'chunked',
+    'relative_abundance_file': 'chunked',
+    'tax_glom_file': 'chunked',
+    'rarefy_table_file': 'chunked',
+    'FastaFile': 'fasta_reader',
+    'read_fasta': 'fasta_reader',
+    'read_newick': 'newick_reader',
+    'parse_newick': 'newick_reader',
+    'merge_runs': 'merge_runs',
+    'normalize': 'normalize',
+    'profile': 'profiling',
+    'stage': 'profiling',
+}
 
 # Optional: Expose functions in the package namespace
-__all__ = [
-    'extract_summary_stats',
-    'process_stats_files',
-    'unzip_qza_files',
-    'rename_fastq_files',
-    'tax_glom',
-    'import_and_merge'
-    'rarefaction_curve',
-    'parse_sintax',
-    'rarefy_otu_table'
-    'tax_glom_table'
-]
+__all__ = list(_EXPORTS)
+
+class _Package(types.ModuleType):
+    def __setattr__(self, name, value):
+        # Importing a submodule binds it on the package. Where a function has the same name
+        # as its module (e.g. rarefy_otu_table), keep the function, as the eager imports did.
+        if isinstance(value, types.ModuleType) and _EXPORTS.get(name) == name:
+            value = getattr(value, name)
+        super().__setattr__(name, value)
+
+sys.modules[__name__].__class__ = _Package
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    module = importlib.import_module(f'.{_EXPORTS[name]}', __name__)
+    value = getattr(module, name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,257 @@
+import os
+import json
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from .otu_table import OTUTable
+from .qza_archive import QZAArchive
+
+MANIFEST = 'manifest.json'
+
+def _save_frame(df, path):
+    # Feather keeps columns in Arrow format so they can be memory-mapped back;
+    # pickle is the fallback when pyarrow is not installed
+    try:
+        import pyarrow.feather as feather
+    except ImportError:
+        df.to_pickle(path + '.pkl')
+        return {'kind': 'frame', 'file': os.path.basename(path) + '.pkl'}
+
+    index_names = [name if name is not None else f'__index_level_{i}__' for i, name in enumerate(df.index.names)]
+    flat = df.rename_axis(index_names).reset_index()
+    flat.columns = [str(col) for col in flat.columns]
+    feather.write_feather(flat, path + '.feather', compression='uncompressed')
+    return {
+        'kind': 'frame',
+        'file': os.path.basename(path) + '.feather',
+        'index': index_names,
+        'columns': [col for col in df.columns],
+    }
+
+def _load_frame(entry_dir, record):
+    path = os.path.join(entry_dir, record['file'])
+    if path.endswith('.pkl'):
+        return pd.read_pickle(path)
+
+    import pyarrow.feather as feather
+    df = feather.read_table(path, memory_map=True).to_pandas()
+    df = df.set_index(record['index'])
+    df.index.names = [None if name.startswith('__index_level_') else name for name in record['index']]
+    df.columns = record['columns']
+    return df
+
+def _save_otu_table(table, path):
+    # One .npy file per array so the counts can be memory-mapped back
+    os.makedirs(path)
+    np.save(os.path.join(path, 'data.npy'), table.counts.data)
+    np.save(os.path.join(path, 'indices.npy'), table.counts.indices)
+    np.save(os.path.join(path, 'indptr.npy'), table.counts.indptr)
+    np.save(os.path.join(path, 'observation_ids.npy'), table.observation_ids.astype(str))
+    np.save(os.path.join(path, 'sample_ids.npy'), table.sample_ids.astype(str))
+
+    record = {'kind': 'otu_table', 'file': os.path.basename(path), 'shape': list(table.shape), 'taxonomy': None}
+    if table.taxonomy is not None:
+        record['taxonomy'] = _save_frame(table.taxonomy, os.path.join(path, 'taxonomy'))
+    return record
+
+def _load_otu_table(entry_dir, record):
+    path = os.path.join(entry_dir, record['file'])
+    # Copy-on-write: the table can be changed in place (e.g. normalize(..., inplace=True))
+    # without touching the cached files
+    arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='c')
+              for name in ('data', 'indices', 'indptr')}
+    counts = sparse.csc_matrix((arrays['data'], arrays['indices'], arrays['indptr']), shape=tuple(record['shape']))
+
+    taxonomy = None
+    if record['taxonomy'] is not None:
+        taxonomy = _load_frame(path, record['taxonomy'])
+
+    observation_ids = np.load(os.path.join(path, 'observation_ids.npy'))
+    sample_ids = np.load(os.path.join(path, 'sample_ids.npy'))
+    return OTUTable(counts, observation_ids, sample_ids, taxonomy)
+
+def _directory_size(path):
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for file_name in files:
+            total += os.path.getsize(os.path.join(root, file_name))
+    return total
+
+class ArtifactCache:
+    """
+    On-disk cache of decoded QIIME 2 artifacts.
+
+    Entries are keyed by the artifact UUID from metadata.yaml plus the file's mtime and
+    size, so a changed or replaced .qza is decoded again. DataFrames are stored as
+    Feather and sparse OTUTables as .npy arrays, both read back memory-mapped. When the
+    cache grows beyond max_bytes, the least recently used entries are evicted.
+
+    Parameters:
+    cache_dir (str): The cache folder. Defaults to $QIIME2PANDAS_CACHE_DIR or ~/.cache/qiime2pandas.
+    max_bytes (int): The size limit of the cache in bytes (default is 2 GB).
+
+    Example:
+    cache = ArtifactCache(max_bytes=10 * 1024**3)
+    merged_tables = import_and_merge(qza_file_paths, cache=cache)
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=2 * 1024**3):
+        if cache_dir is None:
+            cache_dir = os.environ.get('QIIME2PANDAS_CACHE_DIR',
+                                       os.path.join(os.path.expanduser('~'), '.cache', 'qiime2pandas'))
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def __repr__(self):
+        return f"ArtifactCache('{self.cache_dir}', max_bytes={self.max_bytes})"
+
+    @classmethod
+    def coerce(cls, cache):
+        """
+        The cache a function's cache= argument asks for.
+
+        Parameters:
+        cache (ArtifactCache, str, bool or None): A cache, a cache folder, True for the default
+            folder, or False/None for no cache.
+
+        Returns:
+        ArtifactCache: The cache, or None.
+        """
+        if cache is True:
+            return cls()
+        if isinstance(cache, str):
+            return cls(cache)
+        if cache is False:
+            return None
+        return cache
+
+    def key(self, qza_file_path):
+        """The cache key of an artifact: '<uuid>-<mtime ns>-<size>'."""
+        stat = os.stat(qza_file_path)
+        with QZAArchive(qza_file_path) as archive:
+            uuid = archive.uuid
+        return f"{uuid}-{stat.st_mtime_ns}-{stat.st_size}"
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def _entry_key(self, qza_file_path, namespace):
+        # Different uses of the same artifact (e.g. decoded tables, extracted files) are kept apart
+        return f"{self.key(qza_file_path)}.{namespace}"
+
+    def _read_manifest(self, key):
+        try:
+            with open(os.path.join(self._entry_dir(key), MANIFEST), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def info(self, qza_file_path, namespace='tables'):
+        """The extra information stored with an artifact, or None if it is not cached."""
+        manifest = self._read_manifest(self._entry_key(qza_file_path, namespace))
+        return None if manifest is None else manifest['info']
+
+    def load(self, qza_file_path, namespace='tables'):
+        """
+        Load the cached tables of an artifact.
+
+        Parameters:
+        qza_file_path (str): Path to the .qza file.
+        namespace (str): Keeps separate entries for different uses of the same artifact (default is 'tables').
+
+        Returns:
+        dict: The tables passed to store (None values included), or None on a cache miss.
+        """
+        key = self._entry_key(qza_file_path, namespace)
+        manifest = self._read_manifest(key)
+        if manifest is None:
+            return None
+
+        entry_dir = self._entry_dir(key)
+        os.utime(entry_dir)  # Mark as recently used
+
+        tables = {}
+        for name, record in manifest['tables'].items():
+            if record is None:
+                tables[name] = None
+            elif record['kind'] == 'otu_table':
+                tables[name] = _load_otu_table(entry_dir, record)
+            else:
+                tables[name] = _load_frame(entry_dir, record)
+        return tables
+
+    def store(self, qza_file_path, tables, info=None, namespace='tables'):
+        """
+        Store the decoded tables of an artifact.
+
+        Parameters:
+        qza_file_path (str): Path to the .qza file.
+        tables (dict): Name -> pd.DataFrame, OTUTable or None.
+        info (dict): Extra JSON-serialisable information to keep with the entry (optional).
+        namespace (str): Keeps separate entries for different uses of the same artifact (default is 'tables').
+        """
+        key = self._entry_key(qza_file_path, namespace)
+
+        # Write into a temporary folder and rename it, so readers never see half an entry
+        staging_dir = tempfile.mkdtemp(prefix='.staging-', dir=self.cache_dir)
+        try:
+            records = {}
+            for name, table in tables.items():
+                path = os.path.join(staging_dir, name)
+                if table is None:
+                    records[name] = None
+                elif isinstance(table, OTUTable):
+                    records[name] = _save_otu_table(table, path)
+                else:
+                    records[name] = _save_frame(table, path)
+
+            manifest = {'source': os.path.abspath(qza_file_path), 'tables': records, 'info': info or {}}
+            manifest['size'] = _directory_size(staging_dir)
+            with open(os.path.join(staging_dir, MANIFEST), 'w') as f:
+                json.dump(manifest, f)
+
+            entry_dir = self._entry_dir(key)
+            if os.path.exists(entry_dir):
+                shutil.rmtree(entry_dir, ignore_errors=True)
+            os.replace(staging_dir, entry_dir)
+        except BaseException:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            raise
+
+        self.evict()
+
+    def entries(self):
+        """Cached entries as (key, size in bytes, last used time), least recently used first."""
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_dir() and not entry.name.startswith('.'):
+                manifest = self._read_manifest(entry.name)
+                if manifest is not None:
+                    entries.append((entry.name, manifest['size'], entry.stat().st_mtime))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def size(self):
+        """Total size of the cached entries in bytes."""
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for key, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        """Remove every cached entry."""
+        for key, _, _ in self.entries():
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+# Example usage:
+# cache = ArtifactCache('/scratch/qiime2pandas-cache', max_bytes=20 * 1024**3)
+# merged_tables = import_and_merge(qza_file_paths, cache=cache)
@@ -0,0 +1,181 @@
+import numpy as np
+import pandas as pd
+from .rarefy_otu_table import _rarefy_counts
+from .tax_sum import tax_glom
+from .table_io import TableWriter
+from .tax_lineage import rank_columns
+from .profiling import profiled
+
+DEFAULT_CHUNKSIZE = 100_000
+
+def read_table_chunks(otu_table_file, chunksize=DEFAULT_CHUNKSIZE, sep='\t'):
+    """
+    Iterates over an OTU table file in blocks of rows (observations).
+
+    Parameters:
+    otu_table_file (str): Path to the OTU table, with the OTU IDs in the first column.
+    chunksize (int): The number of rows per block; this bounds the peak memory.
+    sep (str): The field separator (default is a tab).
+
+    Returns:
+    iterator of pd.DataFrame: Blocks indexed by OTU ID.
+    """
+    return pd.read_csv(otu_table_file, sep=sep, index_col=0, chunksize=chunksize)
+
+def _sample_columns(chunk):
+    # A rank column that is empty in a block (e.g. 'species') is read as numbers; it is not a sample
+    ranks = set(rank_columns(chunk.columns))
+    return [col for col in chunk.select_dtypes(include=['number']).columns if col not in ranks]
+
+@profiled
+def column_sums(otu_table_file, chunksize=DEFAULT_CHUNKSIZE, sep='\t'):
+    """
+    Total counts of each sample, accumulated block by block.
+
+    Parameters:
+    otu_table_file (str): Path to the OTU table, with the OTU IDs in the first column.
+    chunksize (int): The number of rows per block.
+    sep (str): The field separator (default is a tab).
+
+    Returns:
+    pd.Series: The sum of every sample column (the numeric columns of the first block, other
+        than taxonomic ranks).
+    """
+    sums = None
+    for chunk in read_table_chunks(otu_table_file, chunksize, sep):
+        if sums is None:
+            # The sample columns are fixed by the first block
+            sums = chunk[_sample_columns(chunk)].sum()
+        else:
+            sums += chunk[sums.index].sum()
+    return sums
+
+@profiled
+def relative_abundance_file(otu_table_file, output_file, taxonomy=None, chunksize=DEFAULT_CHUNKSIZE,
+                            sep='\t', output_sep='\t', index_label=None, output_format=None):
+    """
+    Writes the relative abundance (%) of an OTU table without loading it into memory.
+
+    The sample totals are accumulated in a first pass; the second pass scales each block,
+    attaches its taxonomy and appends it to the output.
+
+    Parameters:
+    otu_table_file (str): Path to the OTU table, with the OTU IDs in the first column.
+    output_file (str): Path of the output table.
+    taxonomy (pd.DataFrame): Taxonomy indexed by OTU ID, written before the samples (optional).
+    chunksize (int): The number of rows per block.
+    sep (str): The field separator of the input (default is a tab).
+    output_sep (str): The field separator of the output (default is a tab).
+    index_label (str): Header of the OTU ID column in the output (default is the input's).
+    output_format (str): 'csv', 'parquet' or 'feather' (default follows the extension of output_file).
+
+    Returns:
+    str: The path of the output table.
+    """
+    sums = column_sums(otu_table_file, chunksize, sep)
+
+    with TableWriter(output_file, output_format, sep=output_sep, index_label=index_label) as writer:
+        for chunk in read_table_chunks(otu_table_file, chunksize, sep):
+            rel_table = chunk[sums.index].div(sums) * 100
+            if taxonomy is not None:
+                rel_table = pd.concat([taxonomy.reindex(chunk.index), rel_table], axis=1)
+            if index_label is not None:
+                rel_table.index.name = index_label
+            writer.write(rel_table)
+
+    return output_file
+
+@profiled
+def tax_glom_file(otu_table_file, taxonomic_level, taxonomy=None, chunksize=DEFAULT_CHUNKSIZE,
+                  sep='\t', lineage=True):
+    """
+    Aggregates an OTU table at a taxonomic level without loading it into memory.
+
+    Each block is aggregated and merged into a running total, so the peak memory is one
+    block plus one row per taxon.
+
+    Parameters:
+    otu_table_file (str): Path to the OTU table, with the OTU IDs in the first column. Rank
+        columns in the table are used unless taxonomy is given.
+    taxonomic_level (str): The taxonomic level to aggregate at (e.g. 'phylum').
+    taxonomy (pd.DataFrame): Taxonomy ranks indexed by OTU ID (optional).
+    chunksize (int): The number of rows per block.
+    sep (str): The field separator (default is a tab).
+    lineage (bool): Group by the full lineage down to the level (default is True); see tax_glom.
+
+    Returns:
+    pd.DataFrame: The lineage columns followed by the summed sample columns.
+    """
+    total = None
+    sample_columns = None
+    for chunk in read_table_chunks(otu_table_file, chunksize, sep):
+        if taxonomy is not None:
+            if sample_columns is None:
+                sample_columns = _sample_columns(chunk)
+            chunk = pd.concat([taxonomy.reindex(chunk.index), chunk[sample_columns]], axis=1)
+
+        partial = tax_glom(chunk, taxonomic_level, lineage=lineage)
+        if total is not None:
+            partial = tax_glom(pd.concat([total, partial], ignore_index=True), taxonomic_level, lineage=lineage)
+        total = partial
+
+    return total
+
+@profiled
+def rarefy_table_file(otu_table_file, depth, output_file, chunksize=DEFAULT_CHUNKSIZE, sep='\t', seed=None):
+    """
+    Rarefies an OTU table to a specified depth without loading it into memory.
+
+    The draws are exact: for each block, the number of each sample's reads that fall in
+    it is drawn from a hypergeometric distribution given the reads left in the remaining
+    blocks, and those reads are then drawn from the block itself.
+
+    Parameters:
+    otu_table_file (str): Path to the OTU table, with the OTU IDs in the first column.
+    depth (int): The depth to rarefy each sample to.
+    output_file (str): Path of the rarefied table (non-numeric columns are copied unchanged); a
+        .parquet or .feather extension selects that format.
+    chunksize (int): The number of rows per block.
+    sep (str): The field separator of the input and output (default is a tab).
+    seed (int or np.random.Generator): A random seed or generator for reproducibility (optional).
+
+    Returns:
+    str: The path of the output table.
+    dict: A dictionary with the number of OTUs lost for each sample.
+    """
+    rng = np.random.default_rng(seed)
+    sums = column_sums(otu_table_file, chunksize, sep)
+
+    for sample, total in sums.items():
+        if total < depth:
+            raise ValueError(f"Sample '{sample}' has less reads ({total}) than the rarefaction depth ({depth}).")
+
+    sample_columns = sums.index
+    remaining_reads = sums.to_numpy(dtype=np.int64, copy=True)
+    remaining_depth = np.full(len(sample_columns), depth, dtype=np.int64)
+    lost = np.zeros(len(sample_columns), dtype=np.int64)
+
+    with TableWriter(output_file, sep=sep) as writer:
+        for chunk in read_table_chunks(otu_table_file, chunksize, sep):
+            counts = chunk[sample_columns].to_numpy(dtype=np.int64)
+            block_reads = counts.sum(axis=0)
+
+            # How many of the reads still to draw come from this block
+            block_depth = rng.hypergeometric(block_reads, remaining_reads - block_reads, remaining_depth)
+            rarefied = _rarefy_counts(counts, block_depth, rng)
+
+            remaining_reads -= block_reads
+            remaining_depth -= block_depth
+            lost += (counts > 0).sum(axis=0) - (rarefied > 0).sum(axis=0)
+
+            chunk = chunk.copy()
+            chunk[sample_columns] = rarefied
+            writer.write(chunk)
+
+    otus_lost = {sample: int(n) for sample, n in zip(sample_columns, lost)}
+    return output_file, otus_lost
+
+# Example usage:
+# relative_abundance_file('otutab.txt', 'otutab_rel.txt', chunksize=200_000)
+# phyla = tax_glom_file('merged_table.csv', 'phylum', sep=',')
+# rarefy_table_file('otutab.txt', 10000, 'otutab_rare.txt', seed=42)
@@ -0,0 +1,205 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from concurrent.futures import ThreadPoolExecutor
+from .otu_table import OTUTable
+from .tax_lineage import rank_columns
+from .profiling import profiled
+
+ALPHA_METRICS = ['observed_features', 'shannon', 'simpson', 'chao1']
+BETA_METRICS = ['braycurtis', 'jaccard']
+
+def _sample_counts(otu_table):
+    # Counts as a CSC matrix (OTUs x samples); taxonomy and other text columns are left out
+    if isinstance(otu_table, OTUTable):
+        return otu_table.counts.astype(np.float64), otu_table.sample_ids
+
+    ranks = set(rank_columns(otu_table.columns))
+    sample_columns = [col for col in otu_table.select_dtypes(include=['number']).columns if col not in ranks]
+    counts = sparse.csc_matrix(otu_table[sample_columns].to_numpy(dtype=np.float64))
+    return counts, pd.Index(sample_columns)
+
+@profiled
+def alpha_diversity(otu_table, metrics=None):
+    """
+    Computes alpha diversity metrics for every sample.
+
+    All metrics are computed from the non-zero counts of every column at once, so sparse
+    tables are never densified.
+
+    - observed_features: the number of OTUs with a non-zero count.
+    - shannon: Shannon entropy in bits, -sum(p * log2(p)).
+    - simpson: Gini-Simpson index, 1 - sum(p**2).
+    - chao1: bias-corrected Chao1, S_obs + F1 * (F1 - 1) / (2 * (F2 + 1)), where F1 and F2 are
+      the numbers of singletons and doubletons.
+
+    Parameters:
+    otu_table (pd.DataFrame or OTUTable): The (rarefied) OTU table with OTUs as rows and samples
+        as columns. Taxonomy rank columns of a DataFrame are ignored.
+    metrics (list of str): The metrics to compute (default is all of ALPHA_METRICS).
+
+    Returns:
+    pd.DataFrame: One row per sample and one column per metric. Shannon and Simpson are NaN
+        for empty samples.
+    """
+    metrics = ALPHA_METRICS if metrics is None else list(metrics)
+    unknown = [metric for metric in metrics if metric not in ALPHA_METRICS]
+    if unknown:
+        raise ValueError(f"Unknown alpha diversity metric(s): {unknown}. Choose from {ALPHA_METRICS}.")
+
+    counts, sample_ids = _sample_counts(otu_table)
+    counts.eliminate_zeros()
+    n_samples = counts.shape[1]
+
+    # The sample of every non-zero count, so per-sample sums are a single bincount
+    data = counts.data
+    columns = np.repeat(np.arange(n_samples), np.diff(counts.indptr))
+
+    def column_sum(values):
+        return np.bincount(columns, weights=values, minlength=n_samples)
+
+    observed = np.diff(counts.indptr).astype(np.float64)
+    totals = column_sum(data)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p = data / totals[columns]
+        empty = np.where(totals > 0, 0.0, np.nan)
+
+        results = {}
+        if 'observed_features' in metrics:
+            results['observed_features'] = observed.astype(np.int64)
+        if 'shannon' in metrics:
+            results['shannon'] = -column_sum(p * np.log2(p)) + empty
+        if 'simpson' in metrics:
+            results['simpson'] = 1 - column_sum(p * p) + empty
+        if 'chao1' in metrics:
+            singletons = column_sum(data == 1)
+            doubletons = column_sum(data == 2)
+            results['chao1'] = observed + singletons * (singletons - 1) / (2 * (doubletons + 1))
+
+    return pd.DataFrame(results, index=pd.Index(sample_ids, name='Sample'), columns=metrics)
+
+def _condensed_index(i, j, n):
+    # Position of the pair (i, j), i < j, in a condensed distance matrix (scipy.spatial.distance order)
+    return n * i - i * (i + 1) // 2 + (j - i - 1)
+
+def _tile_distances(samples, totals, rows, cols, metric):
+    """
+    Distances between two blocks of samples.
+
+    Parameters:
+    samples (scipy.sparse.csr_matrix): The counts with samples as rows and OTUs as columns.
+    totals (np.ndarray): The total count (Bray-Curtis) or number of OTUs (Jaccard) of every sample.
+    rows, cols (slice): The two blocks of samples.
+    metric (str): 'braycurtis' or 'jaccard'.
+
+    Returns:
+    np.ndarray: The distances with shape (block rows, block columns).
+    """
+    a = samples[rows]
+    b = samples[cols]
+
+    if metric == 'jaccard':
+        shared = (a @ b.T).toarray()
+        union = totals[rows][:, None] + totals[cols][None, :] - shared
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return 1 - shared / union
+
+    # Only OTUs present in both blocks contribute to sum(min(x, y)); they are visited one at a
+    # time, and only the samples that have the OTU take part
+    common = np.intersect1d(np.unique(a.indices), np.unique(b.indices))
+    a = a[:, common].tocsc()
+    b = b[:, common].tocsc()
+
+    shared = np.zeros((a.shape[0], b.shape[0]))
+    a_column = np.zeros(a.shape[0])
+    b_column = np.zeros(b.shape[0])
+    for k in range(len(common)):
+        a_rows = a.indices[a.indptr[k]:a.indptr[k + 1]]
+        b_rows = b.indices[b.indptr[k]:b.indptr[k + 1]]
+        a_values = a.data[a.indptr[k]:a.indptr[k + 1]]
+        b_values = b.data[b.indptr[k]:b.indptr[k + 1]]
+
+        if len(a_rows) * len(b_rows) < shared.size // 4:
+            shared[np.ix_(a_rows, b_rows)] += np.minimum.outer(a_values, b_values)
+        else:
+            # Widespread OTUs are cheaper to add as a full outer minimum
+            a_column[:] = 0
+            a_column[a_rows] = a_values
+            b_column[:] = 0
+            b_column[b_rows] = b_values
+            shared += np.minimum.outer(a_column, b_column)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 1 - 2 * shared / (totals[rows][:, None] + totals[cols][None, :])
+
+@profiled
+def beta_diversity(otu_table, metric='braycurtis', block_size=1024, max_workers=None, output_file=None):
+    """
+    Computes a pairwise beta diversity distance matrix in condensed form.
+
+    Samples are split into blocks and each pair of blocks is computed as one task on a
+    thread pool, so the peak memory is bounded by the block size and not by the number of
+    samples. Within a block pair, each OTU only touches the samples that contain it.
+
+    - braycurtis: 1 - 2 * sum(min(x, y)) / (sum(x) + sum(y)).
+    - jaccard: 1 - |shared OTUs| / |OTUs in either sample| (presence/absence).
+
+    Parameters:
+    otu_table (pd.DataFrame or OTUTable): The (rarefied) OTU table with OTUs as rows and samples
+        as columns. Taxonomy rank columns of a DataFrame are ignored.
+    metric (str): 'braycurtis' or 'jaccard' (default is 'braycurtis').
+    block_size (int): The number of samples per block (default is 1024).
+    max_workers (int): The number of threads (default is the ThreadPoolExecutor default).
+    output_file (str): Write the distances to this .npy file as a memory map instead of
+        keeping them in memory (optional).
+
+    Returns:
+    np.ndarray: float32 distances of length n * (n - 1) / 2, in the order of
+        scipy.spatial.distance.pdist (use squareform for the square matrix). Samples follow
+        the columns of otu_table.
+    """
+    if metric not in BETA_METRICS:
+        raise ValueError(f"Invalid metric: {metric}. Choose from {BETA_METRICS}.")
+
+    counts, _ = _sample_counts(otu_table)
+    counts.eliminate_zeros()
+    if metric == 'jaccard':
+        counts.data = np.ones_like(counts.data)
+    samples = counts.T.tocsr()
+    totals = np.asarray(samples.sum(axis=1)).ravel()
+
+    n = samples.shape[0]
+    size = n * (n - 1) // 2
+    if output_file is not None:
+        distances = np.lib.format.open_memmap(output_file, mode='w+', dtype=np.float32, shape=(size,))
+    else:
+        distances = np.empty(size, dtype=np.float32)
+
+    def compute(block_pair):
+        row_start, col_start = block_pair
+        rows = slice(row_start, min(row_start + block_size, n))
+        cols = slice(col_start, min(col_start + block_size, n))
+        tile = _tile_distances(samples, totals, rows, cols, metric)
+
+        # Each row of the tile holds the pairs (i, j > i) for one sample i, which are contiguous
+        for offset, i in enumerate(range(rows.start, rows.stop)):
+            first = max(cols.start, i + 1)
+            if first < cols.stop:
+                start = _condensed_index(i, first, n)
+                distances[start:start + cols.stop - first] = tile[offset, first - cols.start:]
+
+    starts = range(0, n, block_size)
+    block_pairs = [(row_start, col_start) for row_start in starts for col_start in starts if col_start >= row_start]
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        list(pool.map(compute, block_pairs))
+
+    if output_file is not None:
+        distances.flush()
+    return distances
+
+# Example usage:
+# rarefied_otu_df, _ = rarefy_otu_table(otu_df, depth=10000, seed=42)
+# alpha = alpha_diversity(rarefied_otu_df)
+# bray_curtis = beta_diversity(rarefied_otu_df, metric='braycurtis', max_workers=8)
+# from scipy.spatial.distance import squareform
+# distance_df = pd.DataFrame(squareform(bray_curtis), index=rarefied_otu_df.columns, columns=rarefied_otu_df.columns)
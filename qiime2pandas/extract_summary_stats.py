@@ -1,48 +1,41 @@
-import pandas as pd
 import os
+from .stats_reader import read_stats_files, update_stats_summary
+from .table_io import with_extension, write_table
+from .profiling import profiled
 
-def extract_summary_stats(directory, output_csv='summary_stats.csv'):
+def _summary_rows(stats):
+    return stats.drop_duplicates('File')[['File', 'Reads', 'Max Length', 'Average Length']].reset_index(drop=True)
+
+@profiled
+def extract_summary_stats(directory, output_csv='summary_stats.csv', max_workers=None, incremental=False,
+                          state_file=None, output_format=None):
     """
     Extracts the summary statistics (reads, max length, avg length) from the first line of each .stats file.
 
     Parameters:
     directory (str): The path to the directory containing .stats files.
     output_csv (str): The name of the output CSV file (default is 'summary_stats.csv').
+    max_workers (int): The number of files to parse concurrently (default is one at a time).
+    incremental (bool): Only parse new or changed files and update the existing CSV in place
+        (default is False). See also ingest_state.watch for polling a directory.
+    state_file (str): The state file of the incremental mode (default is '.<output_csv>.state.json').
+    output_format (str): 'csv', 'parquet' or 'feather'. Parquet and Feather replace the extension
+        of output_csv; by default the format follows its extension (CSV unless .parquet/.feather).
 
     Returns:
     pd.DataFrame: A DataFrame with 'File', 'Reads', 'Max Length', and 'Avg Length' columns.
     """
+    output_path = with_extension(os.path.join(directory, output_csv), output_format)
+    if incremental:
+        return update_stats_summary(directory, output_path, _summary_rows, state_file=state_file,
+                                    max_workers=max_workers, output_format=output_format)
 
-    # Initialize an empty list to collect the summary data
-    summaries = []
-
-    # Iterate over all files in the directory with a .stats extension
-    for filename in os.listdir(directory):
-        if filename.endswith('.stats'):
-            filepath = os.path.join(directory, filename)
-
-            with open(filepath, 'r') as file:
-                first_line = file.readline().strip()
-
-            
-            parts = first_line.split(',')
-            reads = int(parts[0].split()[0])
-            max_len = int(parts[1].split()[-1])
-            avg_len = float(parts[2].split()[-1])
-
-            # Append the data to the list
-            summaries.append({
-                'File': filename,
-                'Reads': reads,
-                'Max Length': max_len,
-                'Average Length': avg_len
-            })
-
-    summary_df = pd.DataFrame(summaries)
+    # One row per file from the long-form table of all .stats files
+    stats = read_stats_files(directory, max_workers=max_workers)
+    summary_df = _summary_rows(stats)
 
-    # Save the DataFrame as a CSV file
-    output_path = os.path.join(directory, output_csv)
-    summary_df.to_csv(output_path, index=False)
+    # Save the DataFrame (as a CSV file by default)
+    write_table(summary_df, output_path, output_format, index=False)
 
     return summary_df
-#extract_summary_stats('/content')
\ No newline at end of file
+#extract_summary_stats('/content')
@@ -0,0 +1,313 @@
+import os
+import mmap
+import numpy as np
+import pandas as pd
+from .qza_archive import QZAArchive
+from .profiling import profiled
+
+FAI_COLUMNS = ['name', 'length', 'offset', 'linebases', 'linewidth']
+
+# 2-bit codes of A, C, G and T; every other byte (N, IUPAC codes, lowercase) is stored as an exception
+_BASES = np.frombuffer(b'ACGT', dtype=np.uint8)
+_CODES = np.full(256, 255, dtype=np.uint8)
+_CODES[_BASES] = np.arange(4, dtype=np.uint8)
+_SHIFTS = np.array([0, 2, 4, 6], dtype=np.uint8)
+
+def build_fasta_index(fasta_file):
+    """
+    Index the records of a FASTA file in the samtools faidx layout.
+
+    Parameters:
+    fasta_file (str): Path to the FASTA file.
+
+    Returns:
+    pd.DataFrame: One row per record with 'name' (the header up to the first whitespace),
+        'length' (bases), 'offset' (byte offset of the sequence), 'linebases' and 'linewidth'
+        (bases and bytes per sequence line).
+    """
+    rows = []
+    record = None
+    offset = 0
+    with open(fasta_file, 'rb') as f:
+        for line in f:
+            if line.startswith(b'>'):
+                if record is not None:
+                    rows.append(record[:5])
+                fields = line[1:].split(None, 1)
+                name = fields[0].decode('utf-8') if fields else ''
+                # name, length, offset, linebases, linewidth, a short line was seen
+                record = [name, 0, offset + len(line), 0, 0, False]
+            elif record is not None:
+                bases = len(line.rstrip(b'\r\n'))
+                if bases == 0:
+                    pass
+                elif record[5] or (record[3] and bases > record[3]):
+                    raise ValueError(f"Record '{record[0]}' of {fasta_file} has lines of different lengths; "
+                                     "it cannot be indexed.")
+                elif record[3] == 0:
+                    record[3], record[4] = bases, len(line)
+                elif bases < record[3]:
+                    record[5] = True
+                record[1] += bases
+            offset += len(line)
+    if record is not None:
+        rows.append(record[:5])
+
+    return pd.DataFrame(rows, columns=FAI_COLUMNS).astype(
+        {'length': np.int64, 'offset': np.int64, 'linebases': np.int64, 'linewidth': np.int64})
+
+def load_fasta_index(fasta_file):
+    """
+    The faidx index of a FASTA file, read from '<fasta_file>.fai' when that is newer than the
+    file, and otherwise built and saved there (kept in memory only if the folder is read-only).
+
+    Parameters:
+    fasta_file (str): Path to the FASTA file.
+
+    Returns:
+    pd.DataFrame: The index, as returned by build_fasta_index.
+    """
+    fai_file = fasta_file + '.fai'
+    if os.path.exists(fai_file) and os.path.getmtime(fai_file) >= os.path.getmtime(fasta_file):
+        return pd.read_csv(fai_file, sep='\t', header=None, names=FAI_COLUMNS, dtype={'name': str},
+                           keep_default_na=False)
+
+    index = build_fasta_index(fasta_file)
+    try:
+        index.to_csv(fai_file, sep='\t', header=False, index=False)
+    except OSError:
+        pass
+    return index
+
+class PackedSequences:
+    """
+    Sequences packed 2 bits per base (4 bases per byte).
+
+    Bases other than A, C, G and T (e.g. N, IUPAC ambiguity codes or lowercase) are kept
+    exactly as exceptions, so unpacking always returns the original sequence. Build it with
+    pack_sequences or FastaFile.pack.
+
+    Parameters:
+    names (list of str): The sequence names.
+    packed (np.ndarray): The packed bases (uint8).
+    offsets (np.ndarray): The offset in bases of each sequence in packed.
+    lengths (np.ndarray): The length of each sequence.
+    exception_positions (np.ndarray): The sorted offsets in bases of the exceptions.
+    exception_bases (np.ndarray): The original byte of each exception.
+
+    Example:
+    packed = pack_sequences(['ASV1'], ['ACGTN'])
+    packed['ASV1']  # 'ACGTN'
+    """
+
+    def __init__(self, names, packed, offsets, lengths, exception_positions, exception_bases):
+        self.names = pd.Index(names)
+        self.packed = packed
+        self.offsets = offsets
+        self.lengths = lengths
+        self.exception_positions = exception_positions
+        self.exception_bases = exception_bases
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def __repr__(self):
+        return f"PackedSequences({len(self)} sequences, {int(self.lengths.sum())} bases, {self.nbytes} bytes)"
+
+    @property
+    def nbytes(self):
+        return (self.packed.nbytes + self.offsets.nbytes + self.lengths.nbytes
+                + self.exception_positions.nbytes + self.exception_bases.nbytes)
+
+    def __getitem__(self, name):
+        i = self.names.get_loc(name)
+        start, length = int(self.offsets[i]), int(self.lengths[i])
+
+        block = self.packed[start // 4:(start + length + 3) // 4]
+        codes = ((block[:, None] >> _SHIFTS) & 3).ravel()
+        bases = _BASES[codes[start % 4:start % 4 + length]]
+
+        lo, hi = np.searchsorted(self.exception_positions, [start, start + length])
+        bases[self.exception_positions[lo:hi] - start] = self.exception_bases[lo:hi]
+        return bases.tobytes().decode('ascii')
+
+    def to_series(self):
+        """All the sequences as a Series of strings indexed by name."""
+        return pd.Series([self[name] for name in self.names], index=self.names, dtype=object)
+
+def pack_sequences(names, sequences, batch_size=10000):
+    """
+    Pack sequences 2 bits per base.
+
+    Parameters:
+    names (list of str): The sequence names.
+    sequences (iterable of str or bytes): The sequences, in the order of names; consumed in
+        batches, so a generator never has to hold every sequence at once.
+    batch_size (int): The number of sequences packed at a time (default is 10000).
+
+    Returns:
+    PackedSequences: The packed sequences.
+    """
+    packed, offsets, lengths, positions, exceptions = [], [], [], [], []
+    total = 0
+    iterator = iter(sequences)
+    while True:
+        batch = [seq.encode('ascii') if isinstance(seq, str) else bytes(seq)
+                 for _, seq in zip(range(batch_size), iterator)]
+        if not batch:
+            break
+        data = np.frombuffer(b''.join(batch), dtype=np.uint8)
+        batch_lengths = np.array([len(seq) for seq in batch], dtype=np.int64)
+
+        codes = _CODES[data]
+        unknown = np.flatnonzero(codes == 255)
+        positions.append(unknown + total)
+        exceptions.append(data[unknown])
+        codes[unknown] = 0
+
+        # Each batch starts on a byte boundary
+        codes = np.concatenate([codes, np.zeros(-len(codes) % 4, dtype=np.uint8)]).reshape(-1, 4)
+        packed.append(np.bitwise_or.reduce(codes << _SHIFTS, axis=1).astype(np.uint8))
+        offsets.append(total + np.cumsum(batch_lengths) - batch_lengths)
+        lengths.append(batch_lengths)
+        total += codes.size
+
+    def combine(arrays, dtype):
+        return np.concatenate(arrays) if arrays else np.zeros(0, dtype=dtype)
+
+    return PackedSequences(names, combine(packed, np.uint8), combine(offsets, np.int64),
+                           combine(lengths, np.int64), combine(positions, np.int64),
+                           combine(exceptions, np.uint8))
+
+class FastaFile:
+    """
+    Random access to the records of a FASTA file by name, without loading the file.
+
+    The file is memory-mapped and located through its faidx index (see load_fasta_index), so
+    looking up a sequence reads only that sequence. Use as a context manager, or call close().
+
+    Parameters:
+    fasta_file (str): Path to the FASTA file, e.g. the dna-sequences.fasta of a rep-seqs artifact.
+
+    Example:
+    with FastaFile('rep-seqs/dna-sequences.fasta') as fasta:
+        sequences = fasta.sequences(differential_features)
+    """
+
+    def __init__(self, fasta_file):
+        self.path = fasta_file
+        self.index = load_fasta_index(fasta_file)
+        self._names = pd.Index(self.index['name'])
+        if not self._names.is_unique:
+            duplicated = self._names[self._names.duplicated()][0]
+            raise ValueError(f"{fasta_file} has more than one record named '{duplicated}'.")
+        self._lengths = self.index['length'].to_numpy()
+        self._offsets = self.index['offset'].to_numpy()
+        self._linebases = self.index['linebases'].to_numpy()
+        self._linewidths = self.index['linewidth'].to_numpy()
+
+        self._file = open(fasta_file, 'rb')
+        # An empty file cannot be memory-mapped
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(fasta_file) else b''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return f"FastaFile('{self.path}', {len(self)} records)"
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, name):
+        return name in self._names
+
+    @property
+    def names(self):
+        return list(self._names)
+
+    def close(self):
+        if isinstance(self._mmap, mmap.mmap):
+            self._mmap.close()
+        self._file.close()
+
+    def fetch(self, name):
+        """The sequence of a record as bytes."""
+        i = self._names.get_loc(name)
+        length, offset, linebases = int(self._lengths[i]), int(self._offsets[i]), int(self._linebases[i])
+        if length == 0:
+            return b''
+        # Whole lines before the last one, then the bases of the last line
+        lines, last = divmod(length - 1, linebases)
+        raw = self._mmap[offset:offset + lines * int(self._linewidths[i]) + last + 1]
+        if length > linebases:
+            raw = raw.replace(b'\n', b'').replace(b'\r', b'')
+        return raw
+
+    def __getitem__(self, name):
+        return self.fetch(name).decode('ascii')
+
+    def sequences(self, names=None):
+        """
+        The sequences of some records.
+
+        Parameters:
+        names (list of str): The record names (default is every record).
+
+        Returns:
+        pd.Series: The sequences as strings, indexed by name.
+        """
+        names = self.names if names is None else list(names)
+        return pd.Series([self[name] for name in names], index=pd.Index(names, name='Feature ID'), dtype=object)
+
+    def pack(self, names=None):
+        """
+        Pack sequences 2 bits per base, reading them from the file one batch at a time.
+
+        Parameters:
+        names (list of str): The record names (default is every record).
+
+        Returns:
+        PackedSequences: The packed sequences.
+        """
+        names = self.names if names is None else list(names)
+        return pack_sequences(names, (self.fetch(name) for name in names))
+
+@profiled
+def read_fasta(fasta_file, output_folder=None):
+    """
+    Open a FASTA file, or the dna-sequences.fasta of a QIIME 2 artifact, for random access.
+
+    Parameters:
+    fasta_file (str): Path to a FASTA file or a .qza artifact holding one.
+    output_folder (str): For artifacts, the folder the FASTA file is extracted to, once (default
+        is a folder with the artifact's name in the current working directory, as unzip_qza_files).
+
+    Returns:
+    FastaFile: The indexed, memory-mapped file.
+    """
+    if not fasta_file.endswith('.qza'):
+        return FastaFile(fasta_file)
+
+    if output_folder is None:
+        output_folder = os.path.join(os.getcwd(), os.path.splitext(os.path.basename(fasta_file))[0])
+    with QZAArchive(fasta_file) as archive:
+        names = [name for name in archive.files if name.endswith(('.fasta', '.fa', '.fna'))]
+        if not names:
+            raise ValueError(f"{fasta_file} holds no FASTA file.")
+        path = os.path.join(output_folder, os.path.basename(names[0]))
+        # Extracted again only if the artifact is newer than the copy
+        if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(fasta_file):
+            path = archive.extract(names[:1], output_folder)[0]
+    return FastaFile(path)
+
+# Example usage:
+# with read_fasta('/content/rep-seqs.qza') as fasta:
+#     print(fasta['4b5eeb300368260019c1fbc7a3c718fc'])
+#     packed = fasta.pack()
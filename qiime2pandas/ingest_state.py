@@ -0,0 +1,173 @@
+import os
+import json
+import time
+import hashlib
+import pandas as pd
+from .table_io import read_table, write_table
+
+def file_hash(path, block_size=2**20):
+    """The BLAKE2b digest of a file's contents, read in blocks."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class IngestState:
+    """
+    Remembers which input files have been processed, so reruns only handle new or changed ones.
+
+    For every file the state records its size, mtime and content hash. A file whose size
+    and mtime are unchanged is skipped without reading it; otherwise its hash decides, so a
+    file that was only touched is not processed again. The state is saved as JSON.
+
+    Parameters:
+    state_file (str): Path of the JSON state file.
+    params (dict): Settings the outputs depend on (e.g. the MaxEE level). If they differ
+        from the saved ones, every file is processed again; the saved files are still
+        reported by removed() once they are deleted, so their rows can be dropped.
+
+    Example:
+    state = IngestState('/content/.summary_stats.csv.state.json')
+    changed = state.changed(paths)
+    ...
+    state.update(changed)
+    state.save()
+    """
+
+    def __init__(self, state_file, params=None):
+        self.state_file = state_file
+        self.params = params or {}
+        self.files = {}
+        # Files recorded under other params: processed again, but their rows are still in the output
+        self.stale = {}
+
+        if os.path.exists(state_file):
+            with open(state_file, 'r') as f:
+                saved = json.load(f)
+            if saved.get('params', {}) == self.params:
+                self.files = saved['files']
+            else:
+                self.stale = saved['files']
+
+    def __repr__(self):
+        return f"IngestState('{self.state_file}', {len(self.files)} files)"
+
+    def changed(self, paths):
+        """
+        The files that are new or whose contents changed since they were last recorded.
+
+        Parameters:
+        paths (list of str): The current input files.
+
+        Returns:
+        list of str: The new or changed files, in the order of paths.
+        """
+        changed = []
+        for path in paths:
+            key = os.path.abspath(path)
+            record = self.files.get(key)
+            stat = os.stat(path)
+            if record is not None and record['size'] == stat.st_size and record['mtime_ns'] == stat.st_mtime_ns:
+                continue
+            if record is not None and record['size'] == stat.st_size and record['hash'] == file_hash(path):
+                record['mtime_ns'] = stat.st_mtime_ns  # Touched but not modified
+                continue
+            changed.append(path)
+        return changed
+
+    def removed(self, paths):
+        """The recorded files that are not in paths any more."""
+        current = {os.path.abspath(path) for path in paths}
+        return [key for key in {**self.stale, **self.files} if key not in current]
+
+    def update(self, paths):
+        """Record the current size, mtime and hash of files that were processed."""
+        for path in paths:
+            stat = os.stat(path)
+            self.files[os.path.abspath(path)] = {
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'hash': file_hash(path),
+            }
+
+    def forget(self, paths):
+        """Drop files from the state, e.g. files that were removed."""
+        for path in paths:
+            self.files.pop(os.path.abspath(path), None)
+            self.stale.pop(os.path.abspath(path), None)
+
+    def reset(self):
+        """Forget every file, so all of them are processed again."""
+        self.files = {}
+        self.stale = {}
+
+    def save(self):
+        """Write the state file (atomically, so an interrupted save keeps the previous state)."""
+        temp_file = self.state_file + '.tmp'
+        with open(temp_file, 'w') as f:
+            json.dump({'params': self.params, 'files': self.files}, f)
+        os.replace(temp_file, self.state_file)
+
+def default_state_file(output_path):
+    """The state file kept next to an output: '.<output name>.state.json'."""
+    folder, name = os.path.split(os.path.abspath(output_path))
+    return os.path.join(folder, f'.{name}.state.json')
+
+def upsert_table(output_path, rows, replaced, key_column='File', output_format=None):
+    """
+    Update a summary table in place: drop the rows of replaced keys and append the new rows.
+
+    Parameters:
+    output_path (str): Path of the table (CSV, Parquet or Feather); created if it does not exist.
+    rows (pd.DataFrame): The new rows.
+    replaced (iterable): The keys whose existing rows are removed (new, changed and deleted inputs).
+    key_column (str): The column holding the key (default is 'File').
+    output_format (str): 'csv', 'parquet' or 'feather' (default follows the extension).
+
+    Returns:
+    pd.DataFrame: The full updated table.
+    """
+    table = rows.reset_index(drop=True)
+    if os.path.exists(output_path):
+        existing = read_table(output_path, output_format)
+        existing = existing[~existing[key_column].isin(set(replaced))]
+        if len(existing):
+            table = pd.concat([existing, rows], ignore_index=True) if len(rows) else existing.reset_index(drop=True)
+
+    # The extension is kept last so the format can still be inferred from it
+    folder, name = os.path.split(output_path)
+    temp_file = os.path.join(folder, '.tmp-' + name)
+    write_table(table, temp_file, output_format, index=False)
+    os.replace(temp_file, output_path)
+    return table
+
+def watch(func, *args, interval=60.0, max_polls=None, **kwargs):
+    """
+    Call an incremental function repeatedly, e.g. while a sequencing run is still writing files.
+
+    Parameters:
+    func (callable): The function to call, e.g. extract_summary_stats; incremental=True is passed.
+    *args: Positional arguments of func.
+    interval (float): Seconds between calls (default is 60).
+    max_polls (int): Stop after this many calls (default is to run until interrupted).
+    **kwargs: Keyword arguments of func.
+
+    Returns:
+    The result of the last call.
+    """
+    result = None
+    polls = 0
+    try:
+        while max_polls is None or polls < max_polls:
+            result = func(*args, incremental=True, **kwargs)
+            polls += 1
+            if max_polls is None or polls < max_polls:
+                time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    return result
+
+# Example usage:
+# watch(extract_summary_stats, '/data/run42/stats', interval=30)
+# watch(unzip_qza_files, '/data/run42/artifacts', interval=300)
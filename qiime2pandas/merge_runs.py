@@ -0,0 +1,190 @@
+import logging
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from .otu_table import OTUTable
+from .tax_lineage import LINEAGES, RANKS, _RANK_ORDER, rank_columns
+from .profiling import profiled, stage, log_event
+
+SAMPLE_POLICIES = ['sum', 'first', 'rename', 'error']
+TAXONOMY_POLICIES = ['majority', 'first', 'last', 'consensus']
+
+def _as_otu_table(table):
+    if isinstance(table, OTUTable):
+        return table
+    # A merged table of import_and_merge: sample columns followed by the ranks
+    return OTUTable.from_pandas(table, taxonomy_columns=rank_columns(table.columns))
+
+def _sample_codes(tables, samples, run_names):
+    """The column of every sample of every run in the merged table, and the merged sample IDs."""
+    run_samples = [table.sample_ids for table in tables]
+    if samples == 'rename':
+        # Samples that occur in more than one run get the run name as a suffix
+        counts = pd.Series(np.concatenate(run_samples)).value_counts()
+        run_samples = [np.array([f"{sample}_{run}" if counts[sample] > 1 else sample for sample in ids], dtype=object)
+                       for ids, run in zip(run_samples, run_names)]
+
+    codes, sample_ids = pd.factorize(np.concatenate(run_samples) if run_samples else np.array([], dtype=object))
+    bounds = np.cumsum([0] + [len(ids) for ids in run_samples])
+    run_codes = [codes[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+
+    owner = np.full(len(sample_ids), -1, dtype=np.int64)
+    for run, sample_codes in enumerate(run_codes):
+        shared = sample_codes[owner[sample_codes] >= 0]
+        if len(shared) and samples == 'error':
+            raise ValueError(f"Samples occur in more than one run: {list(sample_ids[shared][:5])}.")
+        owner[sample_codes[owner[sample_codes] < 0]] = run
+    return run_codes, owner, np.asarray(sample_ids, dtype=object)
+
+def _taxonomy_codes(tables, lineages):
+    """The lineage dictionary codes (n_observations x 7, -1 where missing) of each run's taxonomy."""
+    taxonomies = [table.taxonomy for table in tables if table.taxonomy is not None]
+    adopted = iter(lineages.adopt(taxonomies))
+
+    run_codes = []
+    for table in tables:
+        codes = np.full((table.shape[0], len(RANKS)), -1, dtype=np.int32)
+        if table.taxonomy is not None:
+            taxonomy = next(adopted)
+            for col in rank_columns(taxonomy.columns):
+                codes[:, _RANK_ORDER[col.lower()]] = taxonomy[col].cat.codes.to_numpy()
+        run_codes.append(codes)
+    return run_codes
+
+def _reconcile(features, codes, n_features, policy):
+    """
+    Pick one lineage per feature from the lineages assigned by the runs.
+
+    Parameters:
+    features (np.ndarray): The global feature of each assignment, in run order.
+    codes (np.ndarray): The rank codes of each assignment (n_assignments x 7).
+    n_features (int): The number of features.
+    policy (str): One of TAXONOMY_POLICIES.
+
+    Returns:
+    np.ndarray: The rank codes of each feature (n_features x 7).
+    int: The number of features whose runs assigned different lineages.
+    """
+    result = np.full((n_features, codes.shape[1]), -1, dtype=np.int32)
+    # Runs that have no taxonomy for a feature do not take part
+    assigned = (codes >= 0).any(axis=1)
+    features, codes = features[assigned], codes[assigned]
+    if not len(features):
+        return result, 0
+
+    # Hash the lineages and the (feature, lineage) pairs; codes follow the order of first appearance
+    lineage_ids = np.zeros(len(features), dtype=np.int64)
+    for rank_codes in codes.T:
+        lineage_ids = pd.factorize(lineage_ids * (int(rank_codes.max()) + 2) + rank_codes + 1)[0]
+    pair_ids = pd.factorize(features * (int(lineage_ids.max()) + 1) + lineage_ids)[0]
+    first_seen = np.flatnonzero(pair_ids > np.maximum.accumulate(np.r_[-1, pair_ids[:-1]]))
+    pair_features = features[first_seen]
+    conflicts = int(np.count_nonzero(np.bincount(pair_features, minlength=n_features) > 1))
+
+    if policy in ('first', 'last'):
+        order = np.arange(len(features)) if policy == 'first' else np.arange(len(features))[::-1]
+        _, first = np.unique(features[order], return_index=True)
+        chosen = order[first]
+        result[features[chosen]] = codes[chosen]
+    elif policy == 'majority':
+        # Most runs win; ties go to the lineage seen first
+        votes = np.bincount(pair_ids)
+        order = np.lexsort((first_seen, -votes, pair_features))
+        best = order[np.r_[True, pair_features[order][1:] != pair_features[order][:-1]]]
+        chosen = first_seen[best]
+        result[features[chosen]] = codes[chosen]
+    else:
+        # Consensus: keep the ranks every run agrees on, down to the first disagreement
+        order = np.argsort(features, kind='stable')
+        features, codes = features[order], codes[order]
+        starts = np.flatnonzero(np.r_[True, features[1:] != features[:-1]])
+        agree = np.minimum.reduceat(codes, starts, axis=0) == np.maximum.reduceat(codes, starts, axis=0)
+        agree = np.logical_and.accumulate(agree, axis=1)
+        result[features[starts]] = np.where(agree, codes[starts], -1)
+    return result, conflicts
+
+@profiled
+def merge_runs(tables, samples='sum', taxonomy='majority', run_names=None, lineages=None):
+    """
+    Merge the feature tables of several runs into one sparse table.
+
+    All the feature IDs (e.g. MD5 ASV IDs) are hashed once into a global index, and the
+    counts of every run are remapped into it in a single pass, so the merge takes time
+    proportional to the number of non-zero counts rather than the number of runs times
+    the number of features, and nothing is densified.
+
+    Parameters:
+    tables (list of OTUTable or pd.DataFrame): The runs, e.g. the result of import_and_merge.
+    samples (str): What to do with a sample ID that occurs in more than one run: 'sum' its counts
+        (default), keep the 'first' run's counts, 'rename' it to '<sample>_<run name>' in every
+        run, or raise an 'error'.
+    taxonomy (str): How to reconcile a feature that runs assign different lineages: the lineage of
+        the 'majority' of runs (ties go to the earlier run; default), the 'first' or 'last' run's,
+        or the 'consensus' of the runs (ranks below the first disagreement are left empty).
+    run_names (list of str): Names of the runs for samples='rename' (default is 'run1', 'run2', ...).
+    lineages (LineageDictionary): The dictionary the ranks are interned in (default is the shared
+        tax_lineage.LINEAGES).
+
+    Returns:
+    OTUTable: The merged table, features in order of first appearance, with the reconciled
+        taxonomy (categorical ranks) if any run has one.
+    """
+    if samples not in SAMPLE_POLICIES:
+        raise ValueError(f"Invalid samples policy: {samples}. Choose from {SAMPLE_POLICIES}.")
+    if taxonomy not in TAXONOMY_POLICIES:
+        raise ValueError(f"Invalid taxonomy policy: {taxonomy}. Choose from {TAXONOMY_POLICIES}.")
+    if lineages is None:
+        lineages = LINEAGES
+
+    tables = [_as_otu_table(table) for table in tables]
+    if run_names is None:
+        run_names = [f'run{i + 1}' for i in range(len(tables))]
+    if len(run_names) != len(tables):
+        raise ValueError(f"{len(run_names)} run names were given for {len(tables)} runs.")
+
+    with stage('index') as index:
+        # One hash table over every feature ID of every run
+        feature_codes, feature_ids = pd.factorize(
+            np.concatenate([table.observation_ids for table in tables]) if tables else np.array([], dtype=object))
+        bounds = np.cumsum([0] + [table.shape[0] for table in tables])
+        run_features = [feature_codes[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+        run_samples, owner, sample_ids = _sample_codes(tables, samples, run_names)
+        index.add(rows=len(feature_codes))
+
+    with stage('remap') as remap:
+        rows, cols, data = [], [], []
+        for run, (table, features, sample_codes) in enumerate(zip(tables, run_features, run_samples)):
+            coo = table.counts.tocoo()
+            keep = slice(None) if samples != 'first' else owner[sample_codes[coo.col]] == run
+            rows.append(features[coo.row[keep]])
+            cols.append(sample_codes[coo.col[keep]])
+            data.append(coo.data[keep])
+        dtype = np.result_type(*[table.counts.dtype for table in tables]) if tables else np.int64
+        # Counts of the same feature and sample in several runs are summed by the conversion
+        counts = sparse.csc_matrix(
+            (np.concatenate(data).astype(dtype) if data else np.zeros(0, dtype),
+             (np.concatenate(rows) if rows else np.zeros(0, np.int64),
+              np.concatenate(cols) if cols else np.zeros(0, np.int64))),
+            shape=(len(feature_ids), len(sample_ids)))
+        remap.add(rows=counts.nnz)
+
+    merged_taxonomy = None
+    if any(table.taxonomy is not None for table in tables):
+        with stage('taxonomy') as reconcile:
+            run_codes = _taxonomy_codes(tables, lineages)
+            codes, conflicts = _reconcile(np.concatenate(run_features), np.concatenate(run_codes),
+                                          len(feature_ids), taxonomy)
+            merged_taxonomy = pd.DataFrame({rank: lineages.categorical(rank, codes[:, i])
+                                            for i, rank in enumerate(RANKS)},
+                                           index=pd.Index(feature_ids, name='#OTU ID'))
+            reconcile.add(rows=len(merged_taxonomy))
+        if conflicts:
+            log_event(f"{conflicts} features have conflicting taxonomy across runs; resolved by '{taxonomy}'.",
+                      logging.WARNING, conflicts=conflicts, policy=taxonomy)
+
+    return OTUTable(counts, feature_ids, sample_ids, merged_taxonomy)
+
+# Example usage:
+# merged_tables = import_and_merge(qza_file_paths)
+# study = merge_runs(merged_tables, samples='rename', taxonomy='consensus')
+# print(study)
@@ -0,0 +1,170 @@
+import re
+import numpy as np
+import pandas as pd
+from .qza_archive import QZAArchive
+from .profiling import profiled
+
+# Comments, quoted labels, punctuation and unquoted labels (whitespace outside quotes is ignored)
+_TOKEN_RE = re.compile(r"\s*(?:\[[^\]]*\]|'((?:[^']|'')*)'|([(),:;])|([^()\[\]':;,\s]+))")
+
+class Tree:
+    """
+    A phylogenetic tree stored as arrays, one entry per node.
+
+    Nodes are numbered in preorder (every parent before its children, the root is 0), so
+    whole-tree computations are single passes over the arrays and never recurse.
+
+    Parameters:
+    parent (np.ndarray): The parent of each node (-1 for the root).
+    branch_length (np.ndarray): The length of the branch above each node (NaN where missing).
+    names (np.ndarray): The label of each node (None where missing).
+
+    Example:
+    tree = read_newick('rooted-tree.qza')
+    tip_depths = tree.root_distances()[tree.tips]
+    """
+
+    def __init__(self, parent, branch_length, names):
+        self.parent = np.asarray(parent, dtype=np.int64)
+        self.branch_length = np.asarray(branch_length, dtype=np.float64)
+        self.names = np.asarray(names, dtype=object)
+
+        # Children in compressed form: the children of node i are child_indices[child_indptr[i]:child_indptr[i + 1]]
+        children = np.flatnonzero(self.parent >= 0)
+        order = np.argsort(self.parent[children], kind='stable')
+        self.child_indices = children[order]
+        counts = np.bincount(self.parent[children], minlength=len(self.parent))
+        self.child_indptr = np.concatenate([[0], np.cumsum(counts)])
+
+    def __len__(self):
+        return len(self.parent)
+
+    def __repr__(self):
+        return f"Tree({len(self)} nodes, {len(self.tips)} tips)"
+
+    @property
+    def tips(self):
+        """The nodes without children."""
+        return np.flatnonzero(np.diff(self.child_indptr) == 0)
+
+    @property
+    def tip_names(self):
+        return list(self.names[self.tips])
+
+    def children(self, node):
+        """The children of a node."""
+        return self.child_indices[self.child_indptr[node]:self.child_indptr[node + 1]]
+
+    def root_distances(self):
+        """The sum of the branch lengths from the root to every node (missing lengths count as 0)."""
+        lengths = np.nan_to_num(self.branch_length)
+        distances = np.zeros(len(self))
+        # Preorder: the parent's distance is always known before the child's
+        for node in range(1, len(self)):
+            distances[node] = distances[self.parent[node]] + lengths[node]
+        return distances
+
+    def to_frame(self):
+        """The nodes as a DataFrame with 'name', 'parent', 'branch_length' and 'is_tip'."""
+        is_tip = np.zeros(len(self), dtype=bool)
+        is_tip[self.tips] = True
+        return pd.DataFrame({'name': self.names, 'parent': self.parent,
+                             'branch_length': self.branch_length, 'is_tip': is_tip})
+
+def parse_newick(text):
+    """
+    Parse a Newick tree without recursion, so trees of any depth and size can be read.
+
+    Labels may be quoted ('...'), comments in square brackets are skipped, and a label after
+    a closing bracket names the internal node (e.g. a support value).
+
+    Parameters:
+    text (str): The Newick string; only the first tree (up to ';') is read.
+
+    Returns:
+    Tree: The tree.
+    """
+    parent, lengths, names = [], [], []
+    open_nodes = []  # The internal nodes whose children are being read
+    current = None   # The node a label or branch length belongs to
+    expect_node = True
+    length_next = False
+
+    def new_node():
+        parent.append(open_nodes[-1] if open_nodes else -1)
+        lengths.append(np.nan)
+        names.append(None)
+        return len(parent) - 1
+
+    for match in _TOKEN_RE.finditer(text):
+        quoted, punctuation, label = match.groups()
+        if quoted is None and punctuation is None and label is None:
+            continue  # A comment or trailing whitespace
+        if quoted is not None:
+            label = quoted.replace("''", "'")
+
+        if label is not None:
+            if length_next:
+                lengths[current] = float(label)
+                length_next = False
+            else:
+                if expect_node:
+                    current = new_node()
+                    expect_node = False
+                names[current] = label
+        elif punctuation == '(':
+            if parent and not open_nodes:
+                raise ValueError("Invalid Newick string: more than one root.")
+            current = new_node()
+            open_nodes.append(current)
+        elif punctuation == ':':
+            if expect_node:
+                current = new_node()
+                expect_node = False
+            length_next = True
+        elif punctuation in (',', ')'):
+            if not open_nodes:
+                raise ValueError(f"Invalid Newick string: unexpected '{punctuation}'.")
+            if expect_node:
+                new_node()  # An empty leaf, as in '(,)'
+            if punctuation == ',':
+                expect_node = True
+            else:
+                current = open_nodes.pop()
+                expect_node = False
+        else:  # ';'
+            break
+        if punctuation == '(':
+            expect_node = True
+
+    if open_nodes:
+        raise ValueError("Invalid Newick string: unbalanced brackets.")
+    if not parent:
+        raise ValueError("Invalid Newick string: no nodes.")
+    return Tree(parent, lengths, names)
+
+@profiled
+def read_newick(newick_file):
+    """
+    Read a Newick tree file, or the tree.nwk of a QIIME 2 phylogeny artifact.
+
+    Parameters:
+    newick_file (str): Path to a .nwk file or a .qza artifact (e.g. rooted-tree.qza).
+
+    Returns:
+    Tree: The tree.
+    """
+    if newick_file.endswith('.qza'):
+        with QZAArchive(newick_file) as archive:
+            names = [name for name in archive.files if name.endswith(('.nwk', '.tre', '.tree'))]
+            if not names:
+                raise ValueError(f"{newick_file} holds no Newick tree.")
+            text = archive.read(names[0]).decode('utf-8')
+    else:
+        with open(newick_file, 'r', encoding='utf-8') as f:
+            text = f.read()
+    return parse_newick(text)
+
+# Example usage:
+# tree = read_newick('/content/rooted-tree.qza')
+# print(tree.to_frame().head())
@@ -0,0 +1,147 @@
+import numpy as np
+from scipy import sparse
+from .otu_table import OTUTable
+from .tax_lineage import rank_columns
+from .profiling import profiled, current_stage
+
+METHODS = ['tss', 'percent', 'clr', 'log', 'hellinger']
+
+def _check_method(method, pseudocount):
+    if method not in METHODS:
+        raise ValueError(f"Invalid method: {method}. Choose from {METHODS}.")
+    if method in ('clr', 'log') and pseudocount <= 0:
+        raise ValueError("The pseudocount of 'clr' and 'log' must be positive.")
+
+def _transform_block(values, method, pseudocount):
+    """
+    Transform a dense block of sample columns in place.
+
+    Parameters:
+    values (np.ndarray): Float counts with OTUs as rows and samples as columns.
+    method (str): One of METHODS.
+    pseudocount (float): Added to every count before taking logs ('clr' and 'log').
+    """
+    if method in ('tss', 'percent', 'hellinger'):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scale = (100.0 if method == 'percent' else 1.0) / values.sum(axis=0)
+        values *= scale.astype(values.dtype)
+        if method == 'hellinger':
+            np.sqrt(values, out=values)
+    else:
+        values += values.dtype.type(pseudocount)
+        np.log(values, out=values)
+        if method == 'clr':
+            values -= values.mean(axis=0)
+
+def _preserves_zeros(method, pseudocount):
+    return method in ('tss', 'percent', 'hellinger') or (method == 'log' and pseudocount == 1)
+
+def _normalize_sparse(counts, method, pseudocount, dtype, block_size, inplace=False):
+    # CSC data is stored column by column, so each block of samples is a slice of counts.data
+    counts = sparse.csc_matrix(counts)
+    if not _preserves_zeros(method, pseudocount):
+        result = np.empty(counts.shape, dtype=dtype, order='F')
+        for start in range(0, counts.shape[1], block_size):
+            stop = min(start + block_size, counts.shape[1])
+            block = counts[:, start:stop].toarray().astype(dtype, copy=False)
+            _transform_block(block, method, pseudocount)
+            result[:, start:stop] = block
+        return result
+
+    # Only the input's own float data is overwritten, and only in place
+    data = counts.data.astype(dtype, copy=not inplace)
+    sums = np.asarray(counts.sum(axis=0), dtype=np.float64).ravel()
+    for start in range(0, counts.shape[1], block_size):
+        stop = min(start + block_size, counts.shape[1])
+        lo, hi = counts.indptr[start], counts.indptr[stop]
+        block = data[lo:hi]
+        if method == 'log':
+            np.log1p(block, out=block)
+            continue
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scale = (100.0 if method == 'percent' else 1.0) / sums[start:stop]
+        block *= np.repeat(scale, np.diff(counts.indptr[start:stop + 1])).astype(dtype)
+        if method == 'hellinger':
+            np.sqrt(block, out=block)
+    return sparse.csc_matrix((data, counts.indices, counts.indptr), shape=counts.shape)
+
+@profiled
+def normalize(otu_table, method='percent', pseudocount=1.0, dtype=np.float64, inplace=False, block_size=64):
+    """
+    Normalize the sample columns of an OTU table.
+
+    The table is transformed a block of samples at a time, so only one block is ever held
+    as a temporary copy. Taxonomy and other text columns are left untouched (and shared
+    with the input unless inplace), so the table never has to be split and merged again.
+
+    Methods:
+    'tss': total-sum scaling, every sample sums to 1.
+    'percent': relative abundance, every sample sums to 100.
+    'hellinger': the square root of the total-sum scaled counts.
+    'log': log(count + pseudocount).
+    'clr': centred log-ratio, log(count + pseudocount) minus the mean of the logs of the sample.
+
+    'tss', 'percent', 'hellinger' and 'log' with a pseudocount of 1 keep zeros at zero, so sparse
+    tables stay sparse; 'clr' and 'log' with another pseudocount produce dense values.
+
+    Parameters:
+    otu_table (pd.DataFrame, OTUTable, np.ndarray or scipy.sparse matrix): The OTU table with OTUs as
+        rows and samples as columns, e.g. a merged table of import_and_merge.
+    method (str): One of 'tss', 'percent', 'clr', 'log' or 'hellinger' (default is 'percent').
+    pseudocount (float): Added to every count before taking logs (default is 1).
+    dtype (np.dtype): The float type of the result; np.float32 halves the memory (default is np.float64).
+    inplace (bool): Overwrite the sample columns of a DataFrame, the counts of an OTUTable, or the
+        values of an array or CSC matrix of dtype, instead of returning a new table (default is
+        False). A sparse matrix cannot hold 'clr' (or 'log' with another pseudocount) in place.
+    block_size (int): The number of samples transformed at a time (default is 64).
+
+    Returns:
+    The normalized table (None if inplace): of the same type as otu_table, except that a scipy
+        sparse matrix gives a dense np.ndarray for 'clr' and for 'log' with a pseudocount other
+        than 1. For an OTUTable those methods store every value in the sparse matrix.
+    """
+    _check_method(method, pseudocount)
+    dtype = np.dtype(dtype)
+    if dtype.kind != 'f':
+        raise ValueError(f"Invalid dtype: {dtype}. Normalized values need a float type.")
+
+    if isinstance(otu_table, OTUTable) or sparse.issparse(otu_table):
+        counts = otu_table.counts if isinstance(otu_table, OTUTable) else otu_table
+        if inplace and not isinstance(otu_table, OTUTable):
+            if not _preserves_zeros(method, pseudocount):
+                raise ValueError(f"'{method}' gives dense values, which a sparse matrix cannot hold in place.")
+            if counts.format != 'csc' or counts.dtype != dtype:
+                raise ValueError(f"In-place normalization needs a CSC matrix of {dtype}, "
+                                 f"not a {counts.format.upper()} matrix of {counts.dtype}.")
+        result = _normalize_sparse(counts, method, pseudocount, dtype, block_size, inplace)
+        current_stage().add(rows=counts.shape[0])
+        if not isinstance(otu_table, OTUTable):
+            return None if inplace else result
+        if inplace:
+            otu_table.counts = sparse.csc_matrix(result)
+            return None
+        return OTUTable(result, otu_table.observation_ids, otu_table.sample_ids, otu_table.taxonomy)
+
+    if isinstance(otu_table, np.ndarray):
+        if inplace and otu_table.dtype != dtype:
+            raise ValueError(f"In-place normalization needs an array of {dtype}, not {otu_table.dtype}.")
+        values = otu_table if inplace else np.array(otu_table, dtype=dtype)
+        for start in range(0, values.shape[1], block_size):
+            _transform_block(values[:, start:start + block_size], method, pseudocount)
+        return None if inplace else values
+
+    ranks = set(rank_columns(otu_table.columns))
+    sample_columns = [col for col in otu_table.select_dtypes(include=['number']).columns if col not in ranks]
+    table = otu_table if inplace else otu_table.copy(deep=False)
+    for start in range(0, len(sample_columns), block_size):
+        columns = sample_columns[start:start + block_size]
+        block = table[columns].to_numpy(dtype=dtype, copy=True)
+        _transform_block(block, method, pseudocount)
+        table[columns] = block
+    current_stage().add(rows=len(table))
+    return None if inplace else table
+
+# Example usage:
+# rel_table = normalize(merged_table, 'percent', dtype=np.float32)
+# clr_table = normalize(otu_table, 'clr', pseudocount=0.5)
+# normalize(merged_table, 'hellinger', inplace=True)
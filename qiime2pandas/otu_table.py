@@ -0,0 +1,164 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+class OTUTable:
+    """
+    Lightweight sparse OTU table: a CSC count matrix with observation and sample IDs.
+
+    OTUs (observations) are rows and samples are columns, as in the DataFrames used
+    elsewhere in the package, but zeros are never stored. An optional taxonomy
+    DataFrame holds one row per observation, in the same order as the matrix rows.
+
+    Parameters:
+    counts (array-like or scipy.sparse matrix): The counts with OTUs as rows and samples as columns.
+    observation_ids (array-like): The OTU/ASV IDs, one per row.
+    sample_ids (array-like): The sample IDs, one per column.
+    taxonomy (pd.DataFrame): Taxonomy ranks, one row per observation (optional).
+
+    Example:
+    table = OTUTable.from_biom('feature-table.biom')
+    otu_df = table.to_pandas()
+    """
+
+    __slots__ = ('counts', 'observation_ids', 'sample_ids', 'taxonomy')
+
+    def __init__(self, counts, observation_ids, sample_ids, taxonomy=None):
+        self.counts = sparse.csc_matrix(counts)
+        self.observation_ids = np.asarray(observation_ids, dtype=object)
+        self.sample_ids = np.asarray(sample_ids, dtype=object)
+
+        if self.counts.shape != (len(self.observation_ids), len(self.sample_ids)):
+            raise ValueError(f"Count matrix shape {self.counts.shape} does not match "
+                             f"{len(self.observation_ids)} observation IDs and {len(self.sample_ids)} sample IDs.")
+
+        if taxonomy is not None:
+            if len(taxonomy) != len(self.observation_ids):
+                raise ValueError(f"Taxonomy has {len(taxonomy)} rows but the table has {len(self.observation_ids)} observations.")
+            taxonomy = taxonomy.set_axis(pd.Index(self.observation_ids, name=taxonomy.index.name), axis=0)
+        self.taxonomy = taxonomy
+
+    @property
+    def shape(self):
+        return self.counts.shape
+
+    def __repr__(self):
+        ranks = '' if self.taxonomy is None else f", taxonomy={list(self.taxonomy.columns)}"
+        return f"OTUTable({self.shape[0]} observations x {self.shape[1]} samples, nnz={self.counts.nnz}{ranks})"
+
+    def sample_sums(self):
+        """Total counts of each sample."""
+        return np.asarray(self.counts.sum(axis=0)).ravel()
+
+    def copy(self):
+        taxonomy = None if self.taxonomy is None else self.taxonomy.copy()
+        return OTUTable(self.counts.copy(), self.observation_ids.copy(), self.sample_ids.copy(), taxonomy)
+
+    def select_samples(self, sample_indices):
+        """
+        Keep only the selected sample columns.
+
+        Parameters:
+        sample_indices (list of int): Positions of the samples to keep.
+
+        Returns:
+        OTUTable: A new table with the selected samples.
+        """
+        sample_indices = np.asarray(sample_indices, dtype=np.int64)
+        return OTUTable(self.counts[:, sample_indices], self.observation_ids, self.sample_ids[sample_indices], self.taxonomy)
+
+    def collapse(self, taxonomic_level, lineage=True):
+        """
+        Sum the counts of all observations that share a taxon at the given level.
+
+        The sum is a sparse indicator-matrix product, so the table is never densified.
+        Observations without a taxon at that level are dropped.
+
+        Parameters:
+        taxonomic_level (str): The taxonomy column to aggregate at (e.g. 'phylum').
+        lineage (bool): Group by the full lineage down to the level, so identically named taxa
+            with different parents are kept apart (default is True).
+
+        Returns:
+        OTUTable: A table with one row per taxon, sorted by lineage. With lineage=True, the
+            observation IDs are the ';'-joined lineages.
+        """
+        from .tax_lineage import lineage_ranks, tax_glom_all
+
+        if self.taxonomy is None or taxonomic_level not in self.taxonomy.columns:
+            raise ValueError(f"Taxonomic level '{taxonomic_level}' not found in the taxonomy.")
+
+        ranks = lineage_ranks(self.taxonomy.columns, taxonomic_level, lineage)
+        return tax_glom_all(self, ranks=ranks)[taxonomic_level]
+
+    @classmethod
+    def from_biom(cls, biom_file, taxonomy=None):
+        """
+        Load a BIOM file without densifying it.
+
+        Parameters:
+        biom_file (str or file-like): Path to the .biom file, or a seekable binary file object.
+        taxonomy (pd.DataFrame): Taxonomy indexed by feature ID; reindexed to the table (optional).
+
+        Returns:
+        OTUTable: The sparse table.
+        """
+        from .biom_reader import read_biom
+
+        counts, observation_ids, sample_ids = read_biom(biom_file)
+        if taxonomy is not None:
+            taxonomy = taxonomy.reindex(observation_ids)
+        return cls(counts, observation_ids, sample_ids, taxonomy)
+
+    @classmethod
+    def from_pandas(cls, df, taxonomy_columns=None, observation_column=None):
+        """
+        Build an OTUTable from a DataFrame with OTUs as rows.
+
+        Parameters:
+        df (pd.DataFrame): The OTU table, optionally with taxonomy columns (e.g. a merged table).
+        taxonomy_columns (list of str): Columns holding taxonomy. If None, every non-numeric column is taxonomy.
+        observation_column (str): Column holding the OTU IDs. If None, the index is used.
+
+        Returns:
+        OTUTable: The sparse table.
+        """
+        if observation_column is not None:
+            df = df.set_index(observation_column)
+
+        if taxonomy_columns is None:
+            taxonomy_columns = df.select_dtypes(exclude=['number']).columns.tolist()
+        sample_columns = [col for col in df.columns if col not in taxonomy_columns]
+
+        samples = df[sample_columns]
+        if len(sample_columns) and all(isinstance(dtype, pd.SparseDtype) for dtype in samples.dtypes):
+            counts = samples.sparse.to_coo()
+        else:
+            counts = samples.to_numpy()
+
+        taxonomy = df[taxonomy_columns] if taxonomy_columns else None
+        return cls(counts, df.index, sample_columns, taxonomy)
+
+    def to_pandas(self, sparse_frame=False):
+        """
+        Convert to a DataFrame with sample columns followed by any taxonomy columns.
+
+        Parameters:
+        sparse_frame (bool): Keep the counts as pandas sparse columns (default is False).
+
+        Returns:
+        pd.DataFrame: The OTU table indexed by observation ID.
+        """
+        index = pd.Index(self.observation_ids, name=None if self.taxonomy is None else self.taxonomy.index.name)
+        if sparse_frame:
+            df = pd.DataFrame.sparse.from_spmatrix(self.counts, index=index, columns=self.sample_ids)
+        else:
+            df = pd.DataFrame(self.counts.toarray(), index=index, columns=self.sample_ids)
+
+        if self.taxonomy is not None:
+            df = pd.concat([df, self.taxonomy.set_axis(index, axis=0)], axis=1)
+        return df
+
+# Example usage:
+# table = OTUTable.from_pandas(merged_table)
+# print(table, table.sample_sums())
@@ -1,6 +1,91 @@
+import re
+import numpy as np
 import pandas as pd
+from .otu_table import OTUTable
+from .chunked import relative_abundance_file
+from .table_io import write_table
+from .profiling import profiled
+from .tax_lineage import LINEAGES
+from .normalize import normalize
+
+# SINTAX rank prefixes, in the order they appear in a prediction
+SINTAX_RANKS = [
+    ('kingdom', '[dk]'), ('phylum', 'p'), ('class', 'c'), ('order', 'o'),
+    ('family', 'f'), ('genus', 'g'), ('species', 's')
+]
+
+# One regex for the whole prediction, e.g. 'd:Bacteria(1.0000),p:Firmicutes(0.9800)'; every rank
+# is optional, and the confidence in brackets is only present in the second SINTAX column
+_SINTAX_RE = re.compile(''.join(
+    rf'(?:(?:^|,){prefix}:(?P<{rank}>[^,(]*)(?:\((?P<{rank}_confidence>[\d.]+)\))?)?'
+    for rank, prefix in SINTAX_RANKS
+))
+
+def _parse_sintax_chunk(chunk, confidence, lineages):
+    # The rank columns hold codes of the lineage dictionary; read_sintax turns them into categoricals
+    ranks = [rank for rank, _ in SINTAX_RANKS]
+    confidence_columns = [f'{rank}_confidence' for rank in ranks]
+
+    predictions = chunk[1].fillna('').str.extract(_SINTAX_RE)
+    confidences = predictions[confidence_columns].astype(np.float64)
+
+    if confidence is not None:
+        # Keep ranks down to the first one below the cutoff
+        passed = np.logical_and.accumulate(confidences.to_numpy() >= confidence, axis=1)
+        codes = np.column_stack([lineages.encode(rank, predictions[rank].where(passed[:, i]))
+                                 for i, rank in enumerate(ranks)])
+        confidences = confidences.where(passed)
+    elif 3 in chunk.columns:
+        # Use the taxonomy SINTAX already truncated at its own cutoff (fourth column); these
+        # strings repeat across OTUs, so each distinct one is parsed once
+        codes = lineages.encode_lineages(chunk[3])
+        confidences = confidences.where(codes >= 0)
+    else:
+        codes = np.column_stack([lineages.encode(rank, predictions[rank]) for rank in ranks])
+
+    taxa = pd.DataFrame({'OTU': chunk[0].to_numpy()})
+    for i, rank in enumerate(ranks):
+        taxa[rank] = codes[:, i]
+    for column in confidence_columns:
+        taxa[column] = confidences[column].to_numpy()
+    return taxa
+
+@profiled
+def read_sintax(sintax_file, confidence=None, chunksize=None, lineages=None):
+    """
+    Parses a SINTAX output file into one row per OTU with a column per rank and its confidence.
+
+    Ranks are assigned by their prefix (d:/k:, p:, c:, o:, f:, g:, s:), stored as categorical
+    columns that share the categories of a lineage dictionary, and set to '' where missing.
+    Each rank's bootstrap confidence is read from the second SINTAX column.
+
+    Parameters:
+    sintax_file (str): Path to the SINTAX output file (in .txt format).
+    confidence (float): Confidence cutoff (e.g. 0.8). Ranks are kept down to the first rank below
+        the cutoff. If None, the taxonomy in the fourth column (SINTAX's own cutoff) is used.
+    chunksize (int): Parse the file in blocks of this many lines to bound memory (optional).
+    lineages (LineageDictionary): The dictionary the rank names are interned in (default is the
+        shared tax_lineage.LINEAGES).
 
-def parse_sintax(sintax_file, otu_table_file, output_file=None):
+    Returns:
+    pd.DataFrame: 'OTU', the ranks (kingdom to species) and a '<rank>_confidence' column per rank.
+    """
+    if lineages is None:
+        lineages = LINEAGES
+    reader = pd.read_csv(sintax_file, sep='\t', header=None, dtype=str, chunksize=chunksize)
+    chunks = [reader] if chunksize is None else reader
+    parsed = [_parse_sintax_chunk(chunk, confidence, lineages) for chunk in chunks]
+    taxa = parsed[0] if len(parsed) == 1 else pd.concat(parsed, ignore_index=True)
+
+    # The chunks share the dictionary's codes; missing ranks become ''
+    for rank, _ in SINTAX_RANKS:
+        codes = taxa[rank].to_numpy()
+        codes = np.where(codes >= 0, codes, lineages.encode(rank, [''])[0])
+        taxa[rank] = lineages.categorical(rank, codes)
+    return taxa
+
+@profiled
+def parse_sintax(sintax_file, otu_table_file, output_file=None, confidence=None, chunksize=None, output_format=None):
     """
     Parses a SINTAX output file to extract the OTU ID and the final assigned taxonomy levels.
     The function removes prefixes (e.g., d:, p:, etc.) and organizes the taxonomy
@@ -9,30 +94,34 @@ def parse_sintax(sintax_file, otu_table_file, output_file=None):
 
     Parameters:
     sintax_file (str): Path to the SINTAX output file (in .txt format).
-    otu_table_file (str): Path to the OTU table file (in .txt or .csv format).
+    otu_table_file (str or OTUTable): Path to the OTU table file (in .txt or .csv format), or
+        a sparse OTUTable, which is normalised without densifying it.
     output_file (str): Path to save the merged data (optional).
+    confidence (float): Confidence cutoff applied to the SINTAX predictions (optional); see read_sintax.
+    chunksize (int): Stream the OTU table file in blocks of this many rows and write the result
+        straight to output_file, so the table never has to fit in memory (optional). Rows then
+        follow the OTU table rather than the SINTAX file.
+    output_format (str): 'csv' (tab-separated text), 'parquet' or 'feather' for output_file
+        (default follows its extension, so existing .txt outputs stay text).
 
     Returns:
-    pd.DataFrame: A DataFrame with merged OTU table and taxonomy data.
+    pd.DataFrame or OTUTable: A DataFrame with merged OTU table and taxonomy data. For an OTUTable
+        input, an OTUTable of relative abundances with the taxonomy attached. With chunksize,
+        the path of output_file.
     """
-    # Import the SINTAX file with the relevant columns
-    taxa_df = pd.read_csv(sintax_file, sep='\t', header=None, names=['OTU', 'TaxonomyDetails'], usecols=[0, 3])
-
-    # Split the TaxonomyDetails column into separate columns for each taxonomic level
-    taxa_split = (
-        taxa_df['TaxonomyDetails']
-        .str.split(',', expand=True)
-        .apply(lambda col: col.str.split(':').str[1] if col.str.contains(':').any() else col)
-    )
+    # Parse the SINTAX file; ranks are matched by their prefix with a single regex
+    taxa_df = read_sintax(sintax_file, confidence=confidence, chunksize=chunksize)
+    taxa_df = taxa_df[['OTU', 'kingdom', 'phylum', 'class', 'order', 'family', 'genus']]
 
-    # Ensure there are exactly 6 columns by filling missing values with empty strings
-    taxa_split = taxa_split.reindex(columns=range(6)).fillna('')
+    if chunksize is not None and not isinstance(otu_table_file, OTUTable):
+        if not output_file:
+            raise ValueError("An output_file is required when processing the OTU table in chunks.")
+        taxonomy = taxa_df.drop_duplicates('OTU').set_index('OTU')
+        return relative_abundance_file(otu_table_file, output_file, taxonomy=taxonomy,
+                                       chunksize=chunksize, index_label='OTU', output_format=output_format)
 
-    # Rename the columns to match the taxonomic levels
-    taxa_split.columns = ['kingdom', 'phylum', 'class', 'order', 'family', 'genus']
-
-    # Combine OTU with the split taxonomy data
-    taxa_df = pd.concat([taxa_df['OTU'], taxa_split], axis=1)
+    if isinstance(otu_table_file, OTUTable):
+        return _merge_otu_table(taxa_df, otu_table_file, output_file, output_format)
 
     # Load the OTU table
     otu_df = pd.read_csv(otu_table_file, sep='\t')
@@ -47,23 +136,37 @@ def parse_sintax(sintax_file, otu_table_file, output_file=None):
     # Rename the OTU column to 'OTU' to match the SINTAX DataFrame
     otu_df = otu_df.rename(columns={otu_column: 'OTU'})
 
-    # Merge the OTU table with the parsed taxonomy data
-    merged_df = pd.merge(otu_df, taxa_df, on='OTU', how='left')
-
-    # Calculate relative abundances only for numeric columns
-    numeric_columns = merged_df.select_dtypes(include=['number']).columns
-    rel_table = merged_df[['OTU']].copy()  # Start with the OTU column
-    rel_table[numeric_columns] = merged_df[numeric_columns].div(merged_df[numeric_columns].sum()) * 100
+    # Calculate relative abundances of the numeric (sample) columns in place, a block at a time
+    normalize(otu_df, 'percent', inplace=True)
 
-    # Combine the relative abundance table back with the taxonomy data
-    merged_rel_df = pd.merge(taxa_df, rel_table, on='OTU', how='left')
+    # Attach the abundances to the taxonomy data with a single merge
+    merged_rel_df = pd.merge(taxa_df, otu_df, on='OTU', how='left')
 
-    # Optionally save the final DataFrame to a text file
+    # Optionally save the final DataFrame (to a text file by default)
     if output_file:
-        merged_rel_df.to_csv(output_file, sep='\t', index=False)
+        write_table(merged_rel_df, output_file, output_format, sep='\t', index=False)
 
     return merged_rel_df
 
+def _merge_otu_table(taxa_df, otu_table, output_file=None, output_format=None):
+    # Attach the taxonomy in table order (a left join on the OTU IDs)
+    taxonomy = taxa_df.drop_duplicates('OTU').set_index('OTU').reindex(otu_table.observation_ids)
+    taxonomy.index.name = 'OTU'
+
+    # Relative abundance (%) by scaling each sample column of the sparse matrix
+    rel_counts = normalize(otu_table.counts, 'percent')
+
+    rel_table = OTUTable(rel_counts, otu_table.observation_ids, otu_table.sample_ids, taxonomy)
+
+    # Optionally save the final table to a text file, taxonomy first
+    if output_file:
+        merged_rel_df = rel_table.to_pandas()
+        merged_rel_df = merged_rel_df[list(taxonomy.columns) + list(otu_table.sample_ids)]
+        write_table(merged_rel_df, output_file, output_format, sep='\t', index=True)
+
+    return rel_table
+
 # Example usage:
 # merged_rel_df = parse_sintax('sintax2.txt', 'otutab.sorted.txt', 'merged_output.txt')
+# parse_sintax('sintax2.txt', 'otutab.sorted.txt', 'merged_output.txt', chunksize=200000)
 # print(merged_rel_df.head())
\ No newline at end of file
@@ -1,7 +1,11 @@
-import pandas as pd
 import os
+from .stats_reader import read_stats_files, update_stats_summary
+from .table_io import with_extension, write_table
+from .profiling import profiled
 
-def process_stats_files(directory, maxEE_level, output_csv='maxEE_summary.csv'):
+@profiled
+def process_stats_files(directory, maxEE_level, output_csv='maxEE_summary.csv', max_workers=None, incremental=False,
+                        state_file=None, output_format=None):
     """
     Processes all .stats files in the specified directory and returns a DataFrame
     with 'Length' and the selected MaxEE level for each file. The DataFrame is also
@@ -11,66 +15,34 @@ def process_stats_files(directory, maxEE_level, output_csv='maxEE_summary.csv'):
     directory (str): The path to the directory containing .stats files.
     maxEE_level (str): The MaxEE level to select ('MaxEE0.5', 'MaxEE1', 'MaxEE2').
     output_csv (str): The name of the output CSV file (default is 'maxEE_summary.csv').
+    max_workers (int): The number of files to parse concurrently (default is one at a time).
+    incremental (bool): Only parse new or changed files and update the existing CSV in place
+        (default is False). See also ingest_state.watch for polling a directory.
+    state_file (str): The state file of the incremental mode (default is '.<output_csv>.state.json').
+    output_format (str): 'csv', 'parquet' or 'feather'. Parquet and Feather replace the extension
+        of output_csv; by default the format follows its extension (CSV unless .parquet/.feather).
 
     Returns:
     pd.DataFrame: A DataFrame with 'Length' and the selected MaxEE level for each file.
     """
 
-    # Mapping of MaxEE levels to column indices in the original data
-    maxEE_map = {
-        'MaxEE0.5': 1,  # Column 2 in the original file
-        'MaxEE1': 3,    # Column 4 in the original file
-        'MaxEE2': 5     # Column 6 in the original file
-    }
-
-    if maxEE_level not in maxEE_map:
+    if maxEE_level not in ('MaxEE0.5', 'MaxEE1', 'MaxEE2'):
         raise ValueError(f"Invalid MaxEE level: {maxEE_level}. Choose from 'MaxEE0.5', 'MaxEE1', or 'MaxEE2'.")
 
-    # Initialize an empty list to collect DataFrames
-    dfs = []
-
-    # Iterate over all files in the directory with a .stats extension
-    for filename in os.listdir(directory):
-        if filename.endswith('.stats'):
-            filepath = os.path.join(directory, filename)
-
-            with open(filepath, 'r') as file:
-                lines = file.readlines()
-
-            data_lines = lines[4:]  # Extract the data lines (skip header and separator)
-
-            # Prepare the data for the DataFrame
-            data = []
-            for line in data_lines:
-                parts = line.strip().split()
-
-                # Select the Length and the desired MaxEE column
-                selected_parts = [
-                    parts[0],  # Length
-                    parts[maxEE_map[maxEE_level]].split('(')[0]  # Selected MaxEE level
-                ]
-
-                data.append(selected_parts)
-
-            # Create DataFrame with the selected columns
-            df = pd.DataFrame(data, columns=['Length', maxEE_level])
-
-            # Convert columns to numeric types; invalid parsing will be set to NaN
-            df['Length'] = pd.to_numeric(df['Length'], errors='coerce')
-            df[maxEE_level] = pd.to_numeric(df[maxEE_level], errors='coerce')
-
-            
-            df['File'] = filename
-
-           
-            dfs.append(df)
+    def select(stats):
+        return stats.reindex(columns=['Length', maxEE_level, 'File'])
 
+    output_path = with_extension(os.path.join(directory, output_csv), output_format)
+    if incremental:
+        return update_stats_summary(directory, output_path, select, params={'maxEE_level': maxEE_level},
+                                    state_file=state_file, max_workers=max_workers, output_format=output_format)
 
-    maxEE_summary = pd.concat(dfs, ignore_index=True)
+    # Every MaxEE level of every file is parsed in one pass; select the requested one
+    stats = read_stats_files(directory, max_workers=max_workers)
+    maxEE_summary = select(stats)
 
-    # Save the DataFrame as a CSV file
-    output_path = os.path.join(directory, output_csv)
-    maxEE_summary.to_csv(output_path, index=False)
+    # Save the DataFrame (as a CSV file by default)
+    write_table(maxEE_summary, output_path, output_format, index=False)
 
     return maxEE_summary
 
@@ -0,0 +1,298 @@
+import os
+import sys
+import json
+import time
+import logging
+import threading
+import functools
+import contextlib
+import tracemalloc
+
+logger = logging.getLogger('qiime2pandas')
+
+# The active report (None when profiling is off) and each thread's stack of open stages
+_report = None
+_local = threading.local()
+
+def _max_rss_bytes():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+class Report:
+    """
+    The records collected while profiling: one dict per finished stage or event.
+
+    Stage records hold 'stage' (the '/'-joined names of the open stages in that thread),
+    'seconds', 'rows', 'bytes_read', 'bytes_written', 'max_rss_bytes', 'peak_memory_bytes'
+    (with memory=True) and any extra fields; event records hold 'stage' and 'event'.
+
+    Example:
+    with profile() as report:
+        import_and_merge(qza_file_paths)
+    print(report.summary())
+    """
+
+    def __init__(self, jsonl=None, memory=False):
+        self.records = []
+        self.memory = memory
+        self._lock = threading.Lock()
+        self._file = open(jsonl, 'a') if isinstance(jsonl, str) else jsonl
+
+    def __repr__(self):
+        return f"Report({len(self.records)} records)"
+
+    def add(self, record):
+        with self._lock:
+            self.records.append(record)
+            if self._file is not None:
+                self._file.write(json.dumps(record, default=str) + '\n')
+                self._file.flush()
+
+    def close(self):
+        if self._file is not None and self._file not in (sys.stdout, sys.stderr):
+            self._file.close()
+        self._file = None
+
+    def to_frame(self):
+        """The records as a DataFrame."""
+        import pandas as pd
+        return pd.DataFrame(self.records)
+
+    def summary(self):
+        """Total seconds, rows and bytes, and the number of calls, of every stage."""
+        frame = self.to_frame()
+        if 'seconds' not in frame:
+            return frame
+        stages = frame[frame['seconds'].notna()]
+        return stages.groupby('stage', sort=False).agg(
+            calls=('seconds', 'size'),
+            seconds=('seconds', 'sum'),
+            rows=('rows', 'sum'),
+            bytes_read=('bytes_read', 'sum'),
+            bytes_written=('bytes_written', 'sum'),
+        ).sort_values('seconds', ascending=False)
+
+class _NullStage:
+    # Returned while profiling is off, so instrumented code costs a function call
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def add(self, rows=0, bytes_read=0, bytes_written=0):
+        pass
+
+    def note(self, **fields):
+        pass
+
+_NULL_STAGE = _NullStage()
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+class Stage:
+    """
+    One timed stage. Use through stage() or profiled(); add counters with add() and extra
+    fields with note().
+    """
+
+    def __init__(self, report, name, fields):
+        self.report = report
+        self.name = name
+        self.fields = fields
+        self.rows = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.peak = 0
+
+    def add(self, rows=0, bytes_read=0, bytes_written=0):
+        """Count rows processed and bytes read or written in this stage."""
+        self.rows += rows
+        self.bytes_read += bytes_read
+        self.bytes_written += bytes_written
+
+    def note(self, **fields):
+        """Attach extra fields to this stage's record."""
+        self.fields.update(fields)
+
+    def __enter__(self):
+        stack = _stack()
+        self.path = '/'.join([parent.name for parent in stack] + [self.name])
+        if self.report.memory and tracemalloc.is_tracing():
+            # The peak so far belongs to the enclosing stage; measure this one from here
+            peak = tracemalloc.get_traced_memory()[1]
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, peak)
+            tracemalloc.reset_peak()
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        seconds = time.perf_counter() - self.start
+        stack = _stack()
+        stack.pop()
+
+        record = {
+            'stage': self.path,
+            'seconds': seconds,
+            'rows': self.rows,
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+            'max_rss_bytes': _max_rss_bytes(),
+        }
+        if self.report.memory and tracemalloc.is_tracing():
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            record['peak_memory_bytes'] = self.peak
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, self.peak)
+            tracemalloc.reset_peak()
+        if exc_type is not None:
+            record['error'] = repr(exc_value)
+        record.update(self.fields)
+        self.report.add(record)
+        return False
+
+def stage(name, **fields):
+    """
+    Time a block of code as a named stage of the active profile.
+
+    Parameters:
+    name (str): The stage name, e.g. 'decode' or 'write'.
+    **fields: Extra fields for the record (e.g. file=path).
+
+    Returns:
+    A context manager whose value has add(rows=, bytes_read=, bytes_written=) and note(**fields).
+    When profiling is off it does nothing.
+    """
+    report = _report
+    if report is None:
+        return _NULL_STAGE
+    return Stage(report, name, fields)
+
+def current_stage():
+    """The innermost open stage of this thread (a no-op stage when there is none)."""
+    stack = getattr(_local, 'stack', None)
+    return stack[-1] if stack and _report is not None else _NULL_STAGE
+
+def profiled(func=None, name=None):
+    """
+    Decorator that records every call of a function as a stage.
+
+    Example:
+    @profiled
+    def import_and_merge(...):
+        ...
+    """
+    if func is None:
+        return functools.partial(profiled, name=name)
+    stage_name = name or func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _report is None:
+            return func(*args, **kwargs)
+        with Stage(_report, stage_name, {}):
+            return func(*args, **kwargs)
+    return wrapper
+
+def in_current_stage(func):
+    """
+    Wrap a function submitted to a thread pool so that the stages it opens are nested under
+    the stages open in the submitting thread (e.g. 'import_and_merge/write').
+    Not for process pools: the wrapper cannot be pickled.
+    """
+    if _report is None:
+        return func
+    parents = list(_stack())
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        saved = getattr(_local, 'stack', None)
+        _local.stack = list(parents)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _local.stack = saved
+    return wrapper
+
+def log_event(message, level=logging.INFO, **fields):
+    """
+    Report a message: logged to the 'qiime2pandas' logger, and recorded in the active
+    profile (with its fields) under the current stage.
+
+    Parameters:
+    message (str): The message.
+    level (int): The logging level (default is logging.INFO).
+    **fields: Structured details, e.g. file=path.
+    """
+    logger.log(level, message)
+    report = _report
+    if report is not None:
+        stack = getattr(_local, 'stack', None)
+        record = {'stage': stack[-1].path if stack else None, 'event': message,
+                  'level': logging.getLevelName(level)}
+        record.update(fields)
+        report.add(record)
+
+@contextlib.contextmanager
+def profile(jsonl=None, memory=False):
+    """
+    Profile the functions of the package called inside the block.
+
+    Every public function, and the main stages inside them (e.g. artifact decoding, the
+    taxonomy join, file writes), records its wall time, rows, bytes read/written and the
+    process's peak RSS. Stages run in worker threads are recorded too; stages run in
+    worker processes are not. Profiles do not nest.
+
+    Parameters:
+    jsonl (str or file): Also write each record as a JSON line to this file as it finishes (optional).
+    memory (bool): Also record each stage's peak Python memory with tracemalloc; this slows
+        the code down noticeably (default is False).
+
+    Returns:
+    Report: The collected records (available inside and after the block).
+
+    Example:
+    with profile('profile.jsonl') as report:
+        merged_tables = import_and_merge(qza_file_paths)
+    print(report.summary())
+    """
+    global _report
+    if _report is not None:
+        raise RuntimeError("A profile is already active.")
+
+    report = Report(jsonl, memory)
+    started_tracing = memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    _report = report
+    try:
+        yield report
+    finally:
+        _report = None
+        if started_tracing:
+            tracemalloc.stop()
+        report.close()
+
+def file_size(path):
+    """The size of a file in bytes, or 0 if it cannot be read (for bytes_read/bytes_written)."""
+    try:
+        return os.path.getsize(path)
+    except (OSError, TypeError):
+        return 0
+
+# Example usage:
+# with profile('profile.jsonl', memory=True) as report:
+#     merged_tables = import_and_merge(qza_file_paths, max_workers=8)
+#     rarefied, otus_lost = rarefy_otu_table(merged_tables[0], 10000, seed=42)
+# print(report.summary())
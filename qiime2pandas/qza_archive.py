@@ -0,0 +1,146 @@
+import os
+import shutil
+import zipfile
+import pandas as pd
+
+class QZAArchive:
+    """
+    Read-only view of a QIIME 2 artifact (.qza) that never extracts the whole archive.
+
+    The zip central directory is indexed once when the archive is opened. Files in the
+    artifact's data/ directory can then be streamed straight into parsers through
+    file-like objects, and only the members that are asked for are written to disk.
+
+    Parameters:
+    qza_file_path (str): Path to the .qza file.
+
+    Example:
+    with QZAArchive('taxonomy.qza') as archive:
+        taxa = archive.read_table('taxonomy.tsv', index_col=0)
+    """
+
+    def __init__(self, qza_file_path):
+        self.path = qza_file_path
+        self._zip = zipfile.ZipFile(qza_file_path, 'r')
+        self._data = {}  # Path relative to <uuid>/data/ -> ZipInfo
+        self.metadata = {}
+
+        metadata_info = None
+        for info in self._zip.infolist():
+            if info.is_dir():
+                continue
+            # Artifacts are laid out as <uuid>/metadata.yaml and <uuid>/data/...;
+            # provenance of parent artifacts is nested deeper and ignored here
+            parts = info.filename.split('/')
+            if len(parts) == 2 and parts[1] == 'metadata.yaml':
+                metadata_info = info
+            elif len(parts) > 2 and parts[1] == 'data':
+                self._data['/'.join(parts[2:])] = info
+
+        if metadata_info is None:
+            self._zip.close()
+            raise ValueError(f"'{qza_file_path}' is not a QIIME 2 artifact (no metadata.yaml found).")
+
+        # metadata.yaml only holds flat 'key: value' pairs (uuid, type, format)
+        for line in self._zip.read(metadata_info).decode('utf-8').splitlines():
+            key, sep, value = line.partition(':')
+            if sep:
+                self.metadata[key.strip()] = value.strip()
+
+    @property
+    def uuid(self):
+        return self.metadata.get('uuid')
+
+    @property
+    def type(self):
+        return self.metadata.get('type')
+
+    @property
+    def format(self):
+        return self.metadata.get('format')
+
+    @property
+    def files(self):
+        """Paths of the payload files, relative to the artifact's data/ directory."""
+        return list(self._data)
+
+    def __contains__(self, name):
+        return name in self._data
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return f"QZAArchive('{self.path}', uuid={self.uuid}, type={self.type})"
+
+    def close(self):
+        self._zip.close()
+
+    def size(self, name):
+        """Uncompressed size in bytes of a payload file."""
+        return self._info(name).file_size
+
+    def _info(self, name):
+        try:
+            return self._data[name]
+        except KeyError:
+            raise KeyError(f"'{name}' not found in the data of {os.path.basename(self.path)}.") from None
+
+    def open(self, name):
+        """
+        Open a payload file for streaming.
+
+        Parameters:
+        name (str): Path relative to the artifact's data/ directory (e.g. 'taxonomy.tsv').
+
+        Returns:
+        file-like: A binary, read-only file object.
+        """
+        return self._zip.open(self._info(name), 'r')
+
+    def read(self, name):
+        """Read a payload file fully into memory and return its bytes."""
+        return self._zip.read(self._info(name))
+
+    def read_table(self, name, **kwargs):
+        """
+        Parse a tab-separated payload file with pandas without writing it to disk.
+
+        Parameters:
+        name (str): Path relative to the artifact's data/ directory.
+        **kwargs: Passed to pd.read_csv (sep defaults to a tab).
+
+        Returns:
+        pd.DataFrame: The parsed table.
+        """
+        kwargs.setdefault('sep', '\t')
+        with self.open(name) as handle:
+            return pd.read_csv(handle, **kwargs)
+
+    def extract(self, names, output_folder):
+        """
+        Extract only the requested payload files into a folder (flattened to their file names).
+
+        Parameters:
+        names (list of str): Paths relative to the artifact's data/ directory.
+        output_folder (str): The folder to write the files to (created if needed).
+
+        Returns:
+        list of str: The paths of the extracted files.
+        """
+        os.makedirs(output_folder, exist_ok=True)
+        extracted = []
+        for name in names:
+            destination_file = os.path.join(output_folder, os.path.basename(name))
+            with self.open(name) as source, open(destination_file, 'wb') as destination:
+                shutil.copyfileobj(source, destination, length=1024 * 1024)
+            extracted.append(destination_file)
+        return extracted
+
+# Example usage:
+# with QZAArchive('table.qza') as archive:
+#     print(archive.uuid, archive.type, archive.files)
+#     archive.extract(['feature-table.biom'], 'table')
@@ -1,56 +1,207 @@
+import logging
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from tqdm import tqdm  # For progress bar
+from scipy.special import gammaln
+from .otu_table import OTUTable
+from .profiling import profiled, log_event
 
-def rarefaction_curve(otu_table, max_depth=None, num_iterations=10, seed=None):
+def _progress(iterable, disable=False):
+    # A tqdm progress bar if tqdm is installed (the 'progress' extra)
+    if disable:
+        return iterable
+    try:
+        from tqdm import tqdm
+    except ImportError:
+        return iterable
+    return tqdm(iterable)
+
+def _expected_richness(values, sample_ptr, totals, depths, block_size=2**20):
+    """
+    Exact expected number of OTUs at each depth (Hurlbert 1971 / Sanders 1968).
+
+    E[S_n] = sum_i 1 - C(N - N_i, n) / C(N, n), evaluated with log-gamma for every
+    non-zero count and every depth at once. Zero counts contribute nothing, so only
+    the non-zero entries of the table are needed.
+
+    Parameters:
+    values (np.ndarray): Non-zero counts, grouped by sample.
+    sample_ptr (np.ndarray): Offsets into values where each sample starts (length n_samples + 1).
+    totals (np.ndarray): The total number of reads in each sample.
+    depths (np.ndarray): The depths to evaluate.
+    block_size (int): Approximate number of (count, depth) pairs evaluated per block.
+
+    Returns:
+    np.ndarray: Expected richness with shape (n_samples, n_depths).
+    """
+    depths = np.asarray(depths, dtype=np.float64)
+    totals = np.asarray(totals, dtype=np.float64)
+    n_samples = len(totals)
+    richness = np.empty((n_samples, len(depths)))
+
+    # log C(N, n) denominators only depend on the sample
+    log_denominator = gammaln(totals[:, None] + 1) - gammaln(totals[:, None] - depths + 1)
+
+    # Group whole samples into blocks so each block can be reduced with reduceat
+    entries_per_block = max(block_size // max(len(depths), 1), 1)
+    start = 0
+    while start < n_samples:
+        stop = int(np.searchsorted(sample_ptr, sample_ptr[start] + entries_per_block, side='right')) - 1
+        stop = min(max(stop, start + 1), n_samples)
+
+        lo, hi = sample_ptr[start], sample_ptr[stop]
+        sample_of_entry = np.repeat(np.arange(start, stop), np.diff(sample_ptr[start:stop + 1]))
+        remainder = totals[sample_of_entry][:, None] - values[lo:hi, None]
+
+        # log C(N - N_i, n); the term is zero when fewer than n reads remain
+        with np.errstate(invalid='ignore'):
+            log_numerator = gammaln(remainder + 1) - gammaln(remainder - depths + 1)
+        absent = np.where(remainder >= depths,
+                          np.exp(log_numerator - log_denominator[sample_of_entry]), 0.0)
+
+        # reduceat gives an empty segment the next entry rather than 0, so empty samples are left out
+        present = np.diff(sample_ptr[start:stop + 1]) > 0
+        richness[start:stop] = 0.0
+        if present.any():
+            richness[start:stop][present] = np.add.reduceat(1.0 - absent, (sample_ptr[start:stop] - lo)[present], axis=0)
+        start = stop
+
+    return richness
+
+def _monte_carlo_richness(counts, depths, num_iterations, rng):
+    """
+    Observed OTUs at each depth from nested random subsamples of a single sample.
+
+    Each iteration draws reads without replacement in increments, so the subsample at a
+    given depth is extended (not redrawn) to reach the next depth.
+
+    Parameters:
+    counts (np.ndarray): The non-zero counts of one sample.
+    depths (np.ndarray): Increasing depths to evaluate.
+    num_iterations (int): The number of nested subsamples to draw.
+    rng (np.random.Generator): The random generator to draw from.
+
+    Returns:
+    np.ndarray: Observed OTUs with shape (num_iterations, n_depths).
+    """
+    steps = np.diff(depths, prepend=0)
+    observed = np.empty((num_iterations, len(depths)), dtype=np.int64)
+
+    for i in range(num_iterations):
+        remaining = counts.copy()
+        drawn = np.zeros_like(counts)
+        for k, step in enumerate(steps):
+            if step:
+                increment = rng.multivariate_hypergeometric(remaining, step)
+                remaining -= increment
+                drawn += increment
+            observed[i, k] = np.count_nonzero(drawn)
+
+    return observed
+
+@profiled
+def rarefaction_curve(otu_table, max_depth=None, num_iterations=10, seed=None,
+                      method='exact', ci=0.95, num_depths=50, plot=True, ax=None):
     """
     Generate rarefaction curves for each sample in an OTU table.
 
     Parameters:
-    otu_table (pd.DataFrame): The OTU table with OTUs as rows and samples as columns.
+    otu_table (pd.DataFrame or OTUTable): The OTU table with OTUs as rows and samples as columns.
     max_depth (int): The maximum depth to rarefy each sample to. If None, use the minimum sample depth.
-    num_iterations (int): The number of iterations to perform at each depth.
-    seed (int): A random seed for reproducibility (optional).
+    num_iterations (int): The number of iterations to perform at each depth ('monte_carlo' only).
+    seed (int or np.random.Generator): A random seed or generator for reproducibility (optional).
+    method (str): 'exact' for the expected richness from the hypergeometric formula, or
+        'monte_carlo' for nested subsampling without replacement (default is 'exact').
+    ci (float): Width of the confidence interval across iterations ('monte_carlo' only).
+    num_depths (int): The number of depths between 1 and max_depth (default is 50).
+    plot (bool): Whether to draw the curves with matplotlib (default is True).
+    ax (matplotlib.axes.Axes): Axes to draw on. If None, a new figure is shown.
 
     Returns:
-    None: Displays a rarefaction plot.
+    pd.DataFrame: A tidy DataFrame with 'Sample', 'Depth', 'Mean', 'CI Lower' and 'CI Upper'
+        columns. The confidence interval is NaN for the 'exact' method.
     """
-    if seed is not None:
-        np.random.seed(seed)
-    
+    if method not in ('exact', 'monte_carlo'):
+        raise ValueError(f"Invalid method: {method}. Choose from 'exact' or 'monte_carlo'.")
+
+    rng = np.random.default_rng(seed)
+
+    if isinstance(otu_table, OTUTable):
+        counts = otu_table.counts
+        sample_ids = otu_table.sample_ids
+        sample_depths = otu_table.sample_sums().astype(np.int64)
+    else:
+        counts = otu_table.to_numpy(dtype=np.int64)
+        sample_ids = otu_table.columns
+        sample_depths = counts.sum(axis=0)
+
     # Determine the maximum depth if not specified
     if max_depth is None:
-        max_depth = min(otu_table.sum(axis=0))
-    
-    depths = np.linspace(1, max_depth, 50, dtype=int)  # Generate depths from 1 to max_depth
-    rarefaction_results = {depth: [] for depth in depths}
-
-    # Iterate over each sample and generate rarefaction curves
-    for sample in otu_table.columns:
-        sample_data = otu_table[sample]
-        sample_depth = sample_data.sum()
-        
+        max_depth = sample_depths.min()
+
+    depths = np.unique(np.linspace(1, max_depth, num_depths, dtype=int))  # Generate depths from 1 to max_depth
+
+    # Skip samples that cannot reach the maximum depth
+    for sample, sample_depth in zip(sample_ids, sample_depths):
         if sample_depth < max_depth:
-            print(f"Sample '{sample}' has fewer sequences ({sample_depth}) than the max depth ({max_depth}).")
-            continue
-        
-        sample_rarefaction = []
-        for depth in depths:
-            otus_observed = []
-            for _ in range(num_iterations):
-                # Randomly subsample OTUs to the specified depth
-                subsampled_otus = np.random.choice(sample_data.index, depth, p=sample_data/sample_depth, replace=True)
-                otus_observed.append(len(set(subsampled_otus)))  # Count unique OTUs
-            sample_rarefaction.append(np.mean(otus_observed))
-        
-        plt.plot(depths, sample_rarefaction)  # Removed label to avoid legend
-
-    plt.xlabel('Sequencing Depth')
-    plt.ylabel('Observed OTUs')
-    plt.title('Rarefaction Curves')
-    plt.grid(True)
-    plt.show()
+            log_event(f"Sample '{sample}' has fewer sequences ({sample_depth}) than the max depth ({max_depth}).",
+                      logging.WARNING, sample=sample, sample_depth=int(sample_depth), max_depth=int(max_depth))
+    keep = np.flatnonzero(sample_depths >= max_depth)
+    samples = sample_ids[keep]
+
+    # Non-zero counts grouped by sample, in the same layout as a CSC matrix
+    if isinstance(otu_table, OTUTable):
+        kept = counts[:, keep]
+        kept.eliminate_zeros()
+        values = kept.data.astype(np.int64)
+        sample_ptr = kept.indptr
+    else:
+        sample_idx, otu_idx = np.nonzero(counts[:, keep].T)
+        values = counts[otu_idx, keep[sample_idx]]
+        sample_ptr = np.searchsorted(sample_idx, np.arange(len(keep) + 1))
+
+    if method == 'exact':
+        mean = _expected_richness(values, sample_ptr, sample_depths[keep], depths)
+        lower = upper = np.full(mean.shape, np.nan)
+    else:
+        alpha = (1 - ci) / 2
+        mean = np.empty((len(keep), len(depths)))
+        lower = np.empty_like(mean)
+        upper = np.empty_like(mean)
+        for j in _progress(range(len(keep)), disable=len(keep) < 100):
+            observed = _monte_carlo_richness(values[sample_ptr[j]:sample_ptr[j + 1]], depths, num_iterations, rng)
+            mean[j] = observed.mean(axis=0)
+            lower[j], upper[j] = np.quantile(observed, [alpha, 1 - alpha], axis=0)
+
+    curves = pd.DataFrame({
+        'Sample': np.repeat(samples, len(depths)),
+        'Depth': np.tile(depths, len(samples)),
+        'Mean': mean.ravel(),
+        'CI Lower': lower.ravel(),
+        'CI Upper': upper.ravel()
+    })
+
+    if plot:
+        # Imported here so the curves can be computed on headless machines
+        try:
+            import matplotlib.pyplot as plt
+        except ImportError:
+            raise ImportError("Plotting needs matplotlib: pip install qiime2pandas[plot], or pass plot=False.") from None
+
+        show = ax is None
+        if show:
+            _, ax = plt.subplots()
+        for _, sample_curve in curves.groupby('Sample', sort=False):
+            ax.plot(sample_curve['Depth'], sample_curve['Mean'])  # Removed label to avoid legend
+
+        ax.set_xlabel('Sequencing Depth')
+        ax.set_ylabel('Observed OTUs')
+        ax.set_title('Rarefaction Curves')
+        ax.grid(True)
+        if show:
+            plt.show()
+
+    return curves
 
 # Example usage:
-# rarefaction_curve(otu_df, max_depth=1000, num_iterations=10, seed=42)
+# curves = rarefaction_curve(otu_df, max_depth=1000, seed=42)
+# curves = rarefaction_curve(otu_df, max_depth=1000, num_iterations=10, seed=42, method='monte_carlo', plot=False)
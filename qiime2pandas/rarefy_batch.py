@@ -0,0 +1,142 @@
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from .otu_table import OTUTable
+from .rarefy_otu_table import _rarefy_csc
+from .profiling import profiled
+
+def _as_counts(otu_table):
+    # Both table types are rarefied as a sparse CSC matrix with no explicit zeros
+    if isinstance(otu_table, OTUTable):
+        counts = otu_table.counts.astype(np.int64)
+        sample_ids = otu_table.sample_ids
+    else:
+        counts = sparse.csc_matrix(otu_table.to_numpy(dtype=np.int64))
+        sample_ids = otu_table.columns
+    counts.eliminate_zeros()
+    return counts, sample_ids
+
+def _seed_sequence(seed):
+    if isinstance(seed, np.random.SeedSequence):
+        return seed
+    if isinstance(seed, np.random.Generator):
+        return np.random.SeedSequence(int(seed.integers(2**63)))
+    return np.random.SeedSequence(seed)
+
+def _rarefy_nested(counts, depths, seed_sequence):
+    """
+    Rarefy a count matrix to several depths with nested subsamples.
+
+    The deepest subsample is drawn from the counts and each shallower one from the
+    subsample above it. This is the same as truncating one random permutation of the
+    reads at every depth, without ever building the reads.
+
+    Parameters:
+    counts (scipy.sparse.csc_matrix): Count matrix with OTUs as rows and samples as columns.
+    depths (list of int): The depths, in any order.
+    seed_sequence (np.random.SeedSequence): The seed of this repeat's random stream.
+
+    Returns:
+    list of scipy.sparse.csc_matrix: The rarefied counts, in the order of depths.
+    """
+    rng = np.random.default_rng(seed_sequence)
+    rarefied = {}
+    for depth in sorted(set(depths), reverse=True):
+        counts = _rarefy_csc(counts, depth, rng)
+        rarefied[depth] = counts
+    return [rarefied[depth] for depth in depths]
+
+def _iter_nested(counts, depths, repeats, seed, max_workers):
+    children = _seed_sequence(seed).spawn(repeats)
+    rarefy = partial(_rarefy_nested, counts, depths)
+
+    # Each repeat has its own stream and map keeps the repeat order, so the
+    # results do not depend on the number of workers
+    if max_workers == 1:
+        yield from map(rarefy, children)
+        return
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        yield from pool.map(rarefy, children, chunksize=max(1, repeats // (4 * max_workers)))
+
+def _check_depths(counts, sample_ids, depths):
+    sample_depths = np.asarray(counts.sum(axis=0)).ravel()
+    too_shallow = np.flatnonzero(sample_depths < max(depths))
+    if too_shallow.size:
+        j = too_shallow[0]
+        raise ValueError(f"Sample '{sample_ids[j]}' has less reads ({sample_depths[j]}) than the rarefaction depth ({max(depths)}).")
+
+def _wrap_table(rarefied, otu_table):
+    if isinstance(otu_table, OTUTable):
+        return OTUTable(rarefied, otu_table.observation_ids, otu_table.sample_ids, otu_table.taxonomy)
+    return pd.DataFrame(rarefied.toarray(), index=otu_table.index, columns=otu_table.columns)
+
+def iter_rarefied_tables(otu_table, depths, repeats=10, seed=None, max_workers=1):
+    """
+    Rarefy an OTU table repeatedly at several depths, one table at a time.
+
+    Parameters:
+    otu_table (pd.DataFrame or OTUTable): The OTU table with OTUs as rows and samples as columns.
+    depths (list of int): The depths to rarefy each sample to.
+    repeats (int): The number of repeats at each depth (default is 10).
+    seed (int, np.random.SeedSequence or np.random.Generator): A random seed for reproducibility (optional).
+    max_workers (int): The number of processes to spread the repeats over (default is 1).
+
+    Returns:
+    iterator of (int, int, pd.DataFrame or OTUTable): The repeat, the depth and the rarefied
+        table, of the same type as otu_table (OTUTables stay sparse).
+    """
+    depths = [int(depth) for depth in depths]
+    counts, sample_ids = _as_counts(otu_table)
+    _check_depths(counts, sample_ids, depths)
+
+    for repeat, tables in enumerate(_iter_nested(counts, depths, repeats, seed, max_workers)):
+        for depth, rarefied in zip(depths, tables):
+            yield repeat, depth, _wrap_table(rarefied, otu_table)
+
+@profiled
+def rarefy_depths(otu_table, depths, repeats=10, seed=None, max_workers=1, round_consensus=False):
+    """
+    Rarefy an OTU table repeatedly at several depths and stack the results.
+
+    Every repeat draws nested subsamples: one random permutation of each sample's reads,
+    truncated at each depth. Each repeat gets an independent random stream spawned from
+    the seed, so the results are the same for any max_workers.
+
+    Parameters:
+    otu_table (pd.DataFrame or OTUTable): The OTU table with OTUs as rows and samples as columns.
+    depths (list of int): The depths to rarefy each sample to.
+    repeats (int): The number of repeats at each depth (default is 10).
+    seed (int, np.random.SeedSequence or np.random.Generator): A random seed for reproducibility (optional).
+    max_workers (int): The number of processes to spread the repeats over (default is 1).
+    round_consensus (bool): Round the consensus counts to integers (default is False).
+
+    Returns:
+    dict: Depth -> np.ndarray of counts with shape (repeats, n_otus, n_samples).
+    dict: Depth -> consensus table (the mean over the repeats), of the same type as otu_table.
+    """
+    depths = [int(depth) for depth in depths]
+    counts, sample_ids = _as_counts(otu_table)
+    _check_depths(counts, sample_ids, depths)
+
+    dtype = np.int32 if max(depths) < np.iinfo(np.int32).max else np.int64
+    stacks = {depth: np.zeros((repeats,) + counts.shape, dtype=dtype) for depth in depths}
+    for repeat, tables in enumerate(_iter_nested(counts, depths, repeats, seed, max_workers)):
+        for depth, rarefied in zip(depths, tables):
+            stacks[depth][repeat] = rarefied.toarray()
+
+    consensus = {}
+    for depth, stack in stacks.items():
+        mean = stack.mean(axis=0)
+        if round_consensus:
+            mean = np.rint(mean).astype(np.int64)
+        consensus[depth] = _wrap_table(sparse.csc_matrix(mean), otu_table)
+
+    return stacks, consensus
+
+# Example usage:
+# stacks, consensus = rarefy_depths(otu_df, [1000, 5000, 10000, 20000], repeats=100, seed=42, max_workers=8)
+# print(stacks[1000].shape)  # (100, n_otus, n_samples)
+# for repeat, depth, table in iter_rarefied_tables(otu_table, [1000, 5000], repeats=100, seed=42):
+#     ...
@@ -1,54 +1,138 @@
 import pandas as pd
 import numpy as np
+from scipy import sparse
+from .otu_table import OTUTable
+from .profiling import profiled, current_stage
 
-def rarefy_otu_table(otu_table, depth, seed=None):
+def _rarefy_counts(counts, depth, rng):
+    """
+    Rarefy each column of an integer count matrix to the specified depth.
+
+    Sampling is done in count space with a multivariate hypergeometric draw, so a
+    sample is never expanded into one element per read.
+
+    Parameters:
+    counts (np.ndarray): Integer matrix with OTUs as rows and samples as columns.
+    depth (int or np.ndarray): The depth to rarefy each sample to, or one depth per sample.
+    rng (np.random.Generator): The random generator to draw from.
+
+    Returns:
+    np.ndarray: The rarefied count matrix (same shape as counts).
+    """
+    rarefied = np.zeros(counts.shape, dtype=np.int64, order='F')
+    depths = np.broadcast_to(depth, counts.shape[1])
+
+    for j in range(counts.shape[1]):
+        column = counts[:, j]
+
+        # Only OTUs present in the sample can be drawn
+        present = np.flatnonzero(column)
+        if present.size == 0:
+            continue
+        rarefied[present, j] = rng.multivariate_hypergeometric(column[present], depths[j])
+
+    return rarefied
+
+def _rarefy_csc(counts, depth, rng):
+    """
+    Rarefy each column of a sparse CSC count matrix to the specified depth, without densifying it.
+
+    Parameters:
+    counts (scipy.sparse.csc_matrix): Count matrix with OTUs as rows and samples as columns.
+    depth (int): The depth to rarefy each sample to.
+    rng (np.random.Generator): The random generator to draw from.
+
+    Returns:
+    scipy.sparse.csc_matrix: The rarefied count matrix, with no explicit zeros.
+    """
+    data = counts.data.astype(np.int64)
+    rarefied = np.zeros_like(data)
+
+    for j in range(counts.shape[1]):
+        start, stop = counts.indptr[j], counts.indptr[j + 1]
+        if stop > start:
+            rarefied[start:stop] = rng.multivariate_hypergeometric(data[start:stop], depth)
+
+    result = sparse.csc_matrix((rarefied, counts.indices.copy(), counts.indptr.copy()), shape=counts.shape)
+    result.eliminate_zeros()
+    return result
+
+def _report_lost(otus_lost):
+    # A summary for the active profile instead of printing the whole dictionary
+    lost = np.fromiter(otus_lost.values(), dtype=np.int64, count=len(otus_lost))
+    current_stage().note(samples=len(lost), otus_lost_total=int(lost.sum()),
+                         otus_lost_max=int(lost.max()) if lost.size else 0)
+
+@profiled
+def rarefy_otu_table(otu_table, depth, seed=None, chunksize=None, output_file=None):
     """
     Perform rarefaction on an OTU table to a specified sequencing depth.
 
     Parameters:
-    otu_table (pd.DataFrame): The OTU table with OTUs as rows and samples as columns.
+    otu_table (pd.DataFrame or OTUTable): The OTU table with OTUs as rows and samples as columns.
     depth (int): The depth to rarefy each sample to.
-    seed (int): A random seed for reproducibility (optional).
+    seed (int or np.random.Generator): A random seed or generator for reproducibility (optional).
+        The global NumPy random state is never modified.
+    chunksize (int): Out-of-core mode: otu_table is a path to a tab-separated OTU table file,
+        which is rarefied in blocks of this many rows and written to output_file (optional).
+    output_file (str): Path of the rarefied table in out-of-core mode.
 
     Returns:
-    pd.DataFrame: A rarefied OTU table.
-    dict: A dictionary with the number of OTUs lost for each sample.
+    pd.DataFrame or OTUTable: A rarefied OTU table, of the same type as otu_table (the path
+        of output_file in out-of-core mode).
+    dict: A dictionary with the number of OTUs lost for each sample (summarised in the record
+        of the active profile, see profiling.profile).
     """
-    if seed is not None:
-        np.random.seed(seed)
-    
-    rarefied_data = []
-    otus_lost = {}  # Dictionary to store the number of OTUs lost per sample
+    if chunksize is not None:
+        from .chunked import rarefy_table_file
+
+        if not output_file:
+            raise ValueError("An output_file is required when rarefying an OTU table in chunks.")
+        return rarefy_table_file(otu_table, depth, output_file, chunksize=chunksize, seed=seed)
+
+    rng = np.random.default_rng(seed)
 
-    # Iterate over each sample (column)
-    for sample in otu_table.columns:
-        sample_data = otu_table[sample]
+    if isinstance(otu_table, OTUTable):
+        return _rarefy_otu_table_sparse(otu_table, depth, rng)
 
-        if sample_data.sum() < depth:
-            raise ValueError(f"Sample '{sample}' has less reads ({sample_data.sum()}) than the rarefaction depth ({depth}).")
+    # Work on all samples at once as a single column-major integer matrix
+    counts = np.asfortranarray(otu_table.to_numpy(dtype=np.int64))
+    sample_depths = counts.sum(axis=0)
 
-        # Repeat the OTU IDs according to their counts
-        repeated_otus = np.repeat(sample_data.index, sample_data.values)
+    too_shallow = np.flatnonzero(sample_depths < depth)
+    if too_shallow.size:
+        j = too_shallow[0]
+        raise ValueError(f"Sample '{otu_table.columns[j]}' has less reads ({sample_depths[j]}) than the rarefaction depth ({depth}).")
 
-        # Randomly subsample the repeated OTUs to the desired depth
-        subsampled_otus = np.random.choice(repeated_otus, depth, replace=False)
+    rarefied = _rarefy_counts(counts, depth, rng)
+
+    # Count how many OTUs were lost (i.e., OTUs that were non-zero before but are zero after rarefaction)
+    lost = (counts > 0).sum(axis=0) - (rarefied > 0).sum(axis=0)
+    otus_lost = {sample: int(n) for sample, n in zip(otu_table.columns, lost)}
+
+    rarefied_otu_table = pd.DataFrame(rarefied, index=otu_table.index, columns=otu_table.columns)
+    current_stage().add(rows=counts.shape[0])
+    _report_lost(otus_lost)
+    return rarefied_otu_table, otus_lost
 
-        # Count the occurrences of each OTU in the subsampled data
-        subsampled_counts = pd.Series(subsampled_otus).value_counts()
+def _rarefy_otu_table_sparse(otu_table, depth, rng):
+    counts = otu_table.counts.copy()
+    counts.eliminate_zeros()
+    sample_depths = otu_table.sample_sums()
 
-        # Create a new series with the full OTU set and fill missing OTUs with 0
-        rarefied_sample = pd.Series(0, index=otu_table.index)
-        rarefied_sample[subsampled_counts.index] = subsampled_counts
+    too_shallow = np.flatnonzero(sample_depths < depth)
+    if too_shallow.size:
+        j = too_shallow[0]
+        raise ValueError(f"Sample '{otu_table.sample_ids[j]}' has less reads ({sample_depths[j]}) than the rarefaction depth ({depth}).")
 
-        # Count how many OTUs were lost (i.e., OTUs that were non-zero before but are zero after rarefaction)
-        otus_lost[sample] = (sample_data > 0).sum() - (rarefied_sample > 0).sum()
+    rarefied = _rarefy_csc(counts, depth, rng)
 
-        rarefied_data.append(rarefied_sample)
+    lost = np.diff(counts.indptr) - np.diff(rarefied.indptr)
+    otus_lost = {sample: int(n) for sample, n in zip(otu_table.sample_ids, lost)}
 
-    # Combine the rarefied samples into a DataFrame
-    rarefied_otu_table = pd.DataFrame(rarefied_data).T
-    rarefied_otu_table.columns = otu_table.columns
-    print(otus_lost)
+    rarefied_otu_table = OTUTable(rarefied, otu_table.observation_ids, otu_table.sample_ids, otu_table.taxonomy)
+    current_stage().add(rows=counts.shape[0])
+    _report_lost(otus_lost)
     return rarefied_otu_table, otus_lost
 
 # Example usage:
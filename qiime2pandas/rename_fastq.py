@@ -1,35 +1,189 @@
 import os
-import glob
+import re
+import fnmatch
+from concurrent.futures import ThreadPoolExecutor
+from .profiling import profiled, current_stage, log_event
 
-def rename_fastq_files(directory: str) -> None:
+# Illumina file names, e.g. 'Sample-1_S1_L001_R1_001.fastq.gz'
+FASTQ_PATTERN = "*_S*_L001_R*_001.fastq.gz"
+JOURNAL_NAME = '.rename_fastq_journal.tsv'
+_ILLUMINA_RE = re.compile(r'^(?P<sample>.+?)_S\d+_L\d{3}_R(?P<read>[12])_001\.fastq\.gz$')
+_JOURNAL_HEADER = ['original-filename', 'renamed-filename', 'sample-id', 'direction']
+
+def _journal_row(old, new):
+    match = _ILLUMINA_RE.match(new)
+    sample_id = match.group('sample') if match else ''
+    direction = {'1': 'forward', '2': 'reverse'}.get(match.group('read'), '') if match else ''
+    return [old, new, sample_id, direction]
+
+def read_rename_journal(journal):
+    """
+    Reads the renames recorded in a journal.
+
+    Parameters:
+    journal (str): Path to the journal written by rename_fastq_files.
+
+    Returns:
+    list of (str, str): The (original, renamed) file names, in the order they were planned.
+    """
+    with open(journal, 'r') as f:
+        lines = f.read().splitlines()
+    return [tuple(line.split('\t')[:2]) for line in lines[1:] if line]
+
+def _write_journal(journal, plan):
+    # Written to a temporary file and renamed, so a crash never leaves half a journal
+    temp_file = journal + '.tmp'
+    with open(temp_file, 'w') as f:
+        f.write('\t'.join(_JOURNAL_HEADER) + '\n')
+        for old, new in plan:
+            f.write('\t'.join(_journal_row(old, new)) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_file, journal)
+
+def plan_renames(directory, pattern=FASTQ_PATTERN, planned=()):
+    """
+    Plans the renames of the FASTQ files in a directory (hyphens removed from the names).
+
+    The directory is scanned once and every collision is reported before anything is
+    renamed: two files that would get the same name (e.g. 'A-1_...' and 'A1-_...'), or a
+    new name that already belongs to another file (e.g. 'A-1_...' and 'A1_...').
+
+    Parameters:
+    directory (str): The path to the directory containing the FASTQ files.
+    pattern (str): The file name pattern (default matches Illumina FASTQ names).
+    planned (list of (str, str)): Renames planned earlier (e.g. from a journal), kept in the plan.
+
+    Returns:
+    list of (str, str): The (original, renamed) file names.
+    """
+    names = {entry.name for entry in os.scandir(directory) if entry.is_file()}
+
+    plan = list(planned)
+    planned_sources = {old for old, _ in plan}
+    planned_targets = {new for _, new in plan}
+    for name in sorted(names):
+        if name in planned_sources or name in planned_targets or not fnmatch.fnmatch(name, pattern):
+            continue
+        new_name = name.replace('-', '')
+        if new_name != name:
+            plan.append((name, new_name))
+
+    # A target may only exist if it is the result of an earlier run of this plan
+    targets = {}
+    for old, new in plan:
+        targets.setdefault(new, []).append(old)
+    collisions = [f"{', '.join(olds)} -> {new}" for new, olds in targets.items() if len(olds) > 1]
+    collisions += [f"{old} -> {new} (already exists)" for old, new in plan
+                   if new in names and old in names and len(targets[new]) == 1]
+    if collisions:
+        raise FileExistsError("Renaming would overwrite files:\n" + '\n'.join(collisions))
+
+    return plan
+
+@profiled
+def rename_fastq_files(directory: str, dry_run=False, undo=False, max_workers=16, pattern=FASTQ_PATTERN,
+                       journal=None):
     """
     Renames FASTQ files in the specified directory by removing hyphens from their filenames.
 
+    The renames are planned and checked for collisions first, then recorded in a journal
+    before any file is touched. Running again after an interruption resumes from the
+    journal: renames that already happened are skipped. The journal also allows the renames
+    to be undone and can be turned into a QIIME 2 manifest (see write_qiime2_manifest).
+
     Parameters:
     - directory (str): The path to the directory containing the FASTQ files.
+    - dry_run (bool): Only plan and log the renames (default is False).
+    - undo (bool): Restore the original names recorded in the journal (default is False).
+    - max_workers (int): The number of renames in flight at once; parallel file systems are
+      limited by metadata latency rather than bandwidth (default is 16).
+    - pattern (str): The file name pattern (default matches Illumina FASTQ names).
+    - journal (str): The journal file (default is .rename_fastq_journal.tsv in the directory).
+
+    Returns:
+    list of (str, str): The (original, renamed) file names of the plan.
 
     Example:
     rename_fastq_files("/content/20240708_HRickard_EMP16S/")
     """
+    if journal is None:
+        journal = os.path.join(directory, JOURNAL_NAME)
+    planned = read_rename_journal(journal) if os.path.exists(journal) else []
+
+    if undo:
+        if not planned:
+            raise FileNotFoundError(f"No rename journal found at {journal}.")
+        moves = [(new, old) for old, new in planned]
+    else:
+        planned = plan_renames(directory, pattern, planned)
+        moves = planned
+
+    # Only the moves whose source is still there are left to do
+    pending = [(src, dst) for src, dst in moves if os.path.exists(os.path.join(directory, src))]
+
+    if dry_run:
+        for src, dst in pending:
+            log_event(f"Would rename {src} to {dst}", source=src, target=dst, dry_run=True)
+        return planned
 
-    # Define the pattern to match the FASTQ files
-    pattern = os.path.join(directory, "*_S*_L001_R*_001.fastq.gz")
+    if not undo:
+        _write_journal(journal, planned)
 
-    # Loop through the matched files
-    for file in glob.glob(pattern):
-        # Get the base name of the file
-        base = os.path.basename(file)
+    def rename(move):
+        src, dst = move
+        if os.path.exists(os.path.join(directory, dst)):
+            raise FileExistsError(f"Cannot rename {src} to {dst}: the target already exists.")
+        os.rename(os.path.join(directory, src), os.path.join(directory, dst))
 
-        # Remove '-' from the base name
-        new_base = base.replace('-', '')
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        list(pool.map(rename, pending))
+
+    if undo:
+        os.remove(journal)
+    current_stage().add(rows=len(pending))
+    log_event(f"{'Restored' if undo else 'Renamed'} {len(pending)} files in {directory}", files=len(pending))
+    return planned
+
+def write_qiime2_manifest(directory, output_file='manifest.tsv', journal=None, pattern=FASTQ_PATTERN):
+    """
+    Writes a QIIME 2 paired-end manifest (PairedEndFastqManifestPhred33V2) for the FASTQ files.
+
+    Parameters:
+    directory (str): The path to the directory containing the FASTQ files.
+    output_file (str): Path of the manifest TSV (default is manifest.tsv).
+    journal (str): A rename journal; files of the directory that it plans to rename are listed
+        under their new names, e.g. to write the manifest before the renames run (optional).
+    pattern (str): The file name pattern (default matches Illumina FASTQ names).
+
+    Returns:
+    str: The path of the manifest.
+    """
+    names = [entry.name for entry in os.scandir(directory)
+             if entry.is_file() and fnmatch.fnmatch(entry.name, pattern)]
+    if journal is not None:
+        # Files that needed no rename are not in the journal and keep their names
+        renames = dict(read_rename_journal(journal))
+        names = [renames.get(name, name) for name in names]
+    names = sorted(set(names))
 
-        # Construct the new file path
-        new_file = os.path.join(directory, new_base)
+    samples = {}
+    for name in names:
+        match = _ILLUMINA_RE.match(name)
+        if match is None:
+            continue
+        reads = samples.setdefault(match.group('sample'), {})
+        reads[match.group('read')] = os.path.abspath(os.path.join(directory, name))
 
-        # Rename the file
-        os.rename(file, new_file)
+    with open(output_file, 'w') as f:
+        f.write('sample-id\tforward-absolute-filepath\treverse-absolute-filepath\n')
+        for sample_id, reads in samples.items():
+            f.write(f"{sample_id}\t{reads.get('1', '')}\t{reads.get('2', '')}\n")
 
-        print(f"Renamed {base} to {new_base}")
+    return output_file
 
 # Example usage:
-# rename_fastq_files("/content/fastq_files/")
\ No newline at end of file
+# rename_fastq_files("/content/fastq_files/", dry_run=True)
+# rename_fastq_files("/content/fastq_files/")
+# write_qiime2_manifest("/content/fastq_files/", "/content/manifest.tsv")
+# rename_fastq_files("/content/fastq_files/", undo=True)
@@ -0,0 +1,157 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from .profiling import profiled, current_stage
+
+# '58121 reads, max len 458, avg 425.6'
+_SUMMARY_RE = re.compile(r'^\s*(\d+)\s+reads?,\s*max len\s+(\d+),\s*avg\s+([\d.]+)')
+# 'Length         MaxEE 0.50         MaxEE 1.00         MaxEE 2.00'
+_LEVEL_RE = re.compile(r'MaxEE\s+([\d.]+)')
+# '    50      56620( 97.4%)  ...' -> '    50      56620  97.4   ...'
+_PUNCTUATION = str.maketrans('()%', '   ')
+
+def read_stats_file(filepath):
+    """
+    Parses a usearch/vsearch .stats file (fastq_eestats2 output) in a single pass.
+
+    Parameters:
+    filepath (str): The path to the .stats file.
+
+    Returns:
+    dict: 'Reads', 'Max Length' and 'Average Length' from the summary line.
+    list of str: The MaxEE column names (e.g. ['MaxEE0.5', 'MaxEE1', 'MaxEE2']).
+    np.ndarray: The lengths, one per table row.
+    np.ndarray: The read counts with one row per length and one column per MaxEE level.
+    """
+    with open(filepath, 'r') as file:
+        lines = file.read().split('\n', 4)
+
+    match = _SUMMARY_RE.match(lines[0])
+    if match is None:
+        raise ValueError(f"Unrecognised summary line in {filepath}: {lines[0]!r}")
+    summary = {
+        'Reads': int(match.group(1)),
+        'Max Length': int(match.group(2)),
+        'Average Length': float(match.group(3))
+    }
+
+    levels = [f"MaxEE{float(level):g}" for level in _LEVEL_RE.findall(lines[2] if len(lines) > 2 else '')]
+    body = lines[4] if len(lines) > 4 else ''
+
+    # Every row is 'length count(pct%) count(pct%) ...', so once the brackets are
+    # removed the whole table can be converted to numbers in one go
+    values = np.array(body.translate(_PUNCTUATION).split(), dtype=np.float64)
+    width = 1 + 2 * len(levels)
+    if values.size % width:
+        raise ValueError(f"Malformed MaxEE table in {filepath}.")
+    values = values.reshape(-1, width)
+
+    lengths = values[:, 0].astype(np.int64)
+    counts = values[:, 1::2].astype(np.int64)
+    return summary, levels, lengths, counts
+
+def _stats_file_frame(directory, filename):
+    summary, levels, lengths, counts = read_stats_file(os.path.join(directory, filename))
+
+    frame = pd.DataFrame(counts, columns=levels)
+    frame.insert(0, 'Length', lengths)
+    frame.insert(0, 'File', filename)
+    for key, value in summary.items():
+        frame[key] = value
+    return frame
+
+def list_stats_files(directory):
+    """The names of the .stats files in a directory, in directory order."""
+    return [entry.name for entry in os.scandir(directory) if entry.name.endswith('.stats') and entry.is_file()]
+
+def _try_stats_file_frame(directory, filename):
+    # Files still being written are left out rather than stopping the others
+    try:
+        return _stats_file_frame(directory, filename)
+    except (OSError, ValueError):
+        return None
+
+@profiled
+def read_stats_files(directory, max_workers=None, filenames=None, errors='raise'):
+    """
+    Reads every .stats file in a directory into a single long-form DataFrame.
+
+    Each file is read once; the summary line and all MaxEE levels are parsed
+    together. Files are parsed concurrently when max_workers is greater than 1.
+
+    Parameters:
+    directory (str): The path to the directory containing .stats files.
+    max_workers (int): The number of files to parse concurrently (default is one at a time).
+    filenames (list of str): Only read these files of the directory (default is every .stats file).
+    errors (str): 'raise' on an unreadable file, or 'skip' to leave it out (default is 'raise').
+
+    Returns:
+    pd.DataFrame: One row per file and length, with 'File', 'Length', one column per
+        MaxEE level (e.g. 'MaxEE0.5', 'MaxEE1', 'MaxEE2'), 'Reads', 'Max Length' and 'Average Length'.
+    """
+    if errors not in ('raise', 'skip'):
+        raise ValueError(f"Invalid errors: {errors}. Choose from 'raise' or 'skip'.")
+    if filenames is None:
+        filenames = list_stats_files(directory)
+    read_frame = _stats_file_frame if errors == 'raise' else _try_stats_file_frame
+
+    if max_workers is None or max_workers == 1:
+        frames = [read_frame(directory, filename) for filename in filenames]
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            frames = list(pool.map(lambda filename: read_frame(directory, filename), filenames))
+    frames = [frame for frame in frames if frame is not None]
+
+    if not frames:
+        return pd.DataFrame(columns=['File', 'Length', 'Reads', 'Max Length', 'Average Length'])
+    stats = pd.concat(frames, ignore_index=True)
+    current_stage().add(rows=len(stats))
+    return stats
+
+def update_stats_summary(directory, output_path, select, params=None, state_file=None, max_workers=None,
+                         output_format=None):
+    """
+    Incrementally updates a summary table of the .stats files in a directory.
+
+    Only new and changed files are parsed; their rows replace any earlier rows of the same
+    file in the table, and rows of deleted files are dropped. Files that cannot be parsed yet
+    (e.g. still being written) keep their previous rows and are tried again next time.
+
+    Parameters:
+    directory (str): The path to the directory containing .stats files.
+    output_path (str): Path of the summary table (CSV, Parquet or Feather).
+    select (callable): Turns the long-form table of read_stats_files into the summary rows.
+    params (dict): Settings the summary depends on; a change reprocesses every file (optional).
+    state_file (str): Path of the state file (default is '.<output name>.state.json' next to the output).
+    max_workers (int): The number of files to parse concurrently (default is one at a time).
+    output_format (str): 'csv', 'parquet' or 'feather' (default follows the extension of output_path).
+
+    Returns:
+    pd.DataFrame: The full updated summary.
+    """
+    from .ingest_state import IngestState, default_state_file, upsert_table
+
+    state = IngestState(state_file or default_state_file(output_path), params)
+    if not os.path.exists(output_path):
+        state.reset()
+
+    paths = [os.path.join(directory, filename) for filename in list_stats_files(directory)]
+    changed = state.changed(paths)
+    removed = state.removed(paths)
+
+    stats = read_stats_files(directory, max_workers=max_workers,
+                             filenames=[os.path.basename(path) for path in changed], errors='skip')
+    parsed = list(pd.unique(stats['File']))
+
+    summary = upsert_table(output_path, select(stats), parsed + [os.path.basename(path) for path in removed],
+                           output_format=output_format)
+
+    state.update([os.path.join(directory, filename) for filename in parsed])
+    state.forget(removed)
+    state.save()
+    return summary
+
+# Example usage:
+# stats = read_stats_files('/content/', max_workers=8)
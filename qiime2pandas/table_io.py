@@ -0,0 +1,247 @@
+import os
+import numpy as np
+import pandas as pd
+from .tax_lineage import rank_columns
+from .profiling import profiled, current_stage, file_size
+
+FORMATS = ['csv', 'parquet', 'feather']
+_EXTENSIONS = {'.parquet': 'parquet', '.pq': 'parquet', '.feather': 'feather', '.arrow': 'feather'}
+_FILTER_OPS = {
+    '=': lambda col, value: col == value,
+    '==': lambda col, value: col == value,
+    '!=': lambda col, value: col != value,
+    '<': lambda col, value: col < value,
+    '<=': lambda col, value: col <= value,
+    '>': lambda col, value: col > value,
+    '>=': lambda col, value: col >= value,
+    'in': lambda col, value: col.isin(value),
+    'not in': lambda col, value: ~col.isin(value),
+}
+
+def table_format(path, output_format=None):
+    """
+    The format of a table file: output_format if given, otherwise from the file extension.
+
+    Parameters:
+    path (str): The file (or, for partitioned Parquet, folder) path.
+    output_format (str): 'csv', 'parquet' or 'feather' (optional).
+
+    Returns:
+    str: The format; anything without a Parquet or Feather extension is 'csv'.
+    """
+    if output_format is not None:
+        if output_format not in FORMATS:
+            raise ValueError(f"Invalid output format: {output_format}. Choose from {FORMATS}.")
+        return output_format
+    return _EXTENSIONS.get(os.path.splitext(path)[1].lower(), 'csv')
+
+def with_extension(path, output_format):
+    """Replace the extension of path with the one of output_format (csv keeps the path)."""
+    if output_format in (None, 'csv'):
+        return path
+    return os.path.splitext(path)[0] + '.' + output_format
+
+def _compact(df):
+    """
+    Prepare a DataFrame for a columnar file.
+
+    Taxonomy ranks become categoricals (dictionary-encoded). Every other column keeps its
+    dtype, so the table reads back exactly as it was written; the zstd compression of the
+    file is what keeps small counts small.
+    """
+    df = df.copy(deep=False)
+    for col in rank_columns(df.columns):
+        if not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+    return df
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("Parquet and Feather files need pyarrow: pip install qiime2pandas[parquet].") from None
+    return pyarrow
+
+def _arrow_table(df, index=True):
+    pa = _require_pyarrow()
+
+    table = pa.Table.from_pandas(df, preserve_index=index)
+    # Fixed-width dictionary indices, so blocks written separately share one schema
+    fields = [pa.field(field.name, pa.dictionary(pa.int32(), field.type.value_type))
+              if pa.types.is_dictionary(field.type) else field for field in table.schema]
+    return table.cast(pa.schema(fields, metadata=table.schema.metadata))
+
+@profiled
+def write_table(df, path, output_format=None, sep=',', index=True, partition_cols=None, compression='zstd',
+                index_label=None):
+    """
+    Write a table as CSV (the default), Parquet or Feather.
+
+    In Parquet and Feather files taxonomy ranks are dictionary-encoded and every other column
+    keeps its dtype, compressed with zstd by default.
+
+    Parameters:
+    df (pd.DataFrame): The table.
+    path (str): The output path; the format follows its extension unless output_format is given.
+    output_format (str): 'csv', 'parquet' or 'feather' (optional).
+    sep (str): The CSV field separator (default is ',').
+    index (bool): Write the index (default is True).
+    partition_cols (list of str): Parquet only: write a folder with one partition per value of
+        these columns (e.g. ['File'] for long-form tables), so readers can skip whole files.
+    compression (str): The Parquet/Feather compression codec (default is 'zstd').
+    index_label (str): The CSV header of the index column (optional).
+
+    Returns:
+    str: The path.
+    """
+    output_format = table_format(path, output_format)
+
+    if output_format == 'csv':
+        if partition_cols:
+            raise ValueError("Partitioning needs the Parquet format.")
+        df.to_csv(path, sep=sep, index=index, index_label=index_label)
+        current_stage().add(rows=len(df), bytes_written=file_size(path))
+        return path
+
+    table = _arrow_table(_compact(df), index=index)
+    if output_format == 'parquet':
+        import pyarrow.parquet as pq
+
+        if partition_cols:
+            pq.write_to_dataset(table, path, partition_cols=partition_cols, compression=compression)
+        else:
+            pq.write_table(table, path, compression=compression)
+    else:
+        if partition_cols:
+            raise ValueError("Partitioning needs the Parquet format.")
+        import pyarrow.feather as feather
+
+        feather.write_feather(table, path, compression=compression)
+    current_stage().add(rows=len(df), bytes_written=file_size(path))
+    return path
+
+def _filter_frame(df, filters):
+    # Filters in the pyarrow/pandas form: a list of (column, op, value) that must all hold
+    mask = np.ones(len(df), dtype=bool)
+    for col, op, value in filters:
+        if op not in _FILTER_OPS:
+            raise ValueError(f"Invalid filter operator: {op}. Choose from {list(_FILTER_OPS)}.")
+        mask &= _FILTER_OPS[op](df[col], value).to_numpy()
+    return df[mask]
+
+@profiled
+def read_table(path, output_format=None, columns=None, filters=None, sep=',', index_col=None):
+    """
+    Read a table written by write_table.
+
+    For Parquet and Feather only the requested columns are read, and filters are pushed down
+    into the reader, so row groups and partitions that cannot match are skipped. For CSV the
+    whole file is read and then filtered.
+
+    Parameters:
+    path (str): The file, or the folder of a partitioned Parquet table.
+    output_format (str): 'csv', 'parquet' or 'feather' (default follows the extension).
+    columns (list of str): Only read these columns (the index is always kept).
+    filters (list of tuple): Row filters such as [('File', 'in', ['a.stats', 'b.stats'])] or
+        [('phylum', '==', 'Firmicutes')]; all of them must hold.
+    sep (str): The CSV field separator (default is ',').
+    index_col (int or str): The CSV index column (optional).
+
+    Returns:
+    pd.DataFrame: The table, with categorical taxonomy columns for Parquet and Feather.
+    """
+    output_format = table_format(path, output_format)
+
+    if output_format == 'csv':
+        df = pd.read_csv(path, sep=sep, index_col=index_col)
+        current_stage().add(rows=len(df), bytes_read=file_size(path))
+        if filters:
+            df = _filter_frame(df, filters)
+        return df[columns] if columns is not None else df
+
+    _require_pyarrow()
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    dataset = ds.dataset(path, format='parquet' if output_format == 'parquet' else 'ipc', partitioning='hive')
+    if columns is not None:
+        # Keep the index columns stored by pandas, so the index is restored
+        pandas_metadata = dataset.schema.pandas_metadata or {}
+        index_columns = [col for col in pandas_metadata.get('index_columns', []) if isinstance(col, str)]
+        columns = index_columns + [col for col in columns if col not in index_columns]
+    expression = pq.filters_to_expression(filters) if filters else None
+    table = dataset.to_table(columns=columns, filter=expression)
+    current_stage().add(rows=table.num_rows, bytes_read=table.nbytes)
+    return table.to_pandas()
+
+class TableWriter:
+    """
+    Writes a table block by block, e.g. from the chunked (out-of-core) functions.
+
+    CSV blocks are appended to the file; Parquet and Feather blocks are written as row
+    groups/record batches of one file (Feather blocks keep the ranks as plain strings).
+    Use as a context manager.
+
+    Parameters:
+    path (str): The output path; the format follows its extension unless output_format is given.
+    output_format (str): 'csv', 'parquet' or 'feather' (optional).
+    sep (str): The CSV field separator (default is ',').
+    index (bool): Write the index (default is True).
+    index_label (str): The CSV header of the index column (optional).
+    compression (str): The Parquet/Feather compression codec (default is 'zstd').
+    """
+
+    def __init__(self, path, output_format=None, sep=',', index=True, index_label=None, compression='zstd'):
+        self.path = path
+        self.output_format = table_format(path, output_format)
+        self.sep = sep
+        self.index = index
+        self.index_label = index_label
+        self.compression = compression
+        self._writer = None
+        self._schema = None
+        self._first = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, df):
+        """Append one block of rows."""
+        if self.output_format == 'csv':
+            df.to_csv(self.path, sep=self.sep, mode='w' if self._first else 'a', header=self._first,
+                      index=self.index, index_label=self.index_label)
+            self._first = False
+            return
+
+        table = _arrow_table(_compact(df), index=self.index)
+        if self.output_format == 'feather':
+            import pyarrow as pa
+
+            # An Arrow IPC file allows one dictionary per column, so blocks store plain strings
+            fields = [pa.field(field.name, field.type.value_type) if pa.types.is_dictionary(field.type) else field
+                      for field in table.schema]
+            table = table.cast(pa.schema(fields, metadata=table.schema.metadata))
+        if self._writer is None:
+            self._schema = table.schema
+            if self.output_format == 'parquet':
+                import pyarrow.parquet as pq
+                self._writer = pq.ParquetWriter(self.path, self._schema, compression=self.compression)
+            else:
+                import pyarrow as pa
+                options = pa.ipc.IpcWriteOptions(compression=self.compression)
+                self._writer = pa.ipc.new_file(self.path, self._schema, options=options)
+        self._writer.write_table(table.cast(self._schema))
+        self._first = False
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+# Example usage:
+# write_table(merged_table, 'tax_table/merged_table.parquet')
+# firmicutes = read_table('tax_table/merged_table.parquet', columns=['S1', 'S2'], filters=[('phylum', '==', 'Firmicutes')])
+# write_table(stats, 'stats.parquet', partition_cols=['File'], index=False)
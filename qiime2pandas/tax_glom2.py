@@ -1,21 +1,34 @@
-import pandas as pd
+from .otu_table import OTUTable
+from .tax_lineage import lineage_ranks, tax_glom_all
+from .profiling import profiled
 
-def tax_glom_table(df, taxonomic_level, sample_indices=None):
+@profiled
+def tax_glom_table(df, taxonomic_level, sample_indices=None, lineage=True):
     """
     Aggregate taxonomic information at the specified taxonomic level, summing only sample columns selected by index.
 
     Parameters:
-    - df: DataFrame
+    - df: DataFrame or OTUTable
         The DataFrame containing taxonomic and sample abundance information.
     - taxonomic_level: str
         The taxonomic level to aggregate at (e.g., "Phylum").
     - sample_indices: list of int, optional (default=None)
         The indices of the columns corresponding to the samples to aggregate.
+        For an OTUTable these index its samples, and all samples are used if None.
+    - lineage: bool, optional (default=True)
+        Group by the full lineage down to the level, so identically named taxa with different
+        parents are kept apart. If False, group by the level's name only.
 
     Returns:
-    - DataFrame
-        A new DataFrame with aggregated taxonomic information.
+    - DataFrame or OTUTable
+        A new DataFrame (or sparse OTUTable, for OTUTable input) with the lineage columns
+        followed by the summed sample columns.
     """
+    if isinstance(df, OTUTable):
+        if sample_indices is not None:
+            df = df.select_samples(sample_indices)
+        return df.collapse(taxonomic_level, lineage=lineage)
+
     # Check if the specified taxonomic level is present in the DataFrame
     if taxonomic_level not in df.columns:
         raise ValueError(f"Taxonomic level '{taxonomic_level}' not found in DataFrame.")
@@ -30,11 +43,9 @@ def tax_glom_table(df, taxonomic_level, sample_indices=None):
     if not sample_cols:
         raise ValueError("No sample columns found with the provided indices.")
 
-    # Keep only the taxonomic level and the selected sample columns
-    df_filtered = df[[taxonomic_level] + sample_cols]
-
-    # Group by the specified taxonomic level and sum the sample abundances
-    grouped_df = df_filtered.groupby(taxonomic_level, as_index=False).sum()
+    # Encode the lineage as integer codes and sum the selected samples with a sparse indicator product
+    ranks = lineage_ranks(df.columns, taxonomic_level, lineage)
+    grouped_df = tax_glom_all(df, ranks=ranks, sample_columns=sample_cols)[taxonomic_level]
 
     return grouped_df
 
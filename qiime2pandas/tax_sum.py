@@ -1,26 +1,41 @@
-import pandas as pd
+from .otu_table import OTUTable
+from .tax_lineage import lineage_ranks, rank_columns, tax_glom_all
+from .profiling import profiled
 
 #taken from phyloseq, tax_glom, could be wrong
 
-def tax_glom(df, taxonomic_level):
+@profiled
+def tax_glom(df, taxonomic_level, lineage=True):
     """
     Aggregate taxonomic information at the specified taxonomic level.
 
     Parameters:
-    - df: DataFrame
+    - df: DataFrame or OTUTable
         The DataFrame containing taxonomic information.
     - taxonomic_level: str
         The taxonomic level to aggregate at (e.g., "Phylum").
+    - lineage: bool, optional (default=True)
+        Group by the full lineage down to the level, so identically named taxa with different
+        parents are kept apart. If False, group by the level's name only.
 
     Returns:
-    - DataFrame
-        A new DataFrame with aggregated taxonomic information.
+    - DataFrame or OTUTable
+        A new DataFrame (or sparse OTUTable, for OTUTable input) with the lineage columns
+        followed by the summed numeric (sample) columns.
     """
+    if isinstance(df, OTUTable):
+        return df.collapse(taxonomic_level, lineage=lineage)
+
     # Check if the specified taxonomic level is present in the DataFrame
     if taxonomic_level not in df.columns:
         raise ValueError(f"Taxonomic level '{taxonomic_level}' not found in DataFrame.")
 
-    # Group by the specified taxonomic level and sum the abundances
-    grouped_df = df.groupby(taxonomic_level).sum().reset_index()
+    # Sum the numeric columns; other rank and text columns are not aggregated
+    ranks = lineage_ranks(df.columns, taxonomic_level, lineage)
+    excluded = set(rank_columns(df.columns)) | {taxonomic_level}
+    sample_cols = [col for col in df.select_dtypes(include=['number']).columns if col not in excluded]
+
+    # Encode the lineage as integer codes and sum with a sparse indicator product
+    grouped_df = tax_glom_all(df, ranks=ranks, sample_columns=sample_cols)[taxonomic_level]
 
     return grouped_df
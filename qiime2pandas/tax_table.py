@@ -1,70 +1,219 @@
+import io
 import os
-import shutil
-import zipfile
-import tempfile
-import pandas as pd
-import subprocess
 import logging
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import pandas as pd
+from .qza_archive import QZAArchive
+from .otu_table import OTUTable
+from .artifact_cache import ArtifactCache
+from .table_io import TableWriter, with_extension, write_table
+from .tax_lineage import LINEAGES
+from .profiling import profiled, stage, file_size, in_current_stage, log_event
+
+TAXONOMY_RANKS = ['kingdom', 'phylum', 'class', 'order', 'family', 'genus', 'species']
+
+def _decode_artifact(qza_file_path, cache=None):
+    """
+    Decode the taxonomy and/or feature table held in one artifact.
+
+    Parameters:
+    qza_file_path (str): Path to the .qza file.
+    cache (ArtifactCache): Cache of previously decoded artifacts (optional).
+
+    Returns:
+    pd.DataFrame: The taxonomy split into categorical ranks, or None if the artifact has no taxonomy.tsv.
+    OTUTable: The sparse feature table, or None if the artifact has no feature-table.biom.
+    """
+    if cache is not None:
+        cached = cache.load(qza_file_path)
+        if cached is not None:
+            return cached['taxa'], cached['rare_table']
+
+    taxa = rare_table = None
+
+    with QZAArchive(qza_file_path) as archive:
+        # Parse the taxonomy straight from the archive
+        if 'taxonomy.tsv' in archive:
+            with stage('unzip', file=qza_file_path) as unzip:
+                taxa = archive.read_table('taxonomy.tsv', index_col=0)
+                unzip.add(rows=len(taxa), bytes_read=archive.size('taxonomy.tsv'))
+            with stage('taxonomy_split') as split:
+                # Each distinct lineage is parsed once; the ranks are shared categoricals
+                taxa = pd.concat([taxa, LINEAGES.lineage_frame(taxa['Taxon'], index=taxa.index)], axis=1)
+                split.add(rows=len(taxa))
+
+        # Load the BIOM table in-process; HDF5 needs random access, so it is buffered in memory
+        if 'feature-table.biom' in archive:
+            with stage('unzip', file=qza_file_path) as unzip:
+                data = archive.read('feature-table.biom')
+                unzip.add(bytes_read=len(data))
+            with stage('biom_conversion') as conversion:
+                rare_table = OTUTable.from_biom(io.BytesIO(data))
+                conversion.add(rows=rare_table.shape[0], bytes_read=len(data))
+
+    if cache is not None:
+        cache.store(qza_file_path, {'taxa': taxa, 'rare_table': rare_table})
+
+    return taxa, rare_table
+
+def _try_decode_artifact(qza_file_path, cache=None):
+    # Errors are returned rather than raised so one bad artifact does not stop the others
+    try:
+        return _decode_artifact(qza_file_path, cache), None
+    except Exception as e:
+        return None, e
+
+def _merge_and_save(rare_table, taxa, workspace, chunksize=None, output_format=None):
+    os.makedirs(workspace, exist_ok=True)
+    output_path = with_extension(os.path.join(workspace, 'merged_table.csv'), output_format)
+
+    if chunksize is not None:
+        # Keep the table sparse and write it in blocks of rows
+        with stage('join') as join:
+            taxonomy = taxa[TAXONOMY_RANKS].reindex(rare_table.observation_ids)
+            join.add(rows=len(taxonomy))
+        rows = rare_table.counts.tocsr()
+        whole_counts = output_format not in (None, 'csv') and (rows.data == rows.data.round()).all()
+        with stage('write', file=output_path) as write, TableWriter(output_path, output_format) as writer:
+            for start in range(0, max(rare_table.shape[0], 1), chunksize):
+                stop = start + chunksize
+                block = rows[start:stop].toarray()
+                block = pd.DataFrame(block.astype('int64') if whole_counts else block,
+                                     index=pd.Index(rare_table.observation_ids[start:stop], name='#OTU ID'),
+                                     columns=rare_table.sample_ids)
+                writer.write(block.join(taxonomy.iloc[start:stop].set_axis(block.index, axis=0)))
+                write.add(rows=len(block))
+        write.add(bytes_written=file_size(output_path))
+        return OTUTable(rare_table.counts, rare_table.observation_ids, rare_table.sample_ids, taxonomy)
+
+    # Same layout as `biom convert --to-tsv` read back with pandas
+    with stage('join') as join:
+        rare_table = pd.DataFrame(rare_table.counts.toarray(),
+                                  index=pd.Index(rare_table.observation_ids, name='#OTU ID'),
+                                  columns=rare_table.sample_ids)
+        merged_table = rare_table.join(taxa[TAXONOMY_RANKS])
+        join.add(rows=len(merged_table))
+    with stage('write', file=output_path) as write:
+        write_table(merged_table, output_path, output_format, index=True)
+        write.add(rows=len(merged_table), bytes_written=file_size(output_path))
+
+    return merged_table
+
+def _artifact_workspaces(qza_file_paths, output_folder):
+    # One folder per artifact, named after the file, so artifacts never overwrite each other
+    workspaces = []
+    seen = {}
+    for qza_file_path in qza_file_paths:
+        folder_name = os.path.splitext(os.path.basename(qza_file_path))[0]
+        seen[folder_name] = seen.get(folder_name, 0) + 1
+        if seen[folder_name] > 1:
+            folder_name = f"{folder_name}_{seen[folder_name]}"
+        workspaces.append(os.path.join(output_folder, folder_name))
+    return workspaces
+
+@profiled
+def import_and_merge(qza_file_paths, max_workers=1, executor='thread', output_folder=None, cache=None,
+                     chunksize=None, output_format=None, lineages=None):
+    """
+    Imports feature tables and taxonomy from QIIME 2 artifacts and merges them.
+
+    Each feature table is joined with the taxonomy of the most recent taxonomy artifact
+    before it in qza_file_paths. Every merged table is saved as merged_table.csv (or
+    .parquet/.feather, see output_format) in its own folder, tax_table/<artifact name>/.
+
+    Parameters:
+    qza_file_paths (list of str): Paths to the .qza files (e.g. taxonomy.qza followed by table.qza).
+    max_workers (int): The number of artifacts to decode and merge concurrently (default is 1).
+    executor (str): 'thread' or 'process' pool for decoding the artifacts (default is 'thread').
+    output_folder (str): The folder for the per-artifact results (default is ./tax_table).
+    cache (ArtifactCache, str or bool): Cache decoded artifacts on disk, so unchanged inputs are not
+        decoded again. A str is used as the cache folder and True uses the default folder (optional).
+    chunksize (int): Out-of-core mode: never densify the feature tables; write each CSV in blocks
+        of this many rows and return sparse OTUTables with the taxonomy attached (optional).
+    output_format (str): 'csv' (the default), 'parquet' or 'feather' for the merged tables, saved
+        as merged_table.<format>. Parquet/Feather store the ranks dictionary-encoded and the
+        counts compressed with their dtype unchanged; read them back with table_io.read_table.
+    lineages (LineageDictionary): The dictionary the taxonomy ranks are interned in, so the rank
+        columns of all the merged tables share categories (default is the shared tax_lineage.LINEAGES).
+
+    Inside profiling.profile() every artifact records its unzip, biom_conversion,
+    taxonomy_split, join and write stages (not with executor='process').
+
+    Returns:
+    list of pd.DataFrame or OTUTable: The merged tables, in the order of qza_file_paths.
+    """
+    if executor not in ('thread', 'process'):
+        raise ValueError(f"Invalid executor: {executor}. Choose from 'thread' or 'process'.")
+
+    if output_folder is None:
+        output_folder = os.path.join(os.getcwd(), 'tax_table')
+    workspaces = _artifact_workspaces(qza_file_paths, output_folder)
+
+    cache = ArtifactCache.coerce(cache)
+    decode = partial(_try_decode_artifact, cache=cache)
+
+    # Decode every artifact, concurrently if requested; map keeps the input order
+    if max_workers == 1:
+        decoded = [decode(path) for path in qza_file_paths]
+    else:
+        if executor == 'thread':
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                decoded = list(pool.map(in_current_stage(decode), qza_file_paths))
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                decoded = list(pool.map(decode, qza_file_paths))
+
+    # Taxonomies decoded in other processes or loaded from the cache get the shared categories
+    if lineages is None:
+        lineages = LINEAGES
+    taxonomies = iter(lineages.adopt([result[0] for result, _ in decoded if result is not None and result[0] is not None]))
+
+    # Pair each feature table with the taxonomy that precedes it
+    jobs = []
+    taxa = None
+    for qza_file_path, workspace, (result, error) in zip(qza_file_paths, workspaces, decoded):
+        if error is not None:
+            log_event(f"An error occurred while processing {qza_file_path}: {error}", logging.ERROR,
+                      file=qza_file_path, error=repr(error))
+            continue
+
+        artifact_taxa, rare_table = result
+        if artifact_taxa is not None:
+            taxa = next(taxonomies)
+
+        if rare_table is None:
+            log_event(f"The biom file 'feature-table.biom' does not exist. Skipping conversion for {qza_file_path}.",
+                      logging.WARNING, file=qza_file_path, skipped=True)
+            continue
+        if taxa is None:
+            log_event(f"An error occurred while processing {qza_file_path}: No taxonomy artifact was found before this feature table.",
+                      logging.ERROR, file=qza_file_path, error='no taxonomy')
+            continue
+
+        log_event(f"Loaded biom table for {os.path.basename(qza_file_path)}", file=qza_file_path,
+                  rows=rare_table.shape[0])
+        jobs.append((qza_file_path, workspace, rare_table, taxa))
+
+    # Merge and write the tables; each one has its own workspace
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        merge_and_save = in_current_stage(_merge_and_save)
+        futures = [pool.submit(merge_and_save, rare_table, job_taxa, workspace, chunksize, output_format)
+                   for _, workspace, rare_table, job_taxa in jobs]
 
-def import_and_merge(qza_file_paths):
-    logging.basicConfig(level=logging.INFO)
     merged_tables = []
-
-    for qza_file_path in qza_file_paths:
+    for (qza_file_path, workspace, _, _), future in zip(jobs, futures):
         try:
-            temp_dir = tempfile.mkdtemp()
-            with zipfile.ZipFile(qza_file_path, 'r') as zip_ref:
-                zip_ref.extractall(temp_dir)
-
-            folder_name = os.path.splitext(os.path.basename(qza_file_path))[0]
-            output_folder = os.path.join(os.getcwd(), folder_name)
-            os.makedirs(output_folder, exist_ok=True)
-
-            tax_table_folder = os.path.join(os.getcwd(), 'tax_table')
-            os.makedirs(tax_table_folder, exist_ok=True)
-
-            # Move files only if they exist
-            for root, dirs, files in os.walk(temp_dir):
-                for file_name in files:
-                    source_file = os.path.join(root, file_name)
-                    if os.path.exists(source_file):
-                        destination_file = os.path.join(tax_table_folder, file_name)
-                        shutil.move(source_file, destination_file)
-
-            biom_file_path = os.path.join(tax_table_folder, 'feature-table.biom')
-            if os.path.exists(biom_file_path):
-                txt_file_path = os.path.join(tax_table_folder, 'rare_table.txt')
-                subprocess.run(['biom', 'convert', '-i', biom_file_path, '-o', txt_file_path, '--to-tsv'], check=True)
-                logging.info(f"Converted biom file to text file for {os.path.basename(qza_file_path)} into folder: {tax_table_folder}")
-            else:
-                logging.warning(f"The biom file '{biom_file_path}' does not exist. Skipping conversion for {qza_file_path}.")
-                continue  # Skip this iteration if the biom file is missing
-
-            taxonomy_path = os.path.join(tax_table_folder, 'taxonomy.tsv')
-            taxa = pd.read_table(taxonomy_path, index_col=0)
-            taxa[['kingdom', 'phylum', 'class', 'order', 'family', 'genus', 'species']] = taxa['Taxon'].str.split(';', expand=True)
-
-            rare_table_path = os.path.join(tax_table_folder, 'rare_table.txt')
-            rare_table = pd.read_table(rare_table_path, skiprows=1, index_col=0)
-
-            merged_table = rare_table.join(taxa[['kingdom', 'phylum', 'class', 'order', 'family', 'genus', 'species']])
-            merged_tables.append(merged_table)
-
-            logging.info(f"Imported and merged taxonomy and rare table for {os.path.basename(qza_file_path)} into folder: {tax_table_folder}")
-
-            csv_file_path = os.path.join(tax_table_folder, 'merged_table.csv')
-            merged_table.to_csv(csv_file_path, index=True)
-
-            logging.info(f"Saved merged_table as CSV for {os.path.basename(qza_file_path)} into folder: {tax_table_folder}")
-
-            shutil.rmtree(temp_dir)
-
+            merged_tables.append(future.result())
+            log_event(f"Saved merged_table as {(output_format or 'csv').upper()} for {os.path.basename(qza_file_path)} into folder: {workspace}",
+                      file=qza_file_path, output_folder=workspace)
         except Exception as e:
-            logging.error(f"An error occurred while processing {qza_file_path}: {e}")
+            log_event(f"An error occurred while processing {qza_file_path}: {e}", logging.ERROR,
+                      file=qza_file_path, error=repr(e))
 
     return merged_tables
 
 # Example usage:
 # qza_file_paths = ['/content/taxonomy.qza', '/content/core-metrics-results/rarefied_table.qza']
 # merged_tables = import_and_merge(qza_file_paths)
-
+# merged_tables = import_and_merge(run_qza_paths, max_workers=16, cache=True)
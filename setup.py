@@ -9,13 +9,20 @@ setup(
     url='https://github.com/toryn13/qiime2pandas',
     packages=find_packages(),
     install_requires=[
-        'pandas',
-        'numpy',
+        'pandas>=1.5',
+        'numpy>=1.21',
+        'scipy>=1.7',
+        'h5py>=3.0',
     ],
+    extras_require={
+        'plot': ['matplotlib>=3.0.0'],
+        'progress': ['tqdm'],
+        'parquet': ['pyarrow>=10'],
+    },
     classifiers=[
         'Programming Language :: Python :: 3',
         'License :: OSI Approved :: MIT License',
         'Operating System :: OS Independent',
     ],
-    python_requires='>=3.6',
+    python_requires='>=3.9',
 )
@@ -0,0 +1,64 @@
+import io
+import zipfile
+import h5py
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import sparse
+
+@pytest.fixture
+def merged_table():
+    """A small merged table as import_and_merge returns it: sample columns, then a rank."""
+    return pd.DataFrame({
+        'S1': [5, 0, 2, 1],
+        'S2': [0, 3, 7, 0],
+        'phylum': ['Firmicutes', 'Proteobacteria', 'Firmicutes', None],
+    }, index=pd.Index(['a1', 'b2', 'c3', 'd4'], name='#OTU ID'))
+
+@pytest.fixture
+def otu_df():
+    """A random 200 OTU x 6 sample count table, with no empty samples."""
+    rng = np.random.default_rng(0)
+    counts = rng.negative_binomial(0.3, 0.01, size=(200, 6))
+    counts[:, 0] += 1  # make sure no sample is empty
+    return pd.DataFrame(counts,
+                        index=[f'OTU{i}' for i in range(200)],
+                        columns=[f'S{j}' for j in range(6)])
+
+@pytest.fixture
+def biom_table():
+    """The feature table of the BIOM fixtures: counts (OTUs x samples), OTU IDs and sample IDs."""
+    return np.array([[5, 0], [0, 3], [2, 7]], dtype=np.float64), ['a1', 'b2', 'c3'], ['S1', 'S2']
+
+@pytest.fixture
+def biom_hdf5_bytes(biom_table):
+    """biom_table as a BIOM 2.1 (HDF5) file, as found in a feature table artifact."""
+    counts, otu_ids, sample_ids = biom_table
+    buffer = io.BytesIO()
+    matrix = sparse.csc_matrix(counts)
+    with h5py.File(buffer, 'w') as f:
+        f.attrs['format-version'] = [2, 1]
+        f.attrs['shape'] = counts.shape
+        f.create_dataset('observation/ids', data=np.array(otu_ids, dtype=object), dtype=h5py.string_dtype())
+        f.create_dataset('sample/ids', data=np.array(sample_ids, dtype=object), dtype=h5py.string_dtype())
+        f.create_dataset('sample/matrix/data', data=matrix.data)
+        f.create_dataset('sample/matrix/indices', data=matrix.indices)
+        f.create_dataset('sample/matrix/indptr', data=matrix.indptr)
+    return buffer.getvalue()
+
+@pytest.fixture
+def write_qza():
+    """
+    A function write_qza(path, uuid, files, type='Test', format='Test') that writes a QIIME 2
+    artifact holding files (name -> content) under data/, with a VERSION and provenance as real
+    artifacts have.
+    """
+    def write(path, uuid, files, type='Test', format='Test'):
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr(f'{uuid}/VERSION', 'QIIME 2\narchive: 5\n')
+            zf.writestr(f'{uuid}/metadata.yaml', f'uuid: {uuid}\ntype: {type}\nformat: {format}\n')
+            for name, content in files.items():
+                zf.writestr(f'{uuid}/data/{name}', content)
+            zf.writestr(f'{uuid}/provenance/artifacts/other/metadata.yaml', 'uuid: other\n')
+            zf.writestr(f'{uuid}/provenance/action/action.yaml', 'action: {}\n')
+    return write
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+from qiime2pandas.artifact_cache import ArtifactCache
+from qiime2pandas.otu_table import OTUTable
+from qiime2pandas.tax_table import import_and_merge
+from qiime2pandas.normalize import normalize
+
+TAXONOMY = 'Feature ID\tTaxon\tConfidence\na1\td__Bacteria; p__Firmicutes; c__; o__; f__; g__; s__\t0.9\n'
+
+def test_artifact_cache_round_trip(tmpdir, write_qza, biom_hdf5_bytes):
+    qza_path = str(tmpdir.join('table.qza'))
+    write_qza(qza_path, 'table-uuid', {'feature-table.biom': biom_hdf5_bytes})
+    cache = ArtifactCache.coerce(str(tmpdir.join('cache')))
+    assert ArtifactCache.coerce(cache) is cache and ArtifactCache.coerce(False) is None
+
+    assert cache.load(qza_path) is None
+
+    taxa = pd.DataFrame({'Taxon': ['d__Bacteria'], 'Confidence': [0.9]}, index=pd.Index(['a1'], name='Feature ID'))
+    table = OTUTable([[1, 0], [0, 2]], ['a1', 'b2'], ['S1', 'S2'])
+    cache.store(qza_path, {'taxa': taxa, 'rare_table': table, 'missing': None})
+
+    cached = cache.load(qza_path)
+    pd.testing.assert_frame_equal(cached['taxa'], taxa)
+    assert (cached['rare_table'].counts.toarray() == [[1, 0], [0, 2]]).all()
+    assert list(cached['rare_table'].sample_ids) == ['S1', 'S2']
+    assert cached['missing'] is None
+
+    # A modified artifact is a cache miss
+    write_qza(qza_path, 'table-uuid', {'feature-table.biom': biom_hdf5_bytes, 'extra.txt': 'x'})
+    assert cache.load(qza_path) is None
+
+def test_artifact_cache_eviction(tmpdir, write_qza, biom_hdf5_bytes):
+    cache = ArtifactCache(str(tmpdir.join('cache')))
+    paths = []
+    for i in range(3):
+        paths.append(str(tmpdir.join(f'table{i}.qza')))
+        write_qza(paths[-1], f'uuid-{i}', {'feature-table.biom': biom_hdf5_bytes})
+        cache.store(paths[-1], {'rare_table': OTUTable([[i + 1]], ['a1'], ['S1'])})
+
+    entry_size = cache.entries()[0][1]
+    cache.load(paths[0])  # Now the most recently used
+    cache.max_bytes = 2 * entry_size
+    cache.evict()
+
+    assert cache.load(paths[1]) is None
+    assert cache.load(paths[0]) is not None
+    assert cache.load(paths[2]) is not None
+
+def test_import_and_merge_cache(tmpdir, write_qza, biom_hdf5_bytes):
+    paths = [str(tmpdir.join('taxonomy.qza')), str(tmpdir.join('table.qza'))]
+    write_qza(paths[0], 'tax-uuid', {'taxonomy.tsv': TAXONOMY})
+    write_qza(paths[1], 'table-uuid', {'feature-table.biom': biom_hdf5_bytes})
+    cache = ArtifactCache(str(tmpdir.join('cache')))
+
+    with tmpdir.as_cwd():
+        first = import_and_merge(paths, cache=cache)
+        second = import_and_merge(paths, cache=cache)
+
+    assert len(cache.entries()) == 2
+    pd.testing.assert_frame_equal(first[0], second[0])
+
+def test_cached_table_is_writable(tmpdir, write_qza, biom_hdf5_bytes):
+    paths = [str(tmpdir.join('taxonomy.qza')), str(tmpdir.join('table.qza'))]
+    write_qza(paths[0], 'tax-uuid', {'taxonomy.tsv': TAXONOMY})
+    write_qza(paths[1], 'table-uuid', {'feature-table.biom': biom_hdf5_bytes})
+    cache = ArtifactCache(str(tmpdir.join('cache')))
+
+    with tmpdir.as_cwd():
+        import_and_merge(paths, cache=cache, chunksize=2)
+        table = import_and_merge(paths, cache=cache, chunksize=2)[0]
+        normalize(table, 'percent', inplace=True)
+        assert np.allclose(table.counts.sum(axis=0), 100)
+
+        # The change stays in memory; the cache still holds the counts
+        cached = import_and_merge(paths, cache=cache, chunksize=2)[0]
+    assert cached.counts.sum() == 17
@@ -0,0 +1,25 @@
+from benchmarks.synthetic import otu_counts, lineages, stats_text
+from benchmarks.run_benchmarks import compare
+from qiime2pandas.stats_reader import read_stats_file
+
+def test_synthetic_data(tmpdir):
+    counts = otu_counts(500, 8, seed=1)
+    assert counts.shape == (500, 8)
+    assert (otu_counts(500, 8, seed=1) != counts).nnz == 0
+    # Long-tailed: most OTUs are absent from most samples
+    assert counts.nnz < 0.5 * 500 * 8
+
+    assert all(1 <= len(lineage) <= 7 for lineage in lineages(100))
+
+    stats_file = tmpdir.join('sample.stats')
+    stats_file.write(stats_text(seed=3))
+    summary, levels, lengths, _ = read_stats_file(str(stats_file))
+    assert levels == ['MaxEE0.5', 'MaxEE1', 'MaxEE2']
+    assert lengths[0] == 50
+
+def test_compare_baseline():
+    baseline = {'small': {'tax_glom': {'seconds': 1.0, 'peak_rss_mb': 100.0}}}
+    _, regressed = compare({'small': {'tax_glom': {'seconds': 1.1, 'peak_rss_mb': 100.0}}}, baseline)
+    assert not regressed
+    lines, regressed = compare({'small': {'tax_glom': {'seconds': 2.0, 'peak_rss_mb': 100.0}}}, baseline)
+    assert regressed and 'REGRESSION' in lines[0]
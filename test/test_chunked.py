@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+from qiime2pandas.chunked import column_sums, relative_abundance_file, tax_glom_file, rarefy_table_file
+from qiime2pandas.tax_sum import tax_glom
+
+def _write_otu_table(tmpdir):
+    rng = np.random.default_rng(0)
+    otu_df = pd.DataFrame(rng.negative_binomial(0.5, 0.05, size=(50, 3)) + 1,
+                          index=pd.Index([f'OTU{i}' for i in range(50)], name='#OTU ID'),
+                          columns=['S1', 'S2', 'S3'])
+    otu_df['phylum'] = [f'P{i % 4}' for i in range(50)]
+    path = str(tmpdir.join('otutab.txt'))
+    otu_df.to_csv(path, sep='\t')
+    return otu_df, path
+
+def test_chunked_reductions(tmpdir):
+    otu_df, path = _write_otu_table(tmpdir)
+
+    pd.testing.assert_series_equal(column_sums(path, chunksize=7), otu_df[['S1', 'S2', 'S3']].sum())
+
+    output_file = relative_abundance_file(path, str(tmpdir.join('rel.txt')), chunksize=7)
+    rel_df = pd.read_csv(output_file, sep='\t', index_col=0)
+    assert np.allclose(rel_df.sum(), 100)
+
+    phyla = tax_glom_file(path, 'phylum', chunksize=7)
+    pd.testing.assert_frame_equal(phyla, tax_glom(otu_df, 'phylum'))
+
+def test_rarefy_table_file(tmpdir):
+    otu_df, path = _write_otu_table(tmpdir)
+    depth = int(otu_df[['S1', 'S2', 'S3']].sum().min())
+
+    output_file, otus_lost = rarefy_table_file(path, depth, str(tmpdir.join('rare.txt')), chunksize=7, seed=0)
+    rarefied = pd.read_csv(output_file, sep='\t', index_col=0)
+
+    assert (rarefied[['S1', 'S2', 'S3']].sum() == depth).all()
+    assert (rarefied[['S1', 'S2', 'S3']] <= otu_df[['S1', 'S2', 'S3']]).all().all()
+    assert list(rarefied['phylum']) == list(otu_df['phylum'])
+    assert otus_lost['S1'] == (otu_df['S1'] > 0).sum() - (rarefied['S1'] > 0).sum()
+
+def test_chunked_empty_rank(tmpdir):
+    otu_df, _ = _write_otu_table(tmpdir)
+    # As in a merged_table.csv: 'genus' is never assigned and 'species' only after the first block
+    otu_df['genus'] = np.nan
+    otu_df['species'] = [None] * 10 + ['coli'] * 40
+    path = str(tmpdir.join('merged_table.txt'))
+    otu_df.to_csv(path, sep='\t')
+    samples = ['S1', 'S2', 'S3']
+
+    pd.testing.assert_series_equal(column_sums(path, chunksize=7), otu_df[samples].sum())
+
+    rel_df = pd.read_csv(relative_abundance_file(path, str(tmpdir.join('rel.txt')), chunksize=7), sep='\t', index_col=0)
+    assert list(rel_df.columns) == samples and np.allclose(rel_df.sum(), 100)
+
+    depth = int(otu_df[samples].sum().min())
+    output_file, otus_lost = rarefy_table_file(path, depth, str(tmpdir.join('rare.txt')), chunksize=7, seed=0)
+    assert set(otus_lost) == set(samples)
+    rarefied = pd.read_csv(output_file, sep='\t', index_col=0)
+    assert (rarefied[samples].sum() == depth).all()
+    assert list(rarefied['species'].fillna('')) == list(otu_df['species'].fillna(''))
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+from scipy.spatial.distance import pdist
+from qiime2pandas.diversity import alpha_diversity, beta_diversity
+from qiime2pandas.otu_table import OTUTable
+
+def test_alpha_diversity(otu_df):
+    otu_df['phylum'] = 'Firmicutes'
+    alpha = alpha_diversity(otu_df)
+
+    counts = otu_df['S0'].to_numpy()
+    p = counts[counts > 0] / counts.sum()
+    f1, f2 = (counts == 1).sum(), (counts == 2).sum()
+    assert alpha.loc['S0', 'observed_features'] == (counts > 0).sum()
+    assert np.isclose(alpha.loc['S0', 'shannon'], -(p * np.log2(p)).sum())
+    assert np.isclose(alpha.loc['S0', 'simpson'], 1 - (p ** 2).sum())
+    assert np.isclose(alpha.loc['S0', 'chao1'], (counts > 0).sum() + f1 * (f1 - 1) / (2 * (f2 + 1)))
+
+    # The sparse table gives the same values
+    sparse_alpha = alpha_diversity(OTUTable.from_pandas(otu_df.drop(columns='phylum')))
+    pd.testing.assert_frame_equal(alpha, sparse_alpha)
+
+def test_beta_diversity(tmpdir, otu_df):
+    samples = otu_df.to_numpy().T
+
+    bray_curtis = beta_diversity(otu_df, block_size=4, max_workers=3)
+    assert bray_curtis.dtype == np.float32
+    assert np.allclose(bray_curtis, pdist(samples, 'braycurtis'), atol=1e-6)
+
+    jaccard = beta_diversity(OTUTable.from_pandas(otu_df), metric='jaccard', block_size=3,
+                             output_file=str(tmpdir.join('jaccard.npy')))
+    assert np.allclose(jaccard, pdist(samples > 0, 'jaccard'), atol=1e-6)
+    assert np.allclose(np.load(str(tmpdir.join('jaccard.npy'))), jaccard)
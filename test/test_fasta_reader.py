@@ -0,0 +1,35 @@
+import os
+from qiime2pandas.fasta_reader import FastaFile, read_fasta, pack_sequences
+
+FASTA = ">ASV1 description\nACGTACGTAC\nGTN\n>ASV2\nacgtRY\n>ASV3\nTTTT\nTTTT\n"
+
+def test_fasta_file(tmpdir):
+    fasta_file = str(tmpdir.join('dna-sequences.fasta'))
+    with open(fasta_file, 'w') as f:
+        f.write(FASTA)
+
+    with FastaFile(fasta_file) as fasta:
+        assert len(fasta) == 3
+        assert fasta['ASV1'] == 'ACGTACGTACGTN'
+        assert fasta['ASV3'] == 'TTTTTTTT'
+        # Every base other than A, C, G and T is kept exactly
+        packed = fasta.pack()
+        assert packed.to_series().to_dict() == fasta.sequences().to_dict()
+        assert packed['ASV2'] == 'acgtRY'
+
+    # The index is cached next to the file in the samtools layout
+    assert tmpdir.join('dna-sequences.fasta.fai').read().splitlines()[0] == 'ASV1\t13\t18\t10\t11'
+
+def test_pack_sequences_batches():
+    sequences = ['ACG', 'T', '', 'NNAC', 'GGGGG']
+    packed = pack_sequences(list('abcde'), sequences, batch_size=2)
+    assert [packed[name] for name in 'abcde'] == sequences
+
+def test_read_fasta_qza(tmpdir, write_qza):
+    qza_file = str(tmpdir.join('rep-seqs.qza'))
+    write_qza(qza_file, 'seqs-uuid', {'dna-sequences.fasta': FASTA})
+
+    with tmpdir.as_cwd():
+        with read_fasta(qza_file) as fasta:
+            assert fasta['ASV2'] == 'acgtRY'
+    assert os.path.exists(str(tmpdir.join('rep-seqs', 'dna-sequences.fasta.fai')))
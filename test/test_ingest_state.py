@@ -0,0 +1,56 @@
+import os
+import shutil
+import pandas as pd
+from qiime2pandas.extract_summary_stats import extract_summary_stats
+from qiime2pandas.process_stats_files import process_stats_files
+from qiime2pandas.ingest_state import IngestState, watch
+
+STATS_FILE = os.path.join(os.path.dirname(__file__), 'test_files', 'data.stats')
+
+def test_ingest_state(tmpdir):
+    path = tmpdir.join('a.txt')
+    path.write('one')
+    state = IngestState(str(tmpdir.join('state.json')))
+
+    assert state.changed([str(path)]) == [str(path)]
+    state.update([str(path)])
+    state.save()
+
+    state = IngestState(str(tmpdir.join('state.json')))
+    os.utime(str(path), ns=(0, 0))  # Touched, same contents
+    assert state.changed([str(path)]) == []
+    path.write('two')
+    assert state.changed([str(path)]) == [str(path)]
+    assert state.removed([]) == [str(path)]
+
+def test_incremental_summary(tmpdir):
+    shutil.copy(STATS_FILE, str(tmpdir.join('a.stats')))
+    summary = extract_summary_stats(str(tmpdir), incremental=True)
+    assert list(summary['File']) == ['a.stats']
+
+    # A new file is parsed and appended; a half-written file is tried again next time
+    shutil.copy(STATS_FILE, str(tmpdir.join('b.stats')))
+    tmpdir.join('c.stats').write('partial')
+    summary = watch(extract_summary_stats, str(tmpdir), interval=0, max_polls=2)
+    assert sorted(summary['File']) == ['a.stats', 'b.stats']
+
+    os.remove(str(tmpdir.join('a.stats')))
+    os.remove(str(tmpdir.join('c.stats')))
+    summary = extract_summary_stats(str(tmpdir), incremental=True)
+    assert list(pd.read_csv(str(tmpdir.join('summary_stats.csv')))['File']) == ['b.stats']
+
+    # The same rows as a full rerun
+    maxee = process_stats_files(str(tmpdir), 'MaxEE1', incremental=True)
+    expected = process_stats_files(str(tmpdir), 'MaxEE1', output_csv='full.csv')
+    pd.testing.assert_frame_equal(maxee, expected)
+
+def test_incremental_summary_params_change(tmpdir):
+    shutil.copy(STATS_FILE, str(tmpdir.join('a.stats')))
+    shutil.copy(STATS_FILE, str(tmpdir.join('b.stats')))
+    process_stats_files(str(tmpdir), 'MaxEE1', incremental=True)
+
+    # A deleted file loses its rows even when the new params make every file be parsed again
+    os.remove(str(tmpdir.join('a.stats')))
+    maxee = process_stats_files(str(tmpdir), 'MaxEE2', incremental=True)
+    assert set(maxee['File']) == {'b.stats'}
+    assert set(pd.read_csv(str(tmpdir.join('maxEE_summary.csv')))['File']) == {'b.stats'}
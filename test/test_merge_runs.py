@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+import pytest
+from qiime2pandas.merge_runs import merge_runs
+from qiime2pandas.otu_table import OTUTable
+
+def _runs():
+    taxonomy = lambda rows: pd.DataFrame(rows, columns=['kingdom', 'phylum'])
+    run1 = OTUTable(np.array([[1, 0], [2, 3]]), ['x', 'y'], ['S1', 'S2'], taxonomy([['B', 'F'], ['B', 'P']]))
+    run2 = OTUTable(np.array([[5], [1], [7]]), ['y', 'z', 'x'], ['S2'], taxonomy([['B', 'Q'], ['B', 'F'], ['B', 'F']]))
+    # A merged table as returned by import_and_merge
+    run3 = pd.DataFrame({'S3': [4], 'kingdom': ['B'], 'phylum': ['Q']}, index=pd.Index(['y'], name='#OTU ID'))
+    return [run1, run2, run3]
+
+def test_merge_runs():
+    merged = merge_runs(_runs())
+
+    assert list(merged.observation_ids) == ['x', 'y', 'z']
+    assert list(merged.sample_ids) == ['S1', 'S2', 'S3']
+    # Overlapping samples are summed
+    assert merged.counts.toarray().tolist() == [[1, 7, 0], [2, 8, 4], [0, 1, 0]]
+    # Two of the three runs call y Q
+    assert list(merged.taxonomy['phylum']) == ['F', 'Q', 'F']
+    assert isinstance(merged.taxonomy['phylum'].dtype, pd.CategoricalDtype)
+
+def test_merge_runs_policies():
+    runs = _runs()
+
+    assert list(merge_runs(runs, taxonomy='first').taxonomy['phylum']) == ['F', 'P', 'F']
+    consensus = merge_runs(runs, taxonomy='consensus').taxonomy
+    assert list(consensus['kingdom']) == ['B', 'B', 'B']
+    assert pd.isna(consensus.loc['y', 'phylum'])
+
+    renamed = merge_runs(runs, samples='rename')
+    assert list(renamed.sample_ids) == ['S1', 'S2_run1', 'S2_run2', 'S3']
+    assert merge_runs(runs, samples='first').counts[:, 1].toarray().ravel().tolist() == [0, 3, 0]
+    with pytest.raises(ValueError):
+        merge_runs(runs, samples='error')
@@ -0,0 +1,24 @@
+import numpy as np
+from qiime2pandas.newick_reader import parse_newick, read_newick
+
+def test_parse_newick():
+    tree = parse_newick("((A:0.1,B:0.2)0.95:0.3,'C d':0.4)root;")
+
+    assert tree.tip_names == ['A', 'B', 'C d']
+    assert list(tree.parent) == [-1, 0, 1, 1, 0]
+    assert list(tree.children(1)) == [2, 3]
+    assert tree.names[1] == '0.95'
+    np.testing.assert_allclose(tree.root_distances()[tree.tips], [0.4, 0.5, 0.4])
+
+def test_parse_newick_deep_tree():
+    # Far deeper than the recursion limit
+    n = 50000
+    tree = parse_newick('(' * n + 'A' + ''.join(f',T{i}):1' for i in range(n)) + ';')
+    assert len(tree.tips) == n + 1
+    assert tree.root_distances().max() == n - 1
+
+def test_read_newick_qza(tmpdir, write_qza):
+    qza_file = str(tmpdir.join('rooted-tree.qza'))
+    write_qza(qza_file, 'tree-uuid', {'tree.nwk': '(a:1,b:2);\n'})
+    tree = read_newick(qza_file)
+    assert tree.tip_names == ['a', 'b']
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+from scipy import sparse
+from qiime2pandas.normalize import normalize
+from qiime2pandas.otu_table import OTUTable
+
+def test_normalize_dataframe(merged_table):
+    rel_table = normalize(merged_table, 'percent', block_size=1)
+    assert rel_table[['S1', 'S2']].to_numpy().tolist() == [[62.5, 0.0], [0.0, 30.0], [25.0, 70.0], [12.5, 0.0]]
+    # Taxonomy is kept as it is and the input is unchanged
+    assert rel_table['phylum'].equals(merged_table['phylum'])
+    assert merged_table['S1'].tolist() == [5, 0, 2, 1]
+
+    clr = normalize(merged_table, 'clr', dtype=np.float32)
+    assert clr['S1'].dtype == np.float32
+    np.testing.assert_allclose(clr[['S1', 'S2']].sum(), 0, atol=1e-6)
+
+    normalize(merged_table, 'hellinger', inplace=True)
+    np.testing.assert_allclose((merged_table[['S1', 'S2']] ** 2).sum(), 1)
+
+@pytest.mark.parametrize('method', ['tss', 'percent', 'clr', 'log', 'hellinger'])
+def test_normalize_sparse_matches_dense(merged_table, method):
+    table = OTUTable.from_pandas(merged_table)
+
+    normalized = normalize(table, method)
+    expected = normalize(merged_table, method)[['S1', 'S2']].to_numpy()
+    np.testing.assert_allclose(normalized.counts.toarray(), expected)
+    if method != 'clr':
+        # Zeros stay implicit
+        assert normalized.counts.nnz == table.counts.nnz
+
+def test_normalize_sparse_matrix(merged_table):
+    counts = sparse.csc_matrix(merged_table[['S1', 'S2']].to_numpy(dtype=np.float64))
+
+    # Transforms that turn zeros into other values give a dense array
+    assert isinstance(normalize(counts, 'clr'), np.ndarray)
+    assert sparse.issparse(normalize(counts, 'hellinger'))
+    with pytest.raises(ValueError):
+        normalize(counts, 'clr', inplace=True)
+
+    assert normalize(counts, 'percent', inplace=True) is None
+    np.testing.assert_allclose(counts.sum(axis=0), [[100, 100]])
@@ -0,0 +1,25 @@
+import pandas as pd
+from qiime2pandas.otu_table import OTUTable
+from qiime2pandas.tax_sum import tax_glom
+from qiime2pandas.rarefy_otu_table import rarefy_otu_table
+
+def test_otu_table_round_trip(merged_table):
+    table = OTUTable.from_pandas(merged_table)
+
+    assert table.shape == (4, 2)
+    assert table.counts.nnz == 5
+    assert list(table.taxonomy.columns) == ['phylum']
+    pd.testing.assert_frame_equal(table.to_pandas(), merged_table)
+
+def test_otu_table_functions_stay_sparse(merged_table):
+    table = OTUTable.from_pandas(merged_table)
+
+    phyla = tax_glom(table, 'phylum')
+    assert isinstance(phyla, OTUTable)
+    assert list(phyla.observation_ids) == ['Firmicutes', 'Proteobacteria']
+    assert (phyla.counts.toarray() == [[7, 7], [0, 3]]).all()
+
+    rarefied, otus_lost = rarefy_otu_table(table, 3, seed=0)
+    assert isinstance(rarefied, OTUTable)
+    assert (rarefied.sample_sums() == 3).all()
+    assert set(otus_lost) == {'S1', 'S2'}
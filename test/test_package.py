@@ -0,0 +1,18 @@
+import subprocess
+import sys
+import qiime2pandas
+from qiime2pandas import chunked
+
+def test_lazy_import():
+    # Importing the package alone loads none of the heavy dependencies
+    code = ("import sys, qiime2pandas; "
+            "print(sorted(m for m in ('pandas', 'scipy', 'matplotlib', 'tqdm') if m in sys.modules))")
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+    assert output.strip() == '[]'
+
+def test_public_names():
+    assert 'import_and_merge' in qiime2pandas.__all__ and 'rarefaction_curve' in qiime2pandas.__all__
+    for name in qiime2pandas.__all__:
+        assert callable(getattr(qiime2pandas, name))
+    # Functions named after their module are not shadowed by the module
+    assert chunked.rarefy_table_file and callable(qiime2pandas.rarefy_otu_table)
@@ -0,0 +1,34 @@
+import pandas as pd
+from qiime2pandas.parse_sintax_and_merge import parse_sintax, read_sintax
+
+SINTAX = (
+    "OTU1\td:Bacteria(1.0000),p:Firmicutes(0.9000),c:Bacilli(0.7000)\t+\td:Bacteria,p:Firmicutes\n"
+    "OTU2\td:Bacteria(1.0000),p:Proteobacteria(0.9500),c:Gammaproteobacteria(0.9000)\t+\td:Bacteria,p:Proteobacteria,c:Gammaproteobacteria\n"
+    "OTU3\t\t\t\n"
+)
+
+def test_read_sintax(tmpdir):
+    sintax_file = tmpdir.join('sintax.txt')
+    sintax_file.write(SINTAX)
+
+    taxa = read_sintax(str(sintax_file))
+    assert list(taxa['class']) == ['', 'Gammaproteobacteria', '']
+    assert isinstance(taxa['phylum'].dtype, pd.CategoricalDtype)
+    assert taxa.loc[1, 'phylum_confidence'] == 0.95
+
+    # A cutoff on the confidences replaces the fourth column
+    taxa = read_sintax(str(sintax_file), confidence=0.6, chunksize=2)
+    assert list(taxa['class']) == ['Bacilli', 'Gammaproteobacteria', '']
+    assert list(taxa['OTU']) == ['OTU1', 'OTU2', 'OTU3']
+
+def test_parse_sintax(tmpdir):
+    sintax_file = tmpdir.join('sintax.txt')
+    sintax_file.write(SINTAX)
+    otu_table_file = tmpdir.join('otutab.txt')
+    otu_table_file.write("#OTU ID\tS1\tS2\nOTU1\t1\t0\nOTU2\t3\t5\nOTU3\t0\t5\n")
+
+    merged_rel_df = parse_sintax(str(sintax_file), str(otu_table_file), str(tmpdir.join('out.txt')))
+
+    assert list(merged_rel_df.columns) == ['OTU', 'kingdom', 'phylum', 'class', 'order', 'family', 'genus', 'S1', 'S2']
+    assert list(merged_rel_df['S1']) == [25.0, 75.0, 0.0]
+    assert tmpdir.join('out.txt').check()
@@ -26,3 +26,26 @@ def test_process_stats_files(tmpdir):
 
     # Check that the CSV was created
     assert os.path.exists(tmpdir_path.join("maxEE_summary.csv"))
+
+def test_read_stats_files(tmpdir):
+    from qiime2pandas.stats_reader import read_stats_files
+    from qiime2pandas.extract_summary_stats import extract_summary_stats
+
+    test_file_path = os.path.join(os.path.dirname(__file__), 'test_files', 'data.stats')
+    tmpdir_path = tmpdir.mkdir("testdata")
+    for name in ("a.stats", "b.stats"):
+        tmpdir_path.join(name).write(open(test_file_path).read())
+
+    stats = read_stats_files(tmpdir_path, max_workers=2)
+
+    assert len(stats) == 18
+    row = stats[(stats['File'] == 'a.stats') & (stats['Length'] == 50)].iloc[0]
+    assert row['MaxEE0.5'] == 56620
+    assert row['MaxEE1'] == 57815
+    # The 100.0% column is parsed correctly too
+    assert row['MaxEE2'] == 58102
+
+    summary_df = extract_summary_stats(tmpdir_path)
+    assert sorted(summary_df['File']) == ['a.stats', 'b.stats']
+    assert summary_df.iloc[0]['Reads'] == 58121
+    assert summary_df.iloc[0]['Average Length'] == 425.6
@@ -0,0 +1,60 @@
+import json
+import pandas as pd
+from qiime2pandas import profiling
+from qiime2pandas.profiling import profile, stage, profiled, log_event
+from qiime2pandas.rarefy_otu_table import rarefy_otu_table
+from qiime2pandas.tax_table import import_and_merge
+
+def test_profile_stages(tmpdir):
+    @profiled
+    def work(n):
+        with stage('inner', part=1) as inner:
+            inner.add(rows=n, bytes_read=10)
+            log_event('halfway', step=1)
+        return [0] * n
+
+    jsonl = str(tmpdir.join('profile.jsonl'))
+    with profile(jsonl, memory=True) as report:
+        work(1000)
+
+    records = [json.loads(line) for line in open(jsonl)]
+    assert records == [json.loads(json.dumps(record)) for record in report.records]
+    event, inner, outer = report.records
+    assert event['event'] == 'halfway' and event['stage'] == 'work/inner' and event['step'] == 1
+    assert inner['stage'] == 'work/inner' and inner['rows'] == 1000 and inner['part'] == 1
+    assert outer['stage'] == 'work' and outer['seconds'] >= inner['seconds']
+    assert outer['peak_memory_bytes'] >= 8000
+
+    # Off outside the block: stages are no-ops and nothing is recorded
+    with stage('ignored') as ignored:
+        ignored.add(rows=1)
+    work(10)
+    assert len(report.records) == 3
+    assert profiling._report is None
+
+def test_profile_import_and_merge(tmpdir, write_qza, biom_hdf5_bytes):
+    taxonomy = 'Feature ID\tTaxon\tConfidence\na1\td__Bacteria; p__Firmicutes; c__; o__; f__; g__; s__\t0.9\n'
+    paths = [str(tmpdir.join('taxonomy.qza')), str(tmpdir.join('table.qza'))]
+    write_qza(paths[0], 'tax-uuid', {'taxonomy.tsv': taxonomy})
+    write_qza(paths[1], 'table-uuid', {'feature-table.biom': biom_hdf5_bytes})
+
+    with tmpdir.as_cwd(), profile() as report:
+        merged_table = import_and_merge(paths)[0]
+        rarefy_otu_table(merged_table[['S1', 'S2']], 5, seed=1)
+
+    summary = report.summary()
+    stages = ['import_and_merge/unzip', 'import_and_merge/taxonomy_split', 'import_and_merge/biom_conversion',
+              'import_and_merge/join', 'import_and_merge/write', 'import_and_merge', 'rarefy_otu_table']
+    assert set(stages) <= set(summary.index)
+    assert summary.loc['import_and_merge/write', 'bytes_written'] > 0
+    assert summary.loc['import_and_merge/join', 'rows'] == 3
+
+    # Progress of each artifact is recorded as events rather than bare log lines
+    events = [record for record in report.records if 'event' in record and record['stage'] == 'import_and_merge']
+    assert [(event['file'], event['level']) for event in events] == [
+        (paths[0], 'WARNING'), (paths[1], 'INFO'), (paths[1], 'INFO')]
+    assert events[1]['event'].startswith('Loaded biom table') and events[1]['rows'] == 3
+
+    # The OTUs lost are summarised in the record rather than printed
+    rarefy = pd.DataFrame(report.records).set_index('stage').loc['rarefy_otu_table']
+    assert rarefy['samples'] == 2 and rarefy['rows'] == 3
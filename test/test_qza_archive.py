@@ -0,0 +1,53 @@
+import os
+import pytest
+from qiime2pandas.qza_archive import QZAArchive
+from qiime2pandas.QZA_to_folder import unzip_qza_files
+
+UUID = '5b1fc2a5-7d4b-4a1c-8d2e-0c6a7a1d9f10'
+
+TAXONOMY = ('Feature ID\tTaxon\tConfidence\n'
+            'a1\td__Bacteria; p__Firmicutes\t0.99\n'
+            'b2\td__Bacteria; p__Proteobacteria\t0.95\n')
+
+@pytest.fixture
+def write_taxonomy_qza(write_qza):
+    def write(path):
+        write_qza(path, UUID, {'taxonomy.tsv': TAXONOMY},
+                  type='FeatureData[Taxonomy]', format='TSVTaxonomyDirectoryFormat')
+    return write
+
+def test_qza_archive(tmpdir, write_taxonomy_qza):
+    qza_path = str(tmpdir.join('taxonomy.qza'))
+    write_taxonomy_qza(qza_path)
+
+    with QZAArchive(qza_path) as archive:
+        assert archive.uuid == UUID
+        assert archive.type == 'FeatureData[Taxonomy]'
+        assert archive.files == ['taxonomy.tsv']
+
+        taxa = archive.read_table('taxonomy.tsv', index_col=0)
+        assert list(taxa.index) == ['a1', 'b2']
+
+        with pytest.raises(KeyError):
+            archive.open('dna-sequences.fasta')
+
+def test_unzip_qza_files(tmpdir, write_taxonomy_qza):
+    qza_path = str(tmpdir.join('taxonomy.qza'))
+    write_taxonomy_qza(qza_path)
+
+    with tmpdir.as_cwd():
+        unzip_qza_files([qza_path])
+
+    assert os.listdir(tmpdir.join('taxonomy')) == ['taxonomy.tsv']
+
+def test_unzip_qza_files_incremental(tmpdir, write_taxonomy_qza):
+    artifacts = tmpdir.mkdir('artifacts')
+    write_taxonomy_qza(str(artifacts.join('taxonomy.qza')))
+
+    with tmpdir.as_cwd():
+        assert unzip_qza_files(str(artifacts), incremental=True) == [str(artifacts.join('taxonomy.qza'))]
+        # Unchanged artifacts are skipped; new ones are picked up from the directory
+        write_taxonomy_qza(str(artifacts.join('taxonomy2.qza')))
+        assert unzip_qza_files(str(artifacts), incremental=True) == [str(artifacts.join('taxonomy2.qza'))]
+
+    assert tmpdir.join('taxonomy2', 'taxonomy.tsv').check()
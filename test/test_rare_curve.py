@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+from qiime2pandas.rare_curve import rarefaction_curve
+
+def test_rarefaction_curve_exact():
+    otu_df = pd.DataFrame({'S1': [5, 3, 2, 0], 'S2': [1, 1, 1, 7]},
+                          index=['OTU1', 'OTU2', 'OTU3', 'OTU4'])
+
+    curves = rarefaction_curve(otu_df, plot=False)
+
+    assert list(curves.columns) == ['Sample', 'Depth', 'Mean', 'CI Lower', 'CI Upper']
+    s1 = curves[curves['Sample'] == 'S1'].set_index('Depth')['Mean']
+    assert np.isclose(s1[1], 1)
+    assert np.isclose(s1[10], 3)
+    # Drawing 2 of 10 reads: sum over OTUs of 1 - C(10 - N_i, 2) / C(10, 2)
+    assert np.isclose(s1[2], 3 - (10 + 21 + 28) / 45)
+
+def test_rarefaction_curve_monte_carlo():
+    otu_df = pd.DataFrame({'S1': [5, 3, 2, 0], 'S2': [1, 1, 1, 7]})
+
+    curves = rarefaction_curve(otu_df, num_iterations=5, seed=0, method='monte_carlo', plot=False)
+
+    assert (curves['CI Lower'] <= curves['Mean']).all()
+    assert (curves['Mean'] <= curves['CI Upper']).all()
+    assert (curves.groupby('Sample')['Mean'].max() <= 4).all()
+
+def test_rarefaction_curve_empty_sample():
+    # Empty samples in the middle and at the end; the default max_depth is then 0
+    otu_df = pd.DataFrame({'S1': [5, 3, 2, 0], 'Empty': [0, 0, 0, 0], 'S2': [1, 1, 1, 7], 'Last': [0, 0, 0, 0]})
+
+    curves = rarefaction_curve(otu_df, plot=False)
+
+    at_one_read = curves[curves['Depth'] == 1].set_index('Sample')['Mean']
+    assert np.allclose(at_one_read[['S1', 'Empty', 'S2', 'Last']], [1, 0, 1, 0])
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+from qiime2pandas.rarefy_otu_table import rarefy_otu_table
+from qiime2pandas.rarefy_batch import rarefy_depths, iter_rarefied_tables
+from qiime2pandas.otu_table import OTUTable
+
+def test_rarefy_otu_table(otu_df):
+    depth = int(otu_df.sum().min())
+
+    rarefied, otus_lost = rarefy_otu_table(otu_df, depth, seed=1)
+
+    assert list(rarefied.index) == list(otu_df.index)
+    assert list(rarefied.columns) == list(otu_df.columns)
+    assert (rarefied.sum() == depth).all()
+    # A rarefied count can never exceed the original count
+    assert (rarefied <= otu_df).all().all()
+    assert set(otus_lost) == set(otu_df.columns)
+    assert otus_lost['S0'] == (otu_df['S0'] > 0).sum() - (rarefied['S0'] > 0).sum()
+
+def test_rarefy_otu_table_seed(otu_df):
+    state = np.random.get_state()[1].copy()
+
+    first, _ = rarefy_otu_table(otu_df, 100, seed=7)
+    second, _ = rarefy_otu_table(otu_df, 100, seed=np.random.default_rng(7))
+
+    pd.testing.assert_frame_equal(first, second)
+    # The global random state is left untouched
+    assert (np.random.get_state()[1] == state).all()
+
+def test_rarefy_otu_table_too_shallow(otu_df):
+    with pytest.raises(ValueError):
+        rarefy_otu_table(otu_df, int(otu_df.sum().max()) + 1)
+
+def test_rarefy_depths(otu_df):
+    depths = [50, 200, 100]
+
+    stacks, consensus = rarefy_depths(otu_df, depths, repeats=4, seed=3)
+
+    assert stacks[200].shape == (4,) + otu_df.shape
+    for depth in depths:
+        assert (stacks[depth].sum(axis=1) == depth).all()
+    # Subsamples are nested: each depth is drawn from the deeper one
+    assert (stacks[50] <= stacks[100]).all() and (stacks[100] <= stacks[200]).all()
+    assert np.allclose(consensus[100].to_numpy(), stacks[100].mean(axis=0))
+
+    # The same seed gives the same results with any number of workers
+    parallel, _ = rarefy_depths(otu_df, depths, repeats=4, seed=3, max_workers=2)
+    for depth in depths:
+        assert (parallel[depth] == stacks[depth]).all()
+
+    tables = list(iter_rarefied_tables(OTUTable.from_pandas(otu_df), depths, repeats=4, seed=3))
+    assert len(tables) == 12
+    repeat, depth, table = tables[-1]
+    assert (repeat, depth) == (3, 100)
+    assert (table.counts.toarray() == stacks[100][3]).all()
@@ -0,0 +1,54 @@
+import os
+import pytest
+from qiime2pandas.rename_fastq import rename_fastq_files, plan_renames, write_qiime2_manifest
+
+NAMES = ['A-1_S1_L001_R1_001.fastq.gz', 'A-1_S1_L001_R2_001.fastq.gz', 'B2_S2_L001_R1_001.fastq.gz']
+
+def _touch(directory, names):
+    for name in names:
+        directory.join(name).write('')
+
+def test_rename_fastq_files(tmpdir):
+    _touch(tmpdir, NAMES)
+
+    plan = rename_fastq_files(str(tmpdir), dry_run=True)
+    assert plan == [(NAMES[0], 'A1_S1_L001_R1_001.fastq.gz'), (NAMES[1], 'A1_S1_L001_R2_001.fastq.gz')]
+    assert tmpdir.join(NAMES[0]).check()
+
+    rename_fastq_files(str(tmpdir), max_workers=2)
+    assert sorted(os.listdir(str(tmpdir))) == sorted(['.rename_fastq_journal.tsv', 'A1_S1_L001_R1_001.fastq.gz',
+                                                      'A1_S1_L001_R2_001.fastq.gz', NAMES[2]])
+    # Running again (e.g. after an interruption) does nothing more
+    assert rename_fastq_files(str(tmpdir)) == plan
+
+    manifest = write_qiime2_manifest(str(tmpdir), str(tmpdir.join('manifest.tsv')))
+    lines = open(manifest).read().splitlines()
+    assert lines[1] == f"A1\t{tmpdir.join('A1_S1_L001_R1_001.fastq.gz')}\t{tmpdir.join('A1_S1_L001_R2_001.fastq.gz')}"
+
+    rename_fastq_files(str(tmpdir), undo=True)
+    assert sorted(os.listdir(str(tmpdir))) == sorted(NAMES + ['manifest.tsv'])
+
+def test_rename_collision(tmpdir):
+    _touch(tmpdir, NAMES + ['A1_S1_L001_R1_001.fastq.gz'])
+
+    with pytest.raises(FileExistsError):
+        plan_renames(str(tmpdir))
+    with pytest.raises(FileExistsError):
+        rename_fastq_files(str(tmpdir))
+    # Nothing was renamed
+    assert tmpdir.join(NAMES[1]).check()
+
+def test_manifest_from_journal(tmpdir):
+    _touch(tmpdir, NAMES + ['B2_S2_L001_R2_001.fastq.gz'])
+    journal = str(tmpdir.join('renames.tsv'))
+    rename_fastq_files(str(tmpdir), journal=journal)
+    # Half renamed: one renamed file is put back as if the run had been interrupted
+    os.rename(str(tmpdir.join('A1_S1_L001_R2_001.fastq.gz')), str(tmpdir.join(NAMES[1])))
+
+    manifest = write_qiime2_manifest(str(tmpdir), str(tmpdir.join('manifest.tsv')), journal=journal)
+    lines = open(manifest).read().splitlines()
+    # Renamed, pending and untouched (B2) files are all listed under their final names
+    assert lines[1:] == [
+        f"A1\t{tmpdir.join('A1_S1_L001_R1_001.fastq.gz')}\t{tmpdir.join('A1_S1_L001_R2_001.fastq.gz')}",
+        f"B2\t{tmpdir.join(NAMES[2])}\t{tmpdir.join('B2_S2_L001_R2_001.fastq.gz')}",
+    ]
@@ -0,0 +1,49 @@
+import pandas as pd
+import pytest
+from qiime2pandas.table_io import write_table, read_table, TableWriter
+
+@pytest.mark.parametrize('name', ['merged_table.csv', 'merged_table.parquet', 'merged_table.feather'])
+def test_write_read_table(tmpdir, merged_table, name):
+    if not name.endswith('.csv'):
+        pytest.importorskip('pyarrow')
+
+    path = write_table(merged_table, str(tmpdir.join(name)))
+    table = read_table(path, index_col=0)
+    assert (table[['S1', 'S2']].to_numpy() == merged_table[['S1', 'S2']].to_numpy()).all()
+    assert table['phylum'].isna().tolist() == merged_table['phylum'].isna().tolist()
+
+    # Column projection and row filters (pushed down for Parquet and Feather)
+    table = read_table(path, columns=['S2'], filters=[('phylum', '==', 'Firmicutes')], index_col=0)
+    assert list(table.index) == ['a1', 'c3'] and list(table.columns) == ['S2']
+
+@pytest.mark.parametrize('name', ['merged_table.parquet', 'merged_table.feather'])
+def test_columnar_round_trip(tmpdir, merged_table, name):
+    pytest.importorskip('pyarrow')
+    merged_table.loc['c3', 'S2'] = 200
+    merged_table['Average Length'] = [250.0, 251.0, 0.0, 253.0]
+    table = read_table(write_table(merged_table, str(tmpdir.join(name))), index_col=0)
+
+    # Ranks are dictionary-encoded; every other column reads back with its own dtype
+    assert isinstance(table['phylum'].dtype, pd.CategoricalDtype)
+    samples = ['S1', 'S2', 'Average Length']
+    pd.testing.assert_frame_equal(table[samples], merged_table[samples])
+    assert list(table['S2'] + table['S2']) == [0, 6, 400, 0]
+
+def test_partitions(tmpdir):
+    pytest.importorskip('pyarrow')
+    stats = pd.DataFrame({'File': ['a.stats', 'a.stats', 'b.stats'], 'Length': [50, 100, 50], 'MaxEE1': [9, 8, 7]})
+    path = write_table(stats, str(tmpdir.join('stats.parquet')), partition_cols=['File'], index=False)
+    table = read_table(path, filters=[('File', '=', 'b.stats')])
+    assert list(table['MaxEE1']) == [7]
+
+@pytest.mark.parametrize('name', ['blocks.txt', 'blocks.parquet', 'blocks.feather'])
+def test_blocks(tmpdir, merged_table, name):
+    if not name.endswith('.txt'):
+        pytest.importorskip('pyarrow')
+
+    with TableWriter(str(tmpdir.join(name)), sep='\t') as writer:
+        writer.write(merged_table.iloc[:2])
+        writer.write(merged_table.iloc[2:])
+    table = read_table(str(tmpdir.join(name)), sep='\t', index_col=0)
+    assert list(table.index) == ['a1', 'b2', 'c3', 'd4']
+    assert list(table['S2']) == [0, 3, 7, 0]
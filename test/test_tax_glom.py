@@ -0,0 +1,62 @@
+import pandas as pd
+from qiime2pandas.tax_sum import tax_glom
+from qiime2pandas.tax_glom2 import tax_glom_table
+from qiime2pandas.tax_lineage import tax_glom_all, LineageDictionary
+
+def _merged_table():
+    return pd.DataFrame({
+        'kingdom': ['Bacteria', 'Bacteria', 'Bacteria', 'Archaea'],
+        'phylum': ['Firmicutes', 'Firmicutes', 'Proteobacteria', 'Euryarchaeota'],
+        # The same genus name under two different phyla
+        'genus': ['Clostridium', 'Clostridium', 'Clostridium', None],
+        'S1': [1, 2, 3, 4],
+        'S2': [0, 5, 1, 1],
+    })
+
+def test_tax_glom_keeps_lineages_apart():
+    genera = tax_glom(_merged_table(), 'genus')
+
+    assert list(genera.columns) == ['kingdom', 'phylum', 'genus', 'S1', 'S2']
+    assert list(genera['phylum']) == ['Firmicutes', 'Proteobacteria']
+    assert list(genera['S1']) == [3, 3]
+    assert genera['S1'].dtype == 'int64'
+
+    by_name = tax_glom(_merged_table(), 'genus', lineage=False)
+    assert list(by_name.columns) == ['genus', 'S1', 'S2']
+    assert list(by_name['S1']) == [6]
+
+def test_tax_glom_table():
+    phyla = tax_glom_table(_merged_table(), 'phylum', sample_indices=[4])
+
+    assert list(phyla.columns) == ['kingdom', 'phylum', 'S2']
+    assert list(phyla['phylum']) == ['Euryarchaeota', 'Firmicutes', 'Proteobacteria']
+    assert list(phyla['S2']) == [1, 5, 1]
+
+def test_tax_glom_all():
+    by_rank = tax_glom_all(_merged_table())
+
+    assert list(by_rank) == ['kingdom', 'phylum', 'genus']
+    assert list(by_rank['kingdom']['S1']) == [4, 6]
+    assert by_rank['phylum']['S1'].sum() == 10
+
+def test_lineage_dictionary():
+    lineages = LineageDictionary(strip_prefixes=True)
+    taxonomy = lineages.lineage_frame([
+        'd__Bacteria; p__Firmicutes; c__Bacilli; o__; f__; g__; s__',
+        'd:Bacteria(1.0000),p:Firmicutes(0.9000),c:Bacilli(0.7000)',
+        'd__Bacteria; p__Firmicutes; c__Bacilli; o__; f__; g__; s__',
+        None,
+    ])
+
+    # Both formats parse to the same ranks; each distinct string is parsed once
+    assert list(taxonomy.loc[0]) == list(taxonomy.loc[1])
+    assert taxonomy.loc[0, 'class'] == 'Bacilli' and pd.isna(taxonomy.loc[0, 'order'])
+    assert taxonomy['kingdom'].isna().tolist() == [False, False, False, True]
+    assert len(lineages) == 2
+
+    # Tables built separately share categories once adopted, so they concatenate as categoricals
+    other = pd.DataFrame({'phylum': pd.Categorical(['Proteobacteria', 'Firmicutes'])})
+    first, second = lineages.adopt([taxonomy, other])
+    combined = pd.concat([first['phylum'], second['phylum']], ignore_index=True)
+    assert isinstance(combined.dtype, pd.CategoricalDtype)
+    assert combined.cat.codes.tolist() == [0, 0, 0, -1, 1, 0]
@@ -0,0 +1,73 @@
+import io
+import json
+import pandas as pd
+from qiime2pandas.biom_reader import read_biom, biom_to_dataframe
+from qiime2pandas.tax_table import import_and_merge
+
+def test_read_biom_hdf5(biom_table, biom_hdf5_bytes):
+    counts, otu_ids, sample_ids = biom_table
+    matrix, read_otu_ids, read_sample_ids = read_biom(io.BytesIO(biom_hdf5_bytes))
+
+    assert list(read_otu_ids) == otu_ids
+    assert list(read_sample_ids) == sample_ids
+    assert (matrix.toarray() == counts).all()
+
+def test_read_biom_json(tmpdir, biom_table):
+    counts, otu_ids, sample_ids = biom_table
+    biom_path = str(tmpdir.join('table.biom'))
+    with open(biom_path, 'w') as f:
+        json.dump({
+            'format': 'Biological Observation Matrix 1.0.0',
+            'matrix_type': 'sparse',
+            'shape': [3, 2],
+            'data': [[0, 0, 5], [1, 1, 3], [2, 0, 2], [2, 1, 7]],
+            'rows': [{'id': i, 'metadata': None} for i in otu_ids],
+            'columns': [{'id': i, 'metadata': None} for i in sample_ids],
+        }, f)
+
+    otu_df = biom_to_dataframe(biom_path)
+
+    assert otu_df.index.name == '#OTU ID'
+    assert (otu_df.to_numpy() == counts).all()
+
+def test_import_and_merge(tmpdir, write_qza, biom_hdf5_bytes):
+    taxonomy = ('Feature ID\tTaxon\tConfidence\n'
+                'a1\td__Bacteria; p__Firmicutes; c__Bacilli; o__Lactobacillales; f__Lactobacillaceae; g__Lactobacillus; s__\t0.9\n'
+                'b2\td__Bacteria; p__Proteobacteria; c__Gammaproteobacteria; o__Enterobacterales; f__Enterobacteriaceae; g__Escherichia; s__coli\t0.9\n')
+    write_qza(str(tmpdir.join('taxonomy.qza')), 'tax-uuid', {'taxonomy.tsv': taxonomy})
+    write_qza(str(tmpdir.join('table.qza')), 'table-uuid', {'feature-table.biom': biom_hdf5_bytes})
+
+    with tmpdir.as_cwd():
+        merged_tables = import_and_merge([str(tmpdir.join('taxonomy.qza')), str(tmpdir.join('table.qza'))])
+
+    assert len(merged_tables) == 1
+    merged_table = merged_tables[0]
+    assert list(merged_table.columns[:2]) == ['S1', 'S2']
+    assert merged_table.loc['a1', 'S1'] == 5
+    assert pd.isna(merged_table.loc['c3', 'phylum'])
+
+    # The chunked mode writes the same CSV without densifying the table
+    expected_csv = tmpdir.join('tax_table', 'table', 'merged_table.csv').read()
+    with tmpdir.as_cwd():
+        chunked_tables = import_and_merge([str(tmpdir.join('taxonomy.qza')), str(tmpdir.join('table.qza'))], chunksize=2)
+    assert chunked_tables[0].taxonomy.loc['b2', 'genus'] == merged_table.loc['b2', 'genus']
+    assert tmpdir.join('tax_table', 'table', 'merged_table.csv').read() == expected_csv
+
+def test_import_and_merge_parallel(tmpdir, write_qza, biom_hdf5_bytes):
+    taxonomy = 'Feature ID\tTaxon\tConfidence\na1\td__Bacteria; p__Firmicutes; c__; o__; f__; g__; s__\t0.9\n'
+    paths = [str(tmpdir.join('taxonomy.qza'))]
+    write_qza(paths[0], 'tax-uuid', {'taxonomy.tsv': taxonomy})
+    for run in range(4):
+        paths.append(str(tmpdir.mkdir(f'run{run}').join('table.qza')))
+        write_qza(paths[-1], f'table-uuid-{run}', {'feature-table.biom': biom_hdf5_bytes})
+
+    with tmpdir.as_cwd():
+        sequential = import_and_merge(paths)
+        parallel = import_and_merge(paths, max_workers=4)
+
+    assert len(parallel) == 4
+    for expected, merged_table in zip(sequential, parallel):
+        pd.testing.assert_frame_equal(expected, merged_table)
+    # Artifacts with the same file name get separate workspaces
+    assert tmpdir.join('tax_table', 'table', 'merged_table.csv').check()
+    assert tmpdir.join('tax_table', 'table_4', 'merged_table.csv').check()